@@ -0,0 +1,34 @@
+#ifndef BUFFER_H
+#define BUFFER_H
+
+// Read-only borrowed view over any contiguous buffer-protocol object (bytes, bytearray,
+// memoryview, mmap, ...). The exporter keeps the memory pinned until the view is
+// released, so the data can be read with the GIL released. Must be destroyed with the
+// GIL held.
+class ByteBuffer {
+public:
+    explicit ByteBuffer(const py::handle& object) {
+        if (PyObject_GetBuffer(object.ptr(), &view, PyBUF_SIMPLE) != 0)
+            throw py::error_already_set();
+    }
+
+    ~ByteBuffer() {
+        PyBuffer_Release(&view);
+    }
+
+    ByteBuffer(const ByteBuffer&) = delete;
+    ByteBuffer& operator=(const ByteBuffer&) = delete;
+
+    const char* data() const {
+        return static_cast<const char*>(view.buf);
+    }
+
+    size_t size() const {
+        return static_cast<size_t>(view.len);
+    }
+
+private:
+    Py_buffer view;
+};
+
+#endif
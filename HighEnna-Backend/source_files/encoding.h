@@ -1,37 +1,76 @@
 #ifndef ENCODING_HEADER
 #define ENCODING_HEADER
 
-struct vector_hash {
-    std::size_t operator()(const std::vector<uint8_t>& vec) const noexcept {
-        return std::hash<std::string_view>{}(
-            std::string_view(reinterpret_cast<const char*>(vec.data()), vec.size()));
+// LZW over 16-bit codes. Once all 65536 codes are taken the dictionary is reset to the 256
+// single bytes instead of being extended, at the same point on both sides, so no reset
+// code needs to be sent. Streams that never fill the dictionary are the same as before.
+constexpr uint32_t lzw_code_count = 1 << 16;
+
+// Open-addressed table from (prefix code, next byte) to the code of the extended phrase.
+// It never holds more than half as many entries as it has slots, so probes stay short.
+class LzwTable {
+public:
+    LzwTable() : keys(slot_count, 0), codes(slot_count) {}
+
+    void clear() {
+        std::fill(keys.begin(), keys.end(), 0);
+    }
+
+    // Code of prefix+byte, or of the slot where it goes when absent
+    size_t find(uint16_t prefix, uint8_t byte, bool& found) const {
+        const uint32_t key = ((static_cast<uint32_t>(prefix) << 8) | byte) + 1;
+        size_t slot = (key * 2654435761u) >> (32 - slot_bits);
+        while (keys[slot] && keys[slot] != key)
+            slot = (slot + 1) & (slot_count - 1);
+        found = keys[slot] == key;
+        return slot;
+    }
+
+    uint16_t code(size_t slot) const {
+        return codes[slot];
     }
-};
 
-void buffer_compress(const std::vector<uint8_t>& input, std::vector<uint16_t>& output) {
-    std::unordered_map<std::vector<uint8_t>, uint16_t, vector_hash> dictionary;
-    uint16_t dict_size = 256;
-    for (uint16_t i = 0; i < 256; i++) {
-        dictionary[{static_cast<uint8_t>(i)}] = i;
+    void insert(size_t slot, uint16_t prefix, uint8_t byte, uint16_t code) {
+        keys[slot] = ((static_cast<uint32_t>(prefix) << 8) | byte) + 1;
+        codes[slot] = code;
     }
 
-    std::vector<uint8_t> w;
+private:
+    static constexpr uint32_t slot_bits = 17;
+    static constexpr size_t slot_count = size_t(1) << slot_bits;
+
+    std::vector<uint32_t> keys;
+    std::vector<uint16_t> codes;
+};
+
+void buffer_compress(const uint8_t* input, size_t input_length, std::vector<uint16_t>& output) {
+    if (!input_length)
+        return;
+
+    LzwTable dictionary;
+    uint32_t dict_size = 256;
+    uint16_t w = input[0];
+
+    for (size_t i = 1; i < input_length; i++) {
+        const uint8_t c = input[i];
+        bool found;
+        const size_t slot = dictionary.find(w, c, found);
+        if (found) {
+            w = dictionary.code(slot);
+            continue;
+        }
 
-    for (uint8_t c : input) {
-        std::vector<uint8_t> wc = w;
-        wc.push_back(c);
-        if (dictionary.count(wc)) {
-            w = wc;
+        output.push_back(w);
+        if (dict_size == lzw_code_count) {
+            dictionary.clear();
+            dict_size = 256;
         } else {
-            output.push_back(dictionary[w]);
-            dictionary[wc] = dict_size++;
-            w = {c};
+            dictionary.insert(slot, w, c, static_cast<uint16_t>(dict_size++));
         }
+        w = c;
     }
 
-    if (!w.empty()) {
-        output.push_back(dictionary[w]);
-    }
+    output.push_back(w);
 }
 
 void buffer_encode(const std::vector<uint16_t>& input, std::vector<uint8_t>& output) {
@@ -58,49 +97,68 @@ void buffer_encode(const std::vector<uint16_t>& input, std::vector<uint8_t>& out
         output.push_back(48+(buffer&0x3F));
 }
 
+// Every phrase is stored as its prefix code and last byte, and written out back to front
 void buffer_decompress(const std::vector<uint16_t>& compressed, std::vector<uint8_t>& output) {
     if (compressed.empty())
         throw std::runtime_error("Compressed input is empty");
 
-    std::unordered_map<uint16_t, std::vector<uint8_t>> dictionary;
-    uint16_t dict_size = 256;
-    for (uint16_t i = 0; i < 256; i++) {
-        dictionary[i] = {static_cast<uint8_t>(i)};
+    std::vector<uint16_t> prefix(lzw_code_count);
+    std::vector<uint8_t> suffix(lzw_code_count);
+    std::vector<uint8_t> first(lzw_code_count);
+    std::vector<uint32_t> length(lzw_code_count);
+    for (uint32_t i = 0; i < 256; i++) {
+        suffix[i] = first[i] = static_cast<uint8_t>(i);
+        length[i] = 1;
     }
 
-    std::vector<uint8_t> w = {static_cast<uint8_t>(compressed[0])};
-    output = w;
+    const auto corrupted = []() {
+        return std::runtime_error("Invalid or corrupted compressed stream: unexpected dictionary value.");
+    };
+
+    uint32_t dict_size = 256;
+    uint16_t w = compressed[0];
+    if (w >= 256)
+        throw corrupted();
+
+    output.clear();
+    output.push_back(static_cast<uint8_t>(w));
 
-    std::vector<uint8_t> entry;
     for (size_t i = 1; i < compressed.size(); i++) {
-        uint16_t k = compressed[i];
-        if (dictionary.count(k)) {
-            entry = dictionary[k];
-        } else if (k == dict_size) {
-            entry = w;
-            entry.push_back(w[0]);
+        const uint16_t k = compressed[i];
+
+        if (dict_size == lzw_code_count) {
+            dict_size = 256;
+            if (k >= 256)
+                throw corrupted();
         } else {
-            throw std::runtime_error("Invalid or corrupted compressed stream: unexpected dictionary value.");
+            if (k > dict_size)
+                throw corrupted();
+            prefix[dict_size] = w;
+            suffix[dict_size] = k == dict_size ? first[w] : first[k];
+            first[dict_size] = first[w];
+            length[dict_size] = length[w] + 1;
+            dict_size++;
         }
 
-        output.insert(output.end(), entry.begin(), entry.end());
+        const size_t end = output.size() + length[k];
+        output.resize(end);
+        uint8_t* out = output.data() + end;
+        for (uint32_t code = k, n = length[k]; n; --n, code = prefix[code])
+            *--out = suffix[code];
 
-        dictionary[dict_size++] = w;
-        dictionary[dict_size - 1].push_back(entry[0]);
-
-        w = entry;
+        w = k;
     }
 }
 
-int buffer_decode(const std::vector<uint8_t>& input, std::vector<uint16_t>& output) {
+int buffer_decode(const uint8_t* input, size_t input_length, std::vector<uint16_t>& output) {
     try {
         output.clear();
-        output.reserve(1 + 3 * input.size() / 8);
+        output.reserve(1 + 3 * input_length / 8);
 
         uint32_t buffer = 0;
         uint8_t bits = 0;
 
-        for (size_t i = 0; i < input.size(); i++) {
+        for (size_t i = 0; i < input_length; i++) {
             uint8_t byte = input[i];
 
             buffer |= (byte - 48) << bits;
@@ -120,35 +178,166 @@ int buffer_decode(const std::vector<uint8_t>& input, std::vector<uint16_t>& outp
     }
 }
 
+// Base85 over the RFC 1924 alphabet, with '.' in place of '$' so that no cache line can
+// start with the "$$$" closing a cache block. Four bytes make five characters; a partial
+// last group is padded with zeros and the padding characters are dropped.
+constexpr char base85_alphabet[] = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz!#.%&()*+-;<=>?@^_`{|}~";
+
+void buffer_encode85(const uint8_t* input, size_t input_length, std::vector<uint8_t>& output) {
+    output.clear();
+    output.reserve((input_length + 3) / 4 * 5);
+
+    for (size_t i = 0; i < input_length; i += 4) {
+        const size_t count = std::min<size_t>(4, input_length - i);
+        uint32_t group = 0;
+        for (size_t j = 0; j < 4; j++)
+            group = (group << 8) | (j < count ? input[i+j] : 0);
+
+        char digits[5];
+        for (int j = 4; j >= 0; j--) {
+            digits[j] = base85_alphabet[group % 85];
+            group /= 85;
+        }
+        output.insert(output.end(), digits, digits + count + 1);
+    }
+}
+
+void buffer_decode85(const uint8_t* input, size_t input_length, std::vector<uint8_t>& output) {
+    static const auto values = []() {
+        std::array<int8_t, 256> values;
+        values.fill(-1);
+        for (int8_t i = 0; i < 85; i++)
+            values[static_cast<uint8_t>(base85_alphabet[i])] = i;
+        return values;
+    }();
+
+    if (input_length % 5 == 1)
+        throw std::invalid_argument("Truncated base85 stream");
+
+    output.clear();
+    output.reserve(input_length / 5 * 4 + 3);
+
+    for (size_t i = 0; i < input_length; i += 5) {
+        const size_t count = std::min<size_t>(5, input_length - i);
+        uint64_t group = 0;
+        for (size_t j = 0; j < 5; j++) {
+            const int8_t value = j < count ? values[input[i+j]] : 84;
+            if (value < 0)
+                throw std::invalid_argument("Invalid character in base85 stream");
+            group = group * 85 + value;
+        }
+        if (group > 0xFFFFFFFF)
+            throw std::invalid_argument("Invalid base85 group");
+
+        for (size_t j = 0; j < count - 1; j++)
+            output.push_back(static_cast<uint8_t>(group >> (24 - 8*j)));
+    }
+}
+
 // ---------------- PYTHON-FACING FUNCTIONS ----------------
 
 // Encode: compress + encode
-py::bytes encode(const py::bytes& code) {
-    std::string buffer = code;
-    std::vector<uint8_t> input(buffer.begin(), buffer.end());
-
-    std::vector<uint16_t> compressed;
-    buffer_compress(input, compressed);
+py::bytes encode(const py::buffer& code) {
+    ByteBuffer input(code);
 
     std::vector<uint8_t> encoded;
-    buffer_encode(compressed, encoded);
+    {
+        py::gil_scoped_release release;
+
+        std::vector<uint16_t> compressed;
+        buffer_compress(reinterpret_cast<const uint8_t*>(input.data()), input.size(), compressed);
+
+        buffer_encode(compressed, encoded);
+    }
 
     return py::bytes(reinterpret_cast<const char*>(encoded.data()), encoded.size());
 }
 
 // Decode: decode + decompress
-py::bytes decode(const py::bytes& code) {
-    std::string buffer = code;
-    std::vector<uint8_t> input(buffer.begin(), buffer.end());
+py::bytes decode(const py::buffer& code) {
+    ByteBuffer input(code);
+
+    std::vector<uint8_t> decompressed;
+    {
+        py::gil_scoped_release release;
+
+        std::vector<uint16_t> decoded;
+        buffer_decode(reinterpret_cast<const uint8_t*>(input.data()), input.size(), decoded);
+
+        buffer_decompress(decoded, decompressed);
+    }
+
+    return py::bytes(reinterpret_cast<const char*>(decompressed.data()), decompressed.size());
+}
+
+
+// Compress: raw LZW codes, two bytes each in little-endian order
+py::bytes compress(const py::buffer& code) {
+    ByteBuffer input(code);
+
+    std::string compressed;
+    {
+        py::gil_scoped_release release;
+
+        std::vector<uint16_t> codes;
+        buffer_compress(reinterpret_cast<const uint8_t*>(input.data()), input.size(), codes);
+
+        compressed.reserve(2 * codes.size());
+        for (uint16_t word : codes) {
+            compressed.push_back(static_cast<char>(word & 0xFF));
+            compressed.push_back(static_cast<char>(word >> 8));
+        }
+    }
 
-    std::vector<uint16_t> decoded;
-    buffer_decode(input, decoded);
+    return py::bytes(compressed);
+}
+
+// Decompress: inverse of compress
+py::bytes decompress(const py::buffer& code) {
+    ByteBuffer input(code);
+    if (input.size() % 2)
+        throw std::invalid_argument("Compressed input has an odd length");
 
     std::vector<uint8_t> decompressed;
-    buffer_decompress(decoded, decompressed);
+    {
+        py::gil_scoped_release release;
+
+        const uint8_t* bytes = reinterpret_cast<const uint8_t*>(input.data());
+        std::vector<uint16_t> codes(input.size() / 2);
+        for (size_t i = 0; i < codes.size(); i++)
+            codes[i] = static_cast<uint16_t>(bytes[2*i] | (bytes[2*i+1] << 8));
+
+        if (!codes.empty())
+            buffer_decompress(codes, decompressed);
+    }
 
     return py::bytes(reinterpret_cast<const char*>(decompressed.data()), decompressed.size());
 }
 
+// Encode85: base85 text safe to embed as cache block lines
+py::bytes encode85(const py::buffer& code) {
+    ByteBuffer input(code);
+
+    std::vector<uint8_t> encoded;
+    {
+        py::gil_scoped_release release;
+        buffer_encode85(reinterpret_cast<const uint8_t*>(input.data()), input.size(), encoded);
+    }
+
+    return py::bytes(reinterpret_cast<const char*>(encoded.data()), encoded.size());
+}
+
+// Decode85: inverse of encode85
+py::bytes decode85(const py::buffer& code) {
+    ByteBuffer input(code);
+
+    std::vector<uint8_t> decoded;
+    {
+        py::gil_scoped_release release;
+        buffer_decode85(reinterpret_cast<const uint8_t*>(input.data()), input.size(), decoded);
+    }
+
+    return py::bytes(reinterpret_cast<const char*>(decoded.data()), decoded.size());
+}
 
 #endif
\ No newline at end of file
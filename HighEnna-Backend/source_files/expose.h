@@ -1,10 +1,70 @@
 #ifndef EXPOSE_H
 #define EXPOSE_H
 
+template <typename T>
+void bind_array_view(py::module_& m, const char* name) {
+    py::class_<ArrayView<T>>(m, name, py::buffer_protocol())
+        .def_buffer([](ArrayView<T>& view) {
+            return py::buffer_info(const_cast<T*>(view.data->data()), static_cast<py::ssize_t>(view.data->size()), true);
+        })
+        .def("__len__", [](const ArrayView<T>& view) { return view.data->size(); })
+        .def("__getitem__", [](const ArrayView<T>& view, py::ssize_t index) {
+            py::ssize_t size = static_cast<py::ssize_t>(view.data->size());
+            if (index < 0) index += size;
+            if (index < 0 || index >= size) throw py::index_error();
+            return (*view.data)[index];
+        });
+}
+
 PYBIND11_MODULE(highennabackend, m) {
-    m.def("parse" , &parse , py::arg("code"));
+    bind_array_view<uint8_t>(m, "UInt8Array");
+    bind_array_view<uint64_t>(m, "UInt64Array");
+    bind_array_view<int64_t>(m, "Int64Array");
+
+    py::class_<ParseTree, std::shared_ptr<ParseTree>>(m, "ParseResult")
+        .def("__len__", &ParseTree::size)
+        .def_property_readonly("kind",         [](std::shared_ptr<ParseTree> self) { return array_view(self, self->kind); })
+        .def_property_readonly("start",        [](std::shared_ptr<ParseTree> self) { return array_view(self, self->start); })
+        .def_property_readonly("end",          [](std::shared_ptr<ParseTree> self) { return array_view(self, self->end); })
+        .def_property_readonly("line",         [](std::shared_ptr<ParseTree> self) { return array_view(self, self->line); })
+        .def_property_readonly("parent",       [](std::shared_ptr<ParseTree> self) { return array_view(self, self->parent); })
+        .def_property_readonly("first_child",  [](std::shared_ptr<ParseTree> self) { return array_view(self, self->first_child); })
+        .def_property_readonly("next_sibling", [](std::shared_ptr<ParseTree> self) { return array_view(self, self->next_sibling); })
+        .def_property_readonly("line_indexes", [](std::shared_ptr<ParseTree> self) { return array_view(self, self->line_indexes); })
+        .def_property_readonly("errors", [](const ParseTree& self) { return errors_to_list(self); })
+        .def_property_readonly("names",  [](const ParseTree& self) { return names_to_dict(self); })
+        .def_property_readonly("cache",  [](const ParseTree& self) { return cache_to_dict(self); })
+        .def_property_readonly("code_length", [](const ParseTree& self) { return self.code_length; })
+        .def("to_dict", [](const ParseTree& self) { return tree_to_dict(self); })
+        .def("locate", &locate, py::arg("code"), py::arg("offsets"), py::arg("encoding")="utf-8")
+        .def("to_bytes", [](const ParseTree& self) { return py::bytes(serialize_tree(self)); })
+        .def_static("from_bytes", [](const py::buffer& data) {
+            ByteBuffer buffer(data);
+            auto tree = std::make_shared<ParseTree>();
+            deserialize_tree(buffer.data(), buffer.size(), *tree);
+            return tree;
+        }, py::arg("data"));
+
+    py::list node_kinds;
+    for (const char* node_kind_name : node_kind_names)
+        node_kinds.append(node_kind_name);
+    m.attr("node_kinds") = py::tuple(node_kinds);
+
+    py::class_<Parser>(m, "Parser")
+        .def(py::init<bool>(), py::arg("compact")=false)
+        .def("feed", &Parser::feed, py::arg("chunk"))
+        .def("finish", &Parser::finish);
+
+    m.def("parse" , &parse , py::arg("code"), py::arg("compact")=false, py::arg("max_workers")=1);
+    m.def("set_plain_text_skip", [](bool enabled) { plain_text_skip.store(enabled); }, py::arg("enabled"));
+    m.def("parse_many", &parse_many, py::arg("buffers"), py::arg("max_workers")=0, py::arg("compact")=false);
+    m.def("parse_incremental", &parse_incremental, py::arg("previous_result").none(false), py::arg("old_code"), py::arg("new_code"), py::arg("compact")=false);
     m.def("encode", &encode, py::arg("code"));
     m.def("decode", &decode, py::arg("code"));
+    m.def("compress", &compress, py::arg("code"));
+    m.def("decompress", &decompress, py::arg("code"));
+    m.def("encode85", &encode85, py::arg("code"));
+    m.def("decode85", &decode85, py::arg("code"));
 }
 
 #endif // EXPOSE_H
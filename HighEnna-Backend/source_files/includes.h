@@ -8,13 +8,36 @@
 #include <iomanip>
 
 #include <cstdint>
+#include <cstring>
+#include <cctype>
 #include <string>
+#include <vector>
+#include <memory>
+#include <algorithm>
+#include <atomic>
+#include <thread>
+#include <mutex>
+#include <exception>
+#include <stdexcept>
 #include <deque>
+#include <array>
+#include <iterator>
+#include <type_traits>
+#include <bit>
+
+#if defined(__SSE2__) || defined(_M_X64) || defined(_M_AMD64)
+    #define PARSER_SSE2
+    #include <emmintrin.h>
+#endif
 
 namespace py = pybind11;
 
+#include "buffer.h"
+#include "thread_pool.h"
 #include "encoding.h"
 #include "parser.h"
+#include "positions.h"
+#include "serialize.h"
 #include "expose.h"
 
 #endif
\ No newline at end of file
@@ -56,33 +56,65 @@ constexpr const uint8_t dfa[50][256] = {
     {24,38,38,38,38,38,38,38,38,38, 1,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38, 2,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,18,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38}
 };
 
-py::dict parse(const py::bytes& code) {
-    std::string buffer = code;
-    const  char*   code_buffer = buffer.data();
-    const  size_t  code_length = buffer.size();
+// ---------- Parse Tree ----------
 
-    // ---------- Python Variables ----------
+enum class NodeKind : uint8_t {
+    PLAIN_TEXT,EXPRESSION,FOR,IF,EXEC,BLOCK,ELSE
+};
 
-    py::list root;
+constexpr const char* node_kind_names[] = {
+    "plain_text","expression","FOR","IF","EXEC","BLOCK","ELSE"
+};
 
-    py::set vars;
-    py::set vals;
+enum class ErrorCode : uint8_t {
+    LB_OPN_EXP,LB_OPN_ARG,EOF_OPN_EXP,EOF_OPN_ARG,EOF_OPN_CACHE,EOF_OPN_BLK,MULT_CACHE,
+    INV_DIR_POS,INV_DIR_PRE,INV_IDF,EMPTY_ARG,
+    ELSE_ROOT,ELSE_OUT,ELIF_ROOT,ELIF_OUT,ELSE_ELIF,CLOSE_ROOT
+};
 
-    py::list errors;
+constexpr const char* error_code_names[] = {
+    "LB_OPN_EXP","LB_OPN_ARG","EOF_OPN_EXP","EOF_OPN_ARG","EOF_OPN_CACHE","EOF_OPN_BLK","MULT_CACHE",
+    "INV_DIR_POS","INV_DIR_PRE","INV_IDF","EMPTY_ARG",
+    "ELSE_ROOT","ELSE_OUT","ELIF_ROOT","ELIF_OUT","ELSE_ELIF","CLOSE_ROOT"
+};
 
-    std::deque<py::list> tree_stack;
-    tree_stack.push_back(root);
+struct Location {
+    uint64_t line, start, end;
+};
 
-    py::list line_indexes;
-    line_indexes.append(0);
+struct ParseError {
+    ErrorCode code;
+    Location location;
+};
 
-    py::list cache_lines;
+struct ParseName {
+    bool is_var;
+    std::string name;
+};
+
+
+// ---------- Parser State ----------
+
+enum class Directive : uint8_t {
+    FOR,IF,ELSE,ELIF,EXEC,END
+};
+
+enum class vType : uint8_t {
+    VAL,VAR
+};
+
+// Everything the DFA carries from one byte to the next. A copy of it is enough to resume
+// parsing later on from the same byte.
+struct ParserState {
 
-    std::deque<py::tuple> block_headers;
+    // ---------- Tree Variables ----------
+
+    std::vector<int64_t> tree_stack{-1};
+    std::deque<Location> block_headers;
 
     // ---------- Other  Variables ----------
 
-    uint64_t plain_text_start=0, plain_text_end=0;
+    uint64_t plain_text_start=0, plain_text_end=0, plain_text_line=0;
     uint64_t expression_arg_start=0, expression_arg_end=0;
     uint64_t expression_start=0, expression_end=0;
     uint64_t directive_arg_start=0, directive_arg_end=0;
@@ -93,6 +125,11 @@ py::dict parse(const py::bytes& code) {
     uint64_t line_content_start=0;
     uint64_t postfix_content_start=0;
 
+    // Where the '\n' of the last two "\r\n" stood, the '\r' never reaching the DFA
+    uint64_t last_crlf=0, previous_crlf=0;
+    // Bytes still to come before cache_end is final
+    uint8_t cache_tail=0;
+
     bool empty_prefix = true;
     bool cache_found = false;
     bool arg_found = false;
@@ -100,33 +137,277 @@ py::dict parse(const py::bytes& code) {
     bool in_directive_arg=false;
     int64_t bracket_count = 0;
 
-    enum class Directive : uint8_t {
-        FOR,IF,ELSE,ELIF,EXEC,END
-    } directive{};
+    Directive directive{};
+    vType v_type{};
 
-    enum class vType : uint8_t {
-        VAL,VAR
-    } v_type;
-
-    // ---------- DFA CODE ----------
+    // ---------- DFA Variables ----------
 
     uint64_t ptr = 0;
     uint16_t transition = 0;
-    uint8_t& state  = *(reinterpret_cast<uint8_t*>(&transition) + 0); // Least significant byte on LE systems, Most  in BE ones. 
-    uint8_t& pstate = *(reinterpret_cast<uint8_t*>(&transition) + 1); // Most  significant byte on LE systems, Least in BE ones. 
-    // state and pstate are adjusted here for LE systems. For BE systems, swap the '+ 0' and '+ 1' above
-    // state must be the least significant byte and pstate the most significant byte
 
-    while (ptr <= code_length) {
+    // At the start of a line, in plain text and outside of any block
+    bool clean() const {
+        return static_cast<uint8_t>(transition) == 0x01 && tree_stack.size() == 1;
+    }
+
+    // Registers holding an offset into the code
+    static constexpr uint64_t ParserState::* offsets[] = {
+        &ParserState::plain_text_start, &ParserState::plain_text_end,
+        &ParserState::expression_arg_start, &ParserState::expression_arg_end,
+        &ParserState::expression_start, &ParserState::expression_end,
+        &ParserState::directive_arg_start, &ParserState::directive_arg_end,
+        &ParserState::directive_start, &ParserState::directive_end,
+        &ParserState::cache_start, &ParserState::cache_end,
+        &ParserState::cache_line_start, &ParserState::cache_line_end,
+        &ParserState::name_start, &ParserState::name_end,
+        &ParserState::line_content_start, &ParserState::postfix_content_start,
+        &ParserState::last_crlf, &ParserState::previous_crlf,
+        &ParserState::ptr
+    };
+};
+
+// Parser state saved while parsing, along with how much of every output array had been
+// filled at that point.
+struct Checkpoint {
+    ParserState state;
+    size_t nodes, errors, names, line_indexes, cache_lines;
+    int64_t root_last_child;
+};
+
+// Checkpoints are saved on the first clean state after every checkpoint_interval bytes.
+constexpr uint64_t checkpoint_interval = 1 << 14;
+
+// Flat, struct-of-arrays parse tree. Nodes are stored in document (pre-)order, so a
+// parent always precedes its children. Nodes are linked through parent/first_child/
+// next_sibling indexes, -1 meaning none; the root container has no node of its own
+// and its first child, if any, is node 0.
+//
+// start/end hold the node's argument span, the same values the dict form stores in
+// "argument". IF and ELSE nodes have no argument and hold their directive span instead.
+// IF nodes only have BLOCK (IF/ELIF condition) and ELSE children.
+//
+// checkpoints hold the parser state at regular clean points of the code, which lets
+// parse_incremental resume parsing next to an edit instead of from the start.
+struct ParseTree {
+    std::vector<uint8_t>  kind;
+    std::vector<uint64_t> start;
+    std::vector<uint64_t> end;
+    std::vector<uint64_t> line;
+    std::vector<int64_t>  parent;
+    std::vector<int64_t>  first_child;
+    std::vector<int64_t>  next_sibling;
+    std::vector<int64_t>  last_child;
+
+    std::vector<ParseError> errors;
+    std::vector<ParseName> names;
+
+    std::vector<uint64_t> line_indexes{0};
+
+    bool cache_found = false;
+    uint64_t cache_start = 0, cache_end = 0;
+    std::vector<Location> cache_lines;
+
+    uint64_t code_length = 0;
+
+    int64_t root_last_child = -1;
+
+    std::vector<Checkpoint> checkpoints;
+
+    size_t size() const {
+        return kind.size();
+    }
+
+    int64_t add_node(NodeKind node_kind, int64_t node_parent, uint64_t node_start, uint64_t node_end, uint64_t node_line) {
+        int64_t index = static_cast<int64_t>(kind.size());
+
+        kind.push_back(static_cast<uint8_t>(node_kind));
+        start.push_back(node_start);
+        end.push_back(node_end);
+        line.push_back(node_line);
+        parent.push_back(node_parent);
+        first_child.push_back(-1);
+        next_sibling.push_back(-1);
+        last_child.push_back(-1);
+
+        int64_t& previous = node_parent < 0 ? root_last_child : last_child[node_parent];
+        if (previous >= 0)
+            next_sibling[previous] = index;
+        else if (node_parent >= 0)
+            first_child[node_parent] = index;
+        previous = index;
+
+        return index;
+    }
+};
+
+// ---------- Plain Text Scan ----------
+
+// Inside a line of plain text (state 0x26) only '$', '\n' and '\0' move the DFA, and none of
+// the other bytes has an action attached. Returns the offset of the first of them, or of a
+// '\r', which the parser has to see, at or after ptr, or end, 16 bytes at a time where SSE2
+// is available.
+// Off only to check the parser against the byte by byte DFA, see set_plain_text_skip
+std::atomic<bool> plain_text_skip{true};
+
+uint64_t skip_plain_text(const char* code_buffer, uint64_t ptr, const uint64_t end) {
+    #ifdef PARSER_SSE2
+        const __m128i dollar = _mm_set1_epi8('$');
+        const __m128i newline = _mm_set1_epi8('\n');
+        const __m128i carriage_return = _mm_set1_epi8('\r');
+        const __m128i zero = _mm_setzero_si128();
+
+        for (; ptr + 16 <= end; ptr += 16) {
+            const __m128i chunk = _mm_loadu_si128(reinterpret_cast<const __m128i*>(code_buffer + ptr));
+            const __m128i hits = _mm_or_si128(
+                _mm_or_si128(_mm_cmpeq_epi8(chunk, dollar), _mm_cmpeq_epi8(chunk, newline)),
+                _mm_or_si128(_mm_cmpeq_epi8(chunk, carriage_return), _mm_cmpeq_epi8(chunk, zero)));
+            const unsigned mask = static_cast<unsigned>(_mm_movemask_epi8(hits));
+            if (mask)
+                return ptr + std::countr_zero(mask);
+        }
+    #endif
+
+    while (ptr < end && code_buffer[ptr] != '\r' && dfa[0x26][static_cast<uint8_t>(code_buffer[ptr])] == 0x26)
+        ++ptr;
+    return ptr;
+}
+
+// ---------- Parser ----------
+
+class TemplateParser : public ParserState {
+public:
+    TemplateParser(const char* code_buffer, const uint64_t code_length, ParseTree& tree)
+        : code_buffer(code_buffer), buffer_end(code_length), tree(tree), line_indexes(tree.line_indexes) {}
+
+    // Continues from state, the next checkpoint being due checkpoint_interval after the last one
+    void restore(const ParserState& state) {
+        static_cast<ParserState&>(*this) = state;
+        next_checkpoint = tree.checkpoints.empty() ? ptr : tree.checkpoints.back().state.ptr + checkpoint_interval;
+    }
+
+    // Guesses the state at line_start, the byte after a '\n': plain text outside of any
+    // block, with every register unset. Line numbers then count from that line.
+    void assume_clean(const uint64_t line_start) {
+        restore(ParserState{});
+        ptr = line_start;
+        transition = 0x01;
+        plain_text_end = line_start;
+
+        uint64_t previous_line_start = line_start - 1;
+        while (previous_line_start > buffer_start && code_buffer[previous_line_start-1-buffer_start] != '\n')
+            --previous_line_start;
+        line_indexes = {previous_line_start, line_start};
+    }
+
+    // Points the parser at the bytes from offset start to offset end, for input that comes in pieces
+    void set_buffer(const char* buffer, const uint64_t start, const uint64_t end) {
+        code_buffer = buffer;
+        buffer_start = start;
+        buffer_end = end;
+    }
+
+    // Whether the DFA is within a name, which is only read out of the buffer once it ends
+    bool in_name() const {
+        const uint8_t state = static_cast<uint8_t>(transition);
+        return state == 0x19 || state == 0x20;
+    }
+
+    void save_checkpoint() {
+        tree.checkpoints.push_back({*this, tree.size(), tree.errors.size(), tree.names.size(), line_indexes.size(), tree.cache_lines.size(), tree.root_last_child});
+        next_checkpoint = ptr + checkpoint_interval;
+    }
+
+    // Feeds the DFA every byte up to, but not including, the one at end. The '\r' of a "\r\n"
+    // never reaches it, so the pair reads as a plain '\n' while offsets still point into the
+    // input as it is; a lone '\r' is an ordinary byte.
+    void run(const uint64_t end) {
+        const char* const buffer = code_buffer;
+        const uint64_t start = buffer_start, stop = buffer_end;
+
+        while (ptr < end) {
+            if (ptr >= next_checkpoint && clean())
+                save_checkpoint();
+
+            // Plain text runs are jumped over rather than stepped through; the log wants every byte
+            #ifndef PARSER_LOG
+                if (static_cast<uint8_t>(transition) == 0x26 && !in_directive_arg && !cache_tail && plain_text_skip.load(std::memory_order_relaxed)) {
+                    ptr = start + skip_plain_text(buffer, ptr - start, end - start);
+                    if (ptr == end)
+                        break;
+                }
+            #endif
+
+            const char c = buffer[ptr - start];
+            if (c == '\r' && ptr + 1 < stop && buffer[ptr + 1 - start] == '\n') {
+                previous_crlf = last_crlf;
+                last_crlf = ++ptr;
+                continue;
+            }
+
+            step(static_cast<uint8_t>(c));
+        }
+    }
+
+    // Terminating step, which always reads a '\0', then closes whatever is left open
+    void finish(const uint64_t code_length) {
+        step(0);
+        cache_end += cache_tail;
+
+        while (tree_stack.size() > 1) {
+            tree.errors.push_back({ErrorCode::EOF_OPN_BLK, block_headers.front()});
+
+            tree_stack.pop_back();
+            block_headers.pop_front();
+        }
+
+        tree.code_length = code_length;
+        tree.cache_found = cache_found;
+        if (cache_found) {
+            tree.cache_start = cache_start;
+            tree.cache_end = cache_end;
+        } else {
+            tree.cache_start = code_length;
+            tree.cache_end = code_length;
+        }
+    }
+
+private:
+    const char* code_buffer;
+    uint64_t buffer_start = 0, buffer_end;
+    ParseTree& tree;
+    std::vector<uint64_t>& line_indexes;
+    uint64_t next_checkpoint = 0;
+
+    // Offset of the byte the DFA read count bytes before the one at ptr, the '\r' of the
+    // last two "\r\n" not being read
+    uint64_t back(const uint64_t count) const {
+        uint64_t offset = ptr-count;
+        if (last_crlf > offset) --offset;
+        if (previous_crlf > offset) --offset;
+        return offset;
+    }
+
+    // End of the line whose '\n' is at ptr, leaving out the '\r' of a "\r\n"
+    uint64_t line_end() const {
+        return ptr && last_crlf == ptr ? ptr-1 : ptr;
+    }
+
+    // ---------- DFA CODE ----------
+
+    void step(const uint8_t c) {
+        uint8_t& state  = *(reinterpret_cast<uint8_t*>(&transition) + 0); // Least significant byte on LE systems, Most  in BE ones.
+        uint8_t& pstate = *(reinterpret_cast<uint8_t*>(&transition) + 1); // Most  significant byte on LE systems, Least in BE ones.
+        // state and pstate are adjusted here for LE systems. For BE systems, swap the '+ 0' and '+ 1' above
+        // state must be the least significant byte and pstate the most significant byte
+
         pstate = state;
-        state = dfa[state][static_cast<uint8_t>(code_buffer[ptr])];
+        state = dfa[state][c];
 
         #ifdef PARSER_LOG
             std::cout << std::dec << std::setfill(' ') << std::setw(4) << (int)(line_indexes.size()) << ", "
-                      << std::dec << std::setfill(' ') << std::setw(4) << (int)(ptr-line_indexes[line_indexes.size()-1].cast<uint64_t>()) << ", "
+                      << std::dec << std::setfill(' ') << std::setw(4) << (int)(ptr-line_indexes.back()) << ", "
                       << std::dec << std::setfill(' ') << std::setw(4) << std::dec<<(int)(ptr) << ", ";
 
-            char c = code_buffer[ptr];
             switch (c){
             case ' ':
                     std::cout << "sp";
@@ -151,7 +432,12 @@ py::dict parse(const py::bytes& code) {
         #endif
 
         if (in_directive_arg)
-            if (static_cast<uint8_t>(code_buffer[ptr])=='{') ++bracket_count;
+            if (c=='{') ++bracket_count;
+
+        if (cache_tail) {
+            --cache_tail;
+            cache_end = ptr+1;
+        }
 
         switch (state) {
             case 0x01:
@@ -171,7 +457,7 @@ py::dict parse(const py::bytes& code) {
                     #ifdef PARSER_LOG
                         std::cout << "line_indexes.append("<<std::dec<<(int)(ptr+1)<<");";
                     #endif
-                    line_indexes.append(ptr+1);
+                    line_indexes.push_back(ptr+1);
                 } break;
             case 0x02:
                 {
@@ -179,7 +465,7 @@ py::dict parse(const py::bytes& code) {
                         std::cout << "plain_text_end="<<std::dec<<(int)(ptr)<<"; ";
                     #endif
                     plain_text_end = ptr;
-                } 
+                }
             case 0x27:
                 {
                     #ifdef PARSER_LOG
@@ -224,10 +510,7 @@ py::dict parse(const py::bytes& code) {
                         #ifdef PARSER_LOG
                             std::cout << "push plain_text; ";
                         #endif
-                        py::dict node;
-                        node["type"] = "plain_text";
-                        node["argument"] = py::make_tuple(plain_text_start, plain_text_end);
-                        tree_stack.back().append(node);
+                        tree.add_node(NodeKind::PLAIN_TEXT, tree_stack.back(), plain_text_start, plain_text_end, plain_text_line);
                     }
                 } break;
             case 0x15:
@@ -293,11 +576,8 @@ py::dict parse(const py::bytes& code) {
                         std::cout << "expression_end="<<std::dec<<(int)(ptr)<<"; ";
                         std::cout << "push LB_OPN_EXP; ";
                     #endif
-                    expression_end = ptr;
-                    py::dict err;
-                    err["code"] = py::str("LB_OPN_EXP");
-                    err["location"] = py::make_tuple(line_indexes.size()-1,expression_start, expression_end);
-                    errors.append(err);
+                    expression_end = line_end();
+                    tree.errors.push_back({ErrorCode::LB_OPN_EXP, {line_indexes.size()-1,expression_start, expression_end}});
                 } break;
             case 0x0D01:
             case 0x0E01:
@@ -316,12 +596,9 @@ py::dict parse(const py::bytes& code) {
                         std::cout << "push LB_OPN_ARG; ";
                         std::cout << "arg_found=false;";
                     #endif
-                    directive_end = ptr;
+                    directive_end = line_end();
                     arg_found = false;
-                    py::dict err;
-                    err["code"] = py::str("LB_OPN_ARG");
-                    err["location"] = py::make_tuple(line_indexes.size()-1,directive_start, directive_end);
-                    errors.append(err);
+                    tree.errors.push_back({ErrorCode::LB_OPN_ARG, {line_indexes.size()-1,directive_start, directive_end}});
                 } break;
             case 0x0318:
             case 0x1018:
@@ -340,10 +617,7 @@ py::dict parse(const py::bytes& code) {
                         std::cout << "push EOF_OPN_EXP; ";
                     #endif
                     expression_end = ptr;
-                    py::dict err;
-                    err["code"] = py::str("EOF_OPN_EXP");
-                    err["location"] = py::make_tuple(line_indexes.size()-1,expression_start, expression_end);
-                    errors.append(err);
+                    tree.errors.push_back({ErrorCode::EOF_OPN_EXP, {line_indexes.size()-1,expression_start, expression_end}});
                 } break;
             case 0x0D18:
             case 0x0E18:
@@ -361,10 +635,7 @@ py::dict parse(const py::bytes& code) {
                         std::cout << "push EOF_OPN_ARG; ";
                     #endif
                     directive_end = ptr;
-                    py::dict err;
-                    err["code"] = py::str("EOF_OPN_ARG");
-                    err["location"] = py::make_tuple(line_indexes.size()-1,directive_start, directive_end);
-                    errors.append(err);
+                    tree.errors.push_back({ErrorCode::EOF_OPN_ARG, {line_indexes.size()-1,directive_start, directive_end}});
                 } break;
             case 0x2A18:
                 {
@@ -372,10 +643,7 @@ py::dict parse(const py::bytes& code) {
                         #ifdef PARSER_LOG
                             std::cout << "push MULT_CACHE; ";
                         #endif
-                        py::dict err;
-                        err["code"] = py::str("MULT_CACHE");
-                        err["location"] = py::make_tuple(line_indexes.size()-1,ptr-3, ptr);
-                        errors.append(err);
+                        tree.errors.push_back({ErrorCode::MULT_CACHE, {line_indexes.size()-1,back(3), line_end()}});
                         state=0x26;
                         break;
                     }
@@ -389,10 +657,7 @@ py::dict parse(const py::bytes& code) {
                     #ifdef PARSER_LOG
                         std::cout << "push EOF_OPN_CACHE; ";
                     #endif
-                    py::dict err;
-                    err["code"] = py::str("EOF_OPN_CACHE");
-                    err["location"] = py::make_tuple(line_indexes.size()-1,line_indexes[line_indexes.size()-2], ptr);
-                    errors.append(err);
+                    tree.errors.push_back({ErrorCode::EOF_OPN_CACHE, {line_indexes.size()-1,line_indexes[line_indexes.size()-2], ptr}});
                 } break;
             case 0x0018:
             case 0x0118:
@@ -422,10 +687,7 @@ py::dict parse(const py::bytes& code) {
                         #ifdef PARSER_LOG
                             std::cout << "push plain_text; ";
                         #endif
-                        py::dict node;
-                        node["type"] = "plain_text";
-                        node["argument"] = py::make_tuple(plain_text_start, plain_text_end);
-                        tree_stack.back().append(node);
+                        tree.add_node(NodeKind::PLAIN_TEXT, tree_stack.back(), plain_text_start, plain_text_end, plain_text_line);
                     }
                 } break;
             case 0x0026:
@@ -463,17 +725,16 @@ py::dict parse(const py::bytes& code) {
                     #ifdef PARSER_LOG
                         std::cout << "push expression; ";
                     #endif
-                    py::dict node;
-                    node["type"] = "expression";
-                    node["argument"] = py::make_tuple(line_indexes.size()-1,expression_arg_start, expression_arg_end);
-                    tree_stack.back().append(node);
+                    tree.add_node(NodeKind::EXPRESSION, tree_stack.back(), expression_arg_start, expression_arg_end, line_indexes.size()-1);
                 }
             case 0x2B26:
                 {
                     #ifdef PARSER_LOG
-                        std::cout << "cache_end="<<std::dec<<(int)(ptr+1)<<"; ";
+                        std::cout << "cache_end="<<std::dec<<(int)(ptr+6)<<"; ";
                     #endif
-                    cache_end = ptr+6;
+                    // The block is taken to close with "\n'''\n", the next five bytes the DFA reads
+                    cache_end = ptr+1;
+                    cache_tail = 5;
                 }
             case 0x2501:
                 {
@@ -481,6 +742,7 @@ py::dict parse(const py::bytes& code) {
                         std::cout << "plain_text_start="<<std::dec<<(int)(ptr+1)<<"; ";
                     #endif
                     plain_text_start = ptr+1;
+                    plain_text_line = line_indexes.size()-1;
                 } break;
             case 0x1A18:
             case 0x1A01:
@@ -488,14 +750,12 @@ py::dict parse(const py::bytes& code) {
                     #ifdef PARSER_LOG
                         std::cout << "push INV_DIR_POS; ";
                     #endif
-                    py::dict err;
-                    err["code"] = py::str("INV_DIR_POS");
-                    err["location"] = py::make_tuple(line_indexes.size()-1,postfix_content_start, ptr);
-                    errors.append(err);
+                    tree.errors.push_back({ErrorCode::INV_DIR_POS, {line_indexes.size()-1,postfix_content_start, line_end()}});
                     #ifdef PARSER_LOG
                         std::cout << "plain_text_start="<<std::dec<<(int)(ptr+1)<<"; ";
                     #endif
                     plain_text_start = ptr+1;
+                    plain_text_line = line_indexes.size()-1;
                 } break;
             case 0x1723:
             case 0x170F:
@@ -505,10 +765,7 @@ py::dict parse(const py::bytes& code) {
                     #ifdef PARSER_LOG
                         std::cout << "push INV_IDF; ";
                     #endif
-                    py::dict err;
-                    err["code"] = py::str("INV_IDF");
-                    err["location"] = py::make_tuple(line_indexes.size(),ptr-4, ptr+1);
-                    errors.append(err);
+                    tree.errors.push_back({ErrorCode::INV_IDF, {line_indexes.size(),back(4), ptr+1}});
                 } break;
             case 0x2A2D:
                 {
@@ -516,14 +773,11 @@ py::dict parse(const py::bytes& code) {
                         #ifdef PARSER_LOG
                             std::cout << "push MULT_CACHE; ";
                         #endif
-                        py::dict err;
-                        err["code"] = py::str("MULT_CACHE");
-                        err["location"] = py::make_tuple(line_indexes.size(),ptr-3, ptr);
-                        errors.append(err);
+                        tree.errors.push_back({ErrorCode::MULT_CACHE, {line_indexes.size(),back(3), line_end()}});
                         state=0x26;
                         break;
                     }
-                    cache_start = ptr-8;
+                    cache_start = back(8);
                     cache_found = true;
                 } break;
             case 0x2A2E:
@@ -532,14 +786,11 @@ py::dict parse(const py::bytes& code) {
                         #ifdef PARSER_LOG
                             std::cout << "push MULT_CACHE; ";
                         #endif
-                        py::dict err;
-                        err["code"] = py::str("MULT_CACHE");
-                        err["location"] = py::make_tuple(line_indexes.size()-1,ptr-3, ptr);
-                        errors.append(err);
+                        tree.errors.push_back({ErrorCode::MULT_CACHE, {line_indexes.size()-1,back(3), line_end()}});
                         state=0x01;
                         break;
                     }
-                    cache_start = ptr-8;
+                    cache_start = back(8);
                     cache_found = true;
                 } break;
             case 0x2A2C:
@@ -548,14 +799,11 @@ py::dict parse(const py::bytes& code) {
                         #ifdef PARSER_LOG
                             std::cout << "push MULT_CACHE; ";
                         #endif
-                        py::dict err;
-                        err["code"] = py::str("MULT_CACHE");
-                        err["location"] = py::make_tuple(line_indexes.size(),ptr-3, ptr);
-                        errors.append(err);
+                        tree.errors.push_back({ErrorCode::MULT_CACHE, {line_indexes.size(),back(3), line_end()}});
                         state=0x26;
                         break;
                     }
-                    cache_start = ptr-8;
+                    cache_start = back(8);
                     cache_found = true;
                 }
             case 0x2D2C:
@@ -575,8 +823,8 @@ py::dict parse(const py::bytes& code) {
                     #ifdef PARSER_LOG
                         std::cout << "cache_line_end="<<std::dec<<(int)(ptr)<<"; push cache_line; ";
                     #endif
-                    cache_line_end = ptr;
-                    cache_lines.append(py::make_tuple(line_indexes.size()-1,cache_line_start, cache_line_end));
+                    cache_line_end = line_end();
+                    tree.cache_lines.push_back({line_indexes.size()-1,cache_line_start, cache_line_end});
                 } break;
             case 0x0311:
             case 0x0321:
@@ -630,10 +878,7 @@ py::dict parse(const py::bytes& code) {
                         #ifdef PARSER_LOG
                             std::cout << "push plain_text; ";
                         #endif
-                        py::dict node;
-                        node["type"] = "plain_text";
-                        node["argument"] = py::make_tuple(plain_text_start, plain_text_end);
-                        tree_stack.back().append(node);
+                        tree.add_node(NodeKind::PLAIN_TEXT, tree_stack.back(), plain_text_start, plain_text_end, plain_text_line);
                     }
                 }
             case 0x2325:
@@ -650,21 +895,15 @@ py::dict parse(const py::bytes& code) {
                             std::cout << "push INV_DIR_PRE; ";
                         #endif
 
-                        py::dict err;
-                        err["code"] = py::str("INV_DIR_PRE");
-                        err["location"] = py::make_tuple(line_indexes.size(),line_content_start,directive_start);
-                        errors.append(err);
+                        tree.errors.push_back({ErrorCode::INV_DIR_PRE, {line_indexes.size(),line_content_start,directive_start}});
                     }
-         
+
                     if (directive_start<directive_arg_start && !arg_found){
                         #ifdef PARSER_LOG
                             std::cout << "push EMPTY_ARG; ";
                         #endif
 
-                        py::dict err;
-                        err["code"] = py::str("EMPTY_ARG");
-                        err["location"] = py::make_tuple(line_indexes.size(),directive_arg_start-1, directive_arg_end+1);
-                        errors.append(err);
+                        tree.errors.push_back({ErrorCode::EMPTY_ARG, {line_indexes.size(),directive_arg_start-1, directive_arg_end+1}});
                     }
 
                     switch(directive){
@@ -674,17 +913,10 @@ py::dict parse(const py::bytes& code) {
                                     std::cout << "push FOR; ";
                                 #endif
 
-                                py::dict node;
-                                node["type"] = "FOR";
-                                node["argument"] = py::make_tuple(line_indexes.size()-1,directive_arg_start, directive_arg_end);
+                                int64_t node = tree.add_node(NodeKind::FOR, tree_stack.back(), directive_arg_start, directive_arg_end, line_indexes.size()-1);
+                                tree_stack.push_back(node);
 
-                                py::list subtree;
-                                node["subtree"] = subtree;
-
-                                tree_stack.back().append(node);
-                                tree_stack.push_back(subtree);
-                                
-                                block_headers.push_back(py::make_tuple(line_indexes.size(),directive_start, ptr+1));
+                                block_headers.push_back({line_indexes.size(),directive_start, ptr+1});
                             } break;
                         case Directive::IF:
                             {
@@ -692,23 +924,11 @@ py::dict parse(const py::bytes& code) {
                                     std::cout << "push IF; ";
                                 #endif
 
-                                py::dict node;
-                                node["type"] = "IF";
-
-                                py::list blocks;
-                                node["blocks"] = blocks;
-
-                                py::dict block;
-                                block["argument"] = py::make_tuple(line_indexes.size()-1,directive_arg_start, directive_arg_end);
-
-                                py::list subtree;
-                                block["subtree"] = subtree;
+                                int64_t node = tree.add_node(NodeKind::IF, tree_stack.back(), directive_start, ptr+1, line_indexes.size()-1);
+                                int64_t block = tree.add_node(NodeKind::BLOCK, node, directive_arg_start, directive_arg_end, line_indexes.size()-1);
+                                tree_stack.push_back(block);
 
-                                blocks.append(block);
-                                tree_stack.back().append(node);
-                                tree_stack.push_back(subtree);
-
-                                block_headers.push_back(py::make_tuple(line_indexes.size(),directive_start, ptr+1));
+                                block_headers.push_back({line_indexes.size(),directive_start, ptr+1});
                             } break;
                         case Directive::ELSE:
                             {
@@ -717,26 +937,18 @@ py::dict parse(const py::bytes& code) {
                                         std::cout << "push ELSE_ROOT; ";
                                     #endif
 
-                                    py::dict err;
-                                    err["code"] = py::str("ELSE_ROOT");
-                                    err["location"] = py::make_tuple(line_indexes.size(),line_content_start+1, ptr);
-                                    errors.append(err);
+                                    tree.errors.push_back({ErrorCode::ELSE_ROOT, {line_indexes.size(),line_content_start+1, ptr}});
                                     break;
                                 }
 
-                                py::list parent_subtree = tree_stack[tree_stack.size() - 2];
-                                py::dict parent_node = parent_subtree[parent_subtree.size() - 1];
-                                py::str parent_node_type = parent_node["type"];
+                                int64_t current_block = tree_stack.back();
 
-                                if ((std::string)parent_node_type != "IF") {
+                                if (tree.kind[current_block] == static_cast<uint8_t>(NodeKind::FOR)) {
                                     #ifdef PARSER_LOG
                                         std::cout << "push ELSE_OUT; ";
                                     #endif
 
-                                    py::dict err;
-                                    err["code"] = py::str("ELSE_OUT");
-                                    err["location"] = py::make_tuple(line_indexes.size(),line_content_start+1, ptr);
-                                    errors.append(err);
+                                    tree.errors.push_back({ErrorCode::ELSE_OUT, {line_indexes.size(),line_content_start+1, ptr}});
                                     break;
                                 }
 
@@ -744,19 +956,13 @@ py::dict parse(const py::bytes& code) {
                                     std::cout << "push ELSE; ";
                                 #endif
 
-                                py::list parent_node_blocks = parent_node["blocks"];
-
-                                py::dict block;
-                                py::list subtree;
-                                block["subtree"] = subtree;
-
-                                parent_node_blocks.append(block);
+                                int64_t block = tree.add_node(NodeKind::ELSE, tree.parent[current_block], directive_start, ptr+1, line_indexes.size()-1);
 
                                 tree_stack.pop_back();
-                                tree_stack.push_back(subtree);
+                                tree_stack.push_back(block);
 
                                 block_headers.pop_back();
-                                block_headers.push_back(py::make_tuple(line_indexes.size(),directive_start, ptr+1));
+                                block_headers.push_back({line_indexes.size(),directive_start, ptr+1});
                             } break;
                         case Directive::ELIF:
                             {
@@ -765,41 +971,27 @@ py::dict parse(const py::bytes& code) {
                                         std::cout << "push ELIF_ROOT; ";
                                     #endif
 
-                                    py::dict err;
-                                    err["code"] = py::str("ELIF_ROOT");
-                                    err["location"] = py::make_tuple(line_indexes.size(),line_content_start+1, ptr);
-                                    errors.append(err);
+                                    tree.errors.push_back({ErrorCode::ELIF_ROOT, {line_indexes.size(),line_content_start+1, ptr}});
                                     break;
                                 }
 
-                                py::list parent_subtree = tree_stack[tree_stack.size() - 2];
-                                py::dict parent_node = parent_subtree[parent_subtree.size() - 1];
-                                py::str parent_node_type = parent_node["type"];
+                                int64_t current_block = tree_stack.back();
 
-                                if ((std::string)parent_node_type != "IF") {
+                                if (tree.kind[current_block] == static_cast<uint8_t>(NodeKind::FOR)) {
                                     #ifdef PARSER_LOG
                                         std::cout << "push ELIF_OUT; ";
                                     #endif
 
-                                    py::dict err;
-                                    err["code"] = py::str("ELIF_OUT");
-                                    err["location"] = py::make_tuple(line_indexes.size(),line_content_start+1, ptr);
-                                    errors.append(err);
+                                    tree.errors.push_back({ErrorCode::ELIF_OUT, {line_indexes.size(),line_content_start+1, ptr}});
                                     break;
                                 }
 
-                                py::list parent_node_blocks = parent_node["blocks"];
-
-                                py::dict previous_block = parent_node_blocks[parent_node_blocks.size() - 1];
-                                if (!previous_block.contains("argument")) {
+                                if (tree.kind[current_block] == static_cast<uint8_t>(NodeKind::ELSE)) {
                                     #ifdef PARSER_LOG
                                         std::cout << "push ELSE_ELIF; ";
                                     #endif
 
-                                    py::dict err;
-                                    err["code"] = py::str("ELSE_ELIF");
-                                    err["location"] = py::make_tuple(line_indexes.size(),line_content_start+1, ptr);
-                                    errors.append(err);
+                                    tree.errors.push_back({ErrorCode::ELSE_ELIF, {line_indexes.size(),line_content_start+1, ptr}});
                                     break;
                                 }
 
@@ -807,19 +999,13 @@ py::dict parse(const py::bytes& code) {
                                     std::cout << "push ELIF; ";
                                 #endif
 
-                                py::dict block;
-                                block["argument"] = py::make_tuple(line_indexes.size()-1,directive_arg_start, directive_arg_end);
-
-                                py::list subtree;
-                                block["subtree"] = subtree;
-
-                                parent_node_blocks.append(block);
+                                int64_t block = tree.add_node(NodeKind::BLOCK, tree.parent[current_block], directive_arg_start, directive_arg_end, line_indexes.size()-1);
 
                                 tree_stack.pop_back();
-                                tree_stack.push_back(subtree);
+                                tree_stack.push_back(block);
 
                                 block_headers.pop_back();
-                                block_headers.push_back(py::make_tuple(line_indexes.size(),directive_start, ptr+1));
+                                block_headers.push_back({line_indexes.size(),directive_start, ptr+1});
                             } break;
                         case Directive::EXEC:
                             {
@@ -827,10 +1013,7 @@ py::dict parse(const py::bytes& code) {
                                     std::cout << "push EXEC; ";
                                 #endif
 
-                                py::dict node;
-                                node["type"] = "EXEC";
-                                node["argument"] = py::make_tuple(line_indexes.size()-1,directive_arg_start, directive_arg_end);
-                                tree_stack.back().append(node);
+                                tree.add_node(NodeKind::EXEC, tree_stack.back(), directive_arg_start, directive_arg_end, line_indexes.size()-1);
 
                             } break;
                         case Directive::END:
@@ -840,10 +1023,7 @@ py::dict parse(const py::bytes& code) {
                                         std::cout << "push CLOSE_ROOT; ";
                                     #endif
 
-                                    py::dict err;
-                                    err["code"] = py::str("CLOSE_ROOT");
-                                    err["location"] = py::make_tuple(line_indexes.size(),line_content_start, ptr+1);
-                                    errors.append(err);
+                                    tree.errors.push_back({ErrorCode::CLOSE_ROOT, {line_indexes.size(),line_content_start, ptr+1}});
                                     break;
                                 }
 
@@ -877,68 +1057,627 @@ py::dict parse(const py::bytes& code) {
                         std::cout << "name_end="<<std::dec<<(int)(ptr)<<"; ";
                     #endif
                     name_end = ptr;
-                    py::str name = py::str(reinterpret_cast<const char*>(code_buffer + name_start), name_end - name_start);
+                    std::string name(code_buffer + (name_start - buffer_start), name_end - name_start);
+                    name.erase(std::remove(name.begin(), name.end(), '\r'), name.end());
                     switch(v_type){
                         case vType::VAL:
                             {
                                 #ifdef PARSER_LOG
                                     std::cout << "push VAL; ";
                                 #endif
-                                vals.add(name);
+                                tree.names.push_back({false, std::move(name)});
                             } break;
                         case vType::VAR:
                             {
                                 #ifdef PARSER_LOG
                                     std::cout << "push VAR; ";
                                 #endif
-                                vars.add(name);
+                                tree.names.push_back({true, std::move(name)});
                             } break;
                     }
                 } break;
         }
 
         if (in_directive_arg)
-            if (static_cast<uint8_t>(code_buffer[ptr])=='}') --bracket_count;
+            if (c=='}') --bracket_count;
 
         ++ptr;
         #ifdef PARSER_LOG
             std::cout << std::endl;
         #endif
     }
+};
 
-    while (tree_stack.size() > 1) {
-        py::dict err;
-        err["code"] = py::str("EOF_OPN_BLK");
-        err["location"] = block_headers.front();
-        errors.append(err);
+void parse_tree(const char* code_buffer, const uint64_t code_length, ParseTree& tree) {
+    TemplateParser parser(code_buffer, code_length, tree);
+    parser.save_checkpoint();
+    parser.run(code_length);
+    parser.finish(code_length);
+}
+
+// ---------- Incremental Parse ----------
 
-        tree_stack.pop_front();
-        block_headers.pop_front();
+// Maps offsets of the old code onto the new one, given the range [edit_start, edit_end) of
+// the old code that was replaced: offsets before it stay put, offsets after it move by delta.
+struct Shift {
+    uint64_t edit_start, edit_end;
+    int64_t delta;
+
+    uint64_t offset(uint64_t value) const {
+        return value < edit_start ? value : value + delta;
     }
 
-    py::dict result;
+    // Lines are counted up to some anchor offset, lines anchored after the edit move by line_delta
+    uint64_t line(uint64_t value, uint64_t anchor, int64_t line_delta) const {
+        return anchor < edit_start ? value : value + line_delta;
+    }
+
+    Location location(const Location& location, int64_t line_delta) const {
+        return {location.line + line_delta, offset(location.start), offset(location.end)};
+    }
 
-    result["errors"] = errors;
+    // The DFA also emits offsets one byte off its registers, so a register right next to
+    // the edit could end up on either side of it and never maps safely
+    bool maps(uint64_t old_value, uint64_t new_value) const {
+        if (delta != 0 && old_value + 1 >= edit_start && old_value <= edit_end)
+            return false;
+        return offset(old_value) == new_value;
+    }
 
-    result["tree"] = root;
+    ParserState state(const ParserState& old_state, int64_t node_delta, int64_t line_delta) const {
+        ParserState new_state = old_state;
+        for (int64_t& node : new_state.tree_stack)
+            if (node >= 0)
+                node += node_delta;
+        for (Location& block_header : new_state.block_headers)
+            block_header = location(block_header, line_delta);
+        for (uint64_t ParserState::* value : ParserState::offsets)
+            new_state.*value = offset(old_state.*value);
+        new_state.plain_text_line = line(old_state.plain_text_line, old_state.plain_text_start, line_delta);
+        return new_state;
+    }
+};
+
+// Whether the new parse, having reached the spot of an old checkpoint past the edit, would
+// from there on do exactly what the old parse did. Only the registers the DFA may still
+// read before overwriting them at a clean state are compared; the others are dead there,
+// and so is cache_start as long as no cache was found.
+bool can_resume(const ParserState& current, const ParseTree& tree, const Checkpoint& checkpoint, const ParseTree& previous, const Shift& shift) {
+    const ParserState& old_state = checkpoint.state;
+    const int64_t line_delta = static_cast<int64_t>(tree.line_indexes.size()) - static_cast<int64_t>(checkpoint.line_indexes);
+
+    return current.clean()
+        && current.empty_prefix == old_state.empty_prefix
+        && current.cache_found == old_state.cache_found
+        && current.arg_found == old_state.arg_found
+        && current.directive == old_state.directive
+        && current.cache_tail == old_state.cache_tail
+        && current.plain_text_line == shift.line(old_state.plain_text_line, old_state.plain_text_start, line_delta)
+        && shift.maps(old_state.plain_text_start, current.plain_text_start)
+        && shift.maps(old_state.plain_text_end, current.plain_text_end)
+        && shift.maps(old_state.directive_arg_start, current.directive_arg_start)
+        && (!current.cache_found || shift.maps(old_state.cache_start, current.cache_start))
+        && shift.maps(old_state.cache_end, current.cache_end)
+        && shift.maps(old_state.cache_line_start, current.cache_line_start)
+        && shift.maps(previous.line_indexes[checkpoint.line_indexes-2], tree.line_indexes[tree.line_indexes.size()-2]);
+}
+
+// Appends the nodes, errors, names, lines and checkpoints the old parse produced after
+// checkpoint first, shifted onto the new code
+void splice_tree(const ParseTree& previous, size_t first, const Shift& shift, ParseTree& tree) {
+    const Checkpoint& resume = previous.checkpoints[first];
+
+    const int64_t node_delta = static_cast<int64_t>(tree.size()) - static_cast<int64_t>(resume.nodes);
+    const int64_t line_delta = static_cast<int64_t>(tree.line_indexes.size()) - static_cast<int64_t>(resume.line_indexes);
+    const int64_t error_delta = static_cast<int64_t>(tree.errors.size()) - static_cast<int64_t>(resume.errors);
+    const int64_t name_delta = static_cast<int64_t>(tree.names.size()) - static_cast<int64_t>(resume.names);
+    const int64_t cache_line_delta = static_cast<int64_t>(tree.cache_lines.size()) - static_cast<int64_t>(resume.cache_lines);
+    const int64_t root_last_child = tree.root_last_child;
+
+    for (size_t i = resume.nodes; i < previous.size(); ++i) {
+        const NodeKind kind = static_cast<NodeKind>(previous.kind[i]);
+        const int64_t parent = previous.parent[i] < 0 ? -1 : previous.parent[i] + node_delta;
+        const uint64_t line = kind == NodeKind::PLAIN_TEXT
+            ? shift.line(previous.line[i], previous.start[i], line_delta)
+            : previous.line[i] + line_delta;
+        tree.add_node(kind, parent, shift.offset(previous.start[i]), shift.offset(previous.end[i]), line);
+    }
+
+    for (size_t i = resume.errors; i < previous.errors.size(); ++i)
+        tree.errors.push_back({previous.errors[i].code, shift.location(previous.errors[i].location, line_delta)});
+
+    tree.names.insert(tree.names.end(), previous.names.begin() + resume.names, previous.names.end());
+
+    for (size_t i = resume.line_indexes; i < previous.line_indexes.size(); ++i)
+        tree.line_indexes.push_back(shift.offset(previous.line_indexes[i]));
+
+    for (size_t i = resume.cache_lines; i < previous.cache_lines.size(); ++i)
+        tree.cache_lines.push_back(shift.location(previous.cache_lines[i], line_delta));
+
+    for (size_t i = first; i < previous.checkpoints.size(); ++i) {
+        const Checkpoint& checkpoint = previous.checkpoints[i];
+        tree.checkpoints.push_back({
+            shift.state(checkpoint.state, node_delta, line_delta),
+            checkpoint.nodes + node_delta,
+            checkpoint.errors + error_delta,
+            checkpoint.names + name_delta,
+            checkpoint.line_indexes + line_delta,
+            checkpoint.cache_lines + cache_line_delta,
+            checkpoint.root_last_child >= static_cast<int64_t>(resume.nodes) ? checkpoint.root_last_child + node_delta : root_last_child
+        });
+    }
+}
+
+// Parses new_code given previous, the tree of old_code. The DFA resumes from the last
+// checkpoint before the first changed byte, and as soon as it reaches one of the old
+// checkpoints past the last changed byte in a matching state, the rest of the old tree is
+// spliced in instead of being parsed again.
+void reparse_tree(const ParseTree& previous, const char* old_code, const uint64_t old_length, const char* new_code, const uint64_t new_length, ParseTree& tree) {
+    if (previous.code_length != old_length)
+        throw std::invalid_argument("previous_result was not parsed from old_code");
+
+    if (previous.checkpoints.empty()) {
+        parse_tree(new_code, new_length, tree);
+        return;
+    }
+
+    const uint64_t common = std::min(old_length, new_length);
+    const uint64_t prefix = std::mismatch(old_code, old_code + common, new_code).first - old_code;
+    uint64_t suffix = 0;
+    while (suffix < common - prefix && old_code[old_length-1-suffix] == new_code[new_length-1-suffix])
+        ++suffix;
+
+    const Shift shift{prefix, old_length - suffix, static_cast<int64_t>(new_length) - static_cast<int64_t>(old_length)};
+
+    const auto by_position = [](uint64_t position, const Checkpoint& checkpoint) { return position < checkpoint.state.ptr; };
+    const auto restart = std::upper_bound(previous.checkpoints.begin(), previous.checkpoints.end(), prefix, by_position) - 1;
+
+    const auto copy_prefix = [](auto& to, const auto& from, size_t count) { to.assign(from.begin(), from.begin() + count); };
+    copy_prefix(tree.kind, previous.kind, restart->nodes);
+    copy_prefix(tree.start, previous.start, restart->nodes);
+    copy_prefix(tree.end, previous.end, restart->nodes);
+    copy_prefix(tree.line, previous.line, restart->nodes);
+    copy_prefix(tree.parent, previous.parent, restart->nodes);
+    copy_prefix(tree.first_child, previous.first_child, restart->nodes);
+    copy_prefix(tree.next_sibling, previous.next_sibling, restart->nodes);
+    copy_prefix(tree.last_child, previous.last_child, restart->nodes);
+    copy_prefix(tree.errors, previous.errors, restart->errors);
+    copy_prefix(tree.names, previous.names, restart->names);
+    copy_prefix(tree.line_indexes, previous.line_indexes, restart->line_indexes);
+    copy_prefix(tree.cache_lines, previous.cache_lines, restart->cache_lines);
+    copy_prefix(tree.checkpoints, previous.checkpoints, restart - previous.checkpoints.begin() + 1);
+
+    // Checkpoints are outside of any block, so only the last root node can link past them
+    tree.root_last_child = restart->root_last_child;
+    if (tree.root_last_child >= 0)
+        tree.next_sibling[tree.root_last_child] = -1;
+
+    TemplateParser parser(new_code, new_length, tree);
+    parser.restore(restart->state);
+
+    for (auto resume = std::upper_bound(previous.checkpoints.begin(), previous.checkpoints.end(), shift.edit_end, by_position); resume != previous.checkpoints.end(); ++resume) {
+        parser.run(shift.offset(resume->state.ptr));
+        if (can_resume(parser, tree, *resume, previous, shift)) {
+            splice_tree(previous, resume - previous.checkpoints.begin(), shift, tree);
+
+            tree.code_length = new_length;
+            tree.cache_found = previous.cache_found;
+            tree.cache_start = shift.offset(previous.cache_start);
+            tree.cache_end = shift.offset(previous.cache_end);
+            return;
+        }
+    }
+
+    parser.run(new_length);
+    parser.finish(new_length);
+}
+
+// ---------- Parallel Parse ----------
+
+// Below this size parse_tree_parallel just runs parse_tree.
+constexpr uint64_t parallel_threshold = 1 << 22;
+
+// Parses one large buffer on up to max_workers threads, with the same result as parse_tree.
+// The buffer is cut in chunks right after a '\n'. The first chunk is parsed for real and
+// every other one speculatively, assuming it starts clean. Chunks are then stitched in
+// order: the real parser carries on into the next chunk until it reaches one of its
+// checkpoints in a matching state, and the rest of the chunk is spliced in from there.
+// A chunk whose guess never matches ends up parsed by the real parser on its own.
+void parse_tree_parallel(const char* code_buffer, const uint64_t code_length, ParseTree& tree, size_t max_workers) {
+    if (max_workers == 0)
+        max_workers = std::max<size_t>(1, std::thread::hardware_concurrency());
+
+    if (max_workers <= 1 || code_length < parallel_threshold) {
+        parse_tree(code_buffer, code_length, tree);
+        return;
+    }
+
+    std::vector<uint64_t> bounds{0};
+    for (size_t i = 1; i < max_workers; ++i) {
+        const uint64_t target = std::max(code_length / max_workers * i, bounds.back());
+        const void* newline = std::memchr(code_buffer + target, '\n', code_length - target);
+        if (!newline)
+            break;
+        const uint64_t bound = static_cast<const char*>(newline) - code_buffer + 1;
+        if (bound > bounds.back() && bound < code_length)
+            bounds.push_back(bound);
+    }
+    bounds.push_back(code_length);
+
+    const size_t chunks = bounds.size() - 1;
+    std::vector<ParseTree> chunk_trees(chunks);
+    std::vector<std::unique_ptr<TemplateParser>> parsers(chunks);
+    std::vector<std::exception_ptr> exceptions(chunks);
+
+    parsers[0] = std::make_unique<TemplateParser>(code_buffer, code_length, tree);
+    parsers[0]->save_checkpoint();
+    for (size_t i = 1; i < chunks; ++i) {
+        parsers[i] = std::make_unique<TemplateParser>(code_buffer, code_length, chunk_trees[i]);
+        parsers[i]->assume_clean(bounds[i]);
+    }
+
+    parallel_for(chunks, max_workers, [&](size_t i) {
+        try {
+            parsers[i]->run(bounds[i+1]);
+        } catch (...) {
+            exceptions[i] = std::current_exception();
+        }
+    });
+
+    for (const std::exception_ptr& exception : exceptions)
+        if (exception)
+            std::rethrow_exception(exception);
+
+    TemplateParser& parser = *parsers[0];
+    const Shift same{0, 0, 0};
+
+    for (size_t i = 1; i < chunks; ++i) {
+        const ParseTree& chunk = chunk_trees[i];
+
+        for (auto resume = chunk.checkpoints.begin(); resume != chunk.checkpoints.end(); ++resume) {
+            parser.run(resume->state.ptr);
+            if (can_resume(parser, tree, *resume, chunk, same)) {
+                const int64_t node_delta = static_cast<int64_t>(tree.size()) - static_cast<int64_t>(resume->nodes);
+                const int64_t line_delta = static_cast<int64_t>(tree.line_indexes.size()) - static_cast<int64_t>(resume->line_indexes);
+
+                splice_tree(chunk, resume - chunk.checkpoints.begin(), same, tree);
+                parser.restore(same.state(*parsers[i], node_delta, line_delta));
+                break;
+            }
+        }
+
+        parser.run(bounds[i+1]);
+    }
+
+    parser.finish(code_length);
+}
+
+// ---------- Streaming Parse ----------
+
+// Parses code handed over in consecutive chunks, with the same result as parse_tree on all
+// of it at once. Between chunks only the bytes the parser may still have to read again are
+// kept: the start of a name cut by the end of the chunk, or a trailing '\r', which is only
+// known to be part of a "\r\n" once the next chunk comes.
+class StreamParser {
+public:
+    StreamParser() : tree(std::make_shared<ParseTree>()), parser(nullptr, 0, *tree) {
+        parser.save_checkpoint();
+    }
+
+    void feed(const char* chunk, const uint64_t length) {
+        const char* buffer = chunk;
+        uint64_t buffer_start = code_length;
+        if (!carry.empty()) {
+            buffer_start -= carry.size();
+            carry.append(chunk, length);
+            buffer = carry.data();
+        }
+        code_length += length;
+
+        parser.set_buffer(buffer, buffer_start, code_length);
+        const bool trailing_cr = code_length > buffer_start && buffer[code_length - buffer_start - 1] == '\r';
+        parser.run(code_length - trailing_cr);
+
+        const uint64_t keep = parser.in_name() ? parser.name_start : parser.ptr;
+        carry = std::string(buffer + (keep - buffer_start), code_length - keep);
+    }
+
+    std::shared_ptr<ParseTree> finish() {
+        parser.set_buffer(carry.data(), code_length - carry.size(), code_length);
+        parser.run(code_length);
+        parser.finish(code_length);
+        carry.clear();
+        return tree;
+    }
+
+private:
+    std::shared_ptr<ParseTree> tree;
+    TemplateParser parser;
+    std::string carry;
+    uint64_t code_length = 0;
+};
+
+// ---------------- PYTHON-FACING FUNCTIONS ----------------
+
+// Read-only typed view over one of a ParseTree's arrays, exposed through the buffer protocol.
+// It shares ownership of the tree, so the memory stays valid for as long as the view lives.
+template <typename T>
+struct ArrayView {
+    std::shared_ptr<ParseTree> owner;
+    const std::vector<T>* data;
+};
+
+template <typename T>
+ArrayView<T> array_view(const std::shared_ptr<ParseTree>& tree, const std::vector<T>& data) {
+    return ArrayView<T>{tree, &data};
+}
+
+py::tuple location_to_tuple(const Location& location) {
+    return py::make_tuple(location.line, location.start, location.end);
+}
+
+py::list errors_to_list(const ParseTree& tree) {
+    py::list errors;
+    for (const ParseError& error : tree.errors) {
+        py::dict err;
+        err["code"] = py::str(error_code_names[static_cast<uint8_t>(error.code)]);
+        err["location"] = location_to_tuple(error.location);
+        errors.append(err);
+    }
+    return errors;
+}
+
+py::dict names_to_dict(const ParseTree& tree) {
+    py::set vars;
+    py::set vals;
+    for (const ParseName& name : tree.names) {
+        if (name.is_var)
+            vars.add(py::str(name.name));
+        else
+            vals.add(py::str(name.name));
+    }
 
     py::dict names;
     names["vars"] = vars;
     names["vals"] = vals;
-    result["names"] = names;
+    return names;
+}
+
+py::dict cache_to_dict(const ParseTree& tree) {
+    py::list cache_lines;
+    for (const Location& cache_line : tree.cache_lines)
+        cache_lines.append(location_to_tuple(cache_line));
 
     py::dict cache;
-    cache["found"] = cache_found;
-    if (cache_found)
-        cache["location"] = py::make_tuple(cache_start, cache_end);
-    else
-        cache["location"] = py::make_tuple(code_length, code_length);
+    cache["found"] = tree.cache_found;
+    cache["location"] = py::make_tuple(tree.cache_start, tree.cache_end);
     cache["lines"] = cache_lines;
-    result["cache"] = cache;
+    return cache;
+}
+
+py::list line_indexes_to_list(const ParseTree& tree) {
+    py::list line_indexes;
+    for (uint64_t line_index : tree.line_indexes)
+        line_indexes.append(line_index);
+    return line_indexes;
+}
+
+py::list tree_to_list(const ParseTree& tree) {
+    py::list root;
+
+    // Nodes come in document order, so every node can be appended straight to the list
+    // of its parent. Holds the subtree of FOR/BLOCK/ELSE nodes and the blocks of IF nodes.
+    std::vector<py::object> containers(tree.size());
+
+    for (size_t i = 0; i < tree.size(); ++i) {
+        py::list siblings = tree.parent[i] < 0 ? root : py::reinterpret_borrow<py::list>(containers[tree.parent[i]]);
+
+        switch (static_cast<NodeKind>(tree.kind[i])) {
+            case NodeKind::PLAIN_TEXT:
+                {
+                    py::dict node;
+                    node["type"] = "plain_text";
+                    node["argument"] = py::make_tuple(tree.start[i], tree.end[i]);
+                    siblings.append(node);
+                } break;
+            case NodeKind::EXPRESSION:
+            case NodeKind::EXEC:
+                {
+                    py::dict node;
+                    node["type"] = node_kind_names[tree.kind[i]];
+                    node["argument"] = py::make_tuple(tree.line[i], tree.start[i], tree.end[i]);
+                    siblings.append(node);
+                } break;
+            case NodeKind::FOR:
+                {
+                    py::dict node;
+                    node["type"] = "FOR";
+                    node["argument"] = py::make_tuple(tree.line[i], tree.start[i], tree.end[i]);
 
-    result["line_indexes"] = line_indexes;
+                    py::list subtree;
+                    node["subtree"] = subtree;
+                    containers[i] = subtree;
+
+                    siblings.append(node);
+                } break;
+            case NodeKind::IF:
+                {
+                    py::dict node;
+                    node["type"] = "IF";
+
+                    py::list blocks;
+                    node["blocks"] = blocks;
+                    containers[i] = blocks;
+
+                    siblings.append(node);
+                } break;
+            case NodeKind::BLOCK:
+                {
+                    py::dict block;
+                    block["argument"] = py::make_tuple(tree.line[i], tree.start[i], tree.end[i]);
+
+                    py::list subtree;
+                    block["subtree"] = subtree;
+                    containers[i] = subtree;
+
+                    siblings.append(block);
+                } break;
+            case NodeKind::ELSE:
+                {
+                    py::dict block;
+
+                    py::list subtree;
+                    block["subtree"] = subtree;
+                    containers[i] = subtree;
+
+                    siblings.append(block);
+                } break;
+        }
+    }
+
+    return root;
+}
 
+py::dict tree_to_dict(const ParseTree& tree) {
+    py::dict result;
+    result["errors"] = errors_to_list(tree);
+    result["tree"] = tree_to_list(tree);
+    result["names"] = names_to_dict(tree);
+    result["cache"] = cache_to_dict(tree);
+    result["line_indexes"] = line_indexes_to_list(tree);
     return result;
 }
 
+// Parse: returns the nested dict form, or the flat ParseResult when compact is set. With
+// max_workers other than 1, buffers past parallel_threshold are parsed on several threads.
+py::object parse(const py::buffer& code, bool compact, size_t max_workers) {
+    ByteBuffer buffer(code);
+
+    auto tree = std::make_shared<ParseTree>();
+    {
+        py::gil_scoped_release release;
+        parse_tree_parallel(buffer.data(), buffer.size(), *tree, max_workers);
+    }
+
+    if (compact)
+        return py::cast(tree);
+    return tree_to_dict(*tree);
+}
+
+// Parse incremental: parses new_code given previous_result, the compact result of parsing
+// old_code. Only the code around the edit goes through the DFA again.
+py::object parse_incremental(const std::shared_ptr<ParseTree>& previous_result, const py::buffer& old_code, const py::buffer& new_code, bool compact) {
+    ByteBuffer old_buffer(old_code);
+    ByteBuffer new_buffer(new_code);
+
+    auto tree = std::make_shared<ParseTree>();
+    {
+        py::gil_scoped_release release;
+        reparse_tree(*previous_result, old_buffer.data(), old_buffer.size(), new_buffer.data(), new_buffer.size(), *tree);
+    }
+
+    if (compact)
+        return py::cast(tree);
+    return tree_to_dict(*tree);
+}
+
+// Converts a C++ exception caught on a worker thread into a Python exception instance
+py::object exception_to_object(const std::exception_ptr& exception) {
+    try {
+        std::rethrow_exception(exception);
+    } catch (const std::bad_alloc&) {
+        return py::handle(PyExc_MemoryError)();
+    } catch (const std::exception& e) {
+        return py::handle(PyExc_RuntimeError)(e.what());
+    } catch (...) {
+        return py::handle(PyExc_RuntimeError)("Unknown error while parsing");
+    }
+}
+
+// Parse many: parses every buffer on a native thread pool. Results keep the input order;
+// an input that fails is reported as the exception instance in its slot instead of
+// aborting the batch.
+py::list parse_many(const py::iterable& buffers, size_t max_workers, bool compact) {
+    std::vector<std::unique_ptr<ByteBuffer>> inputs;
+    std::vector<py::object> failures;
+
+    for (py::handle buffer : buffers) {
+        try {
+            inputs.push_back(std::make_unique<ByteBuffer>(buffer));
+            failures.push_back(py::none());
+        } catch (py::error_already_set& e) {
+            inputs.push_back(nullptr);
+            failures.push_back(e.value());
+        }
+    }
+
+    std::vector<std::shared_ptr<ParseTree>> trees(inputs.size());
+    std::vector<std::exception_ptr> exceptions(inputs.size());
+    {
+        py::gil_scoped_release release;
+        parallel_for(inputs.size(), max_workers, [&](size_t i) {
+            if (!inputs[i])
+                return;
+            try {
+                auto tree = std::make_shared<ParseTree>();
+                parse_tree(inputs[i]->data(), inputs[i]->size(), *tree);
+                trees[i] = std::move(tree);
+            } catch (...) {
+                exceptions[i] = std::current_exception();
+            }
+        });
+    }
+
+    py::list results;
+    for (size_t i = 0; i < inputs.size(); ++i) {
+        if (!failures[i].is_none())
+            results.append(failures[i]);
+        else if (exceptions[i])
+            results.append(exception_to_object(exceptions[i]));
+        else if (compact)
+            results.append(py::cast(trees[i]));
+        else
+            results.append(tree_to_dict(*trees[i]));
+    }
+    return results;
+}
+
+// Parser: feed(chunk) takes the code piece by piece, from a file or an mmap for instance,
+// and finish() returns what parse would have returned for all of it. Chunks are parsed as
+// they come, with the GIL released, and need not outlive the call.
+class Parser {
+public:
+    explicit Parser(bool compact) : compact(compact), stream(std::make_unique<StreamParser>()) {}
+
+    void feed(const py::buffer& chunk) {
+        ByteBuffer buffer(chunk);
+        py::gil_scoped_release release;
+        std::lock_guard<std::mutex> lock(mutex);
+        if (!stream)
+            throw std::invalid_argument("Parser already finished");
+        stream->feed(buffer.data(), buffer.size());
+    }
+
+    py::object finish() {
+        std::shared_ptr<ParseTree> tree;
+        {
+            py::gil_scoped_release release;
+            std::lock_guard<std::mutex> lock(mutex);
+            if (!stream)
+                throw std::invalid_argument("Parser already finished");
+            tree = stream->finish();
+            stream.reset();
+        }
+
+        if (compact)
+            return py::cast(tree);
+        return tree_to_dict(*tree);
+    }
+
+private:
+    bool compact;
+    std::unique_ptr<StreamParser> stream;
+    std::mutex mutex;
+};
+
 #endif
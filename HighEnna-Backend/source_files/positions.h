@@ -0,0 +1,113 @@
+#ifndef POSITIONS_H
+#define POSITIONS_H
+
+// ---------- Text Positions ----------
+
+// Maps byte offsets into parsed code to a 1-based line and a 1-based column counted in
+// code points, so error reports can point at a position without decoding the lines
+// they quote. Only encodings whose code points can be counted from the bytes alone are
+// handled; other ones are left to the Python codecs.
+enum class TextEncoding : uint8_t {
+    SINGLE_BYTE,
+    UTF8,
+    UTF8_SIG,
+};
+
+struct TextPosition {
+    uint64_t line;
+    uint64_t column;
+};
+
+bool starts_with(const std::string& text, const char* prefix) {
+    return text.compare(0, std::strlen(prefix), prefix) == 0;
+}
+
+// Expects the name Python's codecs.lookup gives the encoding, e.g. "utf-8", "cp1252" or "iso8859-15"
+bool text_encoding_from_name(std::string name, TextEncoding& encoding) {
+    std::transform(name.begin(), name.end(), name.begin(), [](char c) { return c == '_' ? '-' : static_cast<char>(std::tolower(static_cast<unsigned char>(c))); });
+
+    if (name == "utf-8" || name == "utf8")
+        encoding = TextEncoding::UTF8;
+    else if (name == "utf-8-sig")
+        encoding = TextEncoding::UTF8_SIG;
+    else if (name == "ascii" || name == "latin-1" || starts_with(name, "iso8859-") || starts_with(name, "cp125")
+            || name == "cp437" || starts_with(name, "cp8") || starts_with(name, "mac-") || starts_with(name, "koi8-"))
+        encoding = TextEncoding::SINGLE_BYTE;
+    else
+        return false;
+    return true;
+}
+
+uint64_t count_code_points(const char* code, uint64_t start, const uint64_t end, const TextEncoding encoding) {
+    if (encoding == TextEncoding::SINGLE_BYTE)
+        return end - start;
+
+    // A byte order mark is not part of the text once decoded
+    if (encoding == TextEncoding::UTF8_SIG && start == 0 && end >= 3 && std::memcmp(code, "\xEF\xBB\xBF", 3) == 0)
+        start = 3;
+
+    // Every code point has exactly one byte that is not a continuation byte
+    uint64_t count = 0;
+    for (uint64_t i = start; i < end; ++i)
+        count += (static_cast<uint8_t>(code[i]) & 0xC0) != 0x80;
+    return count;
+}
+
+// Offsets are visited in increasing order, and a column is counted on from the previous
+// offset when both are on the same line, so every byte is read at most once.
+std::vector<TextPosition> locate_offsets(const ParseTree& tree, const char* code, const std::vector<uint64_t>& offsets, const TextEncoding encoding) {
+    std::vector<size_t> order(offsets.size());
+    for (size_t i = 0; i < order.size(); ++i)
+        order[i] = i;
+    std::sort(order.begin(), order.end(), [&offsets](size_t a, size_t b) { return offsets[a] < offsets[b]; });
+
+    std::vector<TextPosition> positions(offsets.size());
+    const std::vector<uint64_t>& line_indexes = tree.line_indexes;
+    size_t line = 0;
+    uint64_t cursor = line_indexes[0];
+    uint64_t column = 1;
+
+    for (size_t i : order) {
+        const uint64_t offset = offsets[i];
+        if (line + 1 < line_indexes.size() && line_indexes[line+1] <= offset) {
+            line = std::upper_bound(line_indexes.begin() + line, line_indexes.end(), offset) - line_indexes.begin() - 1;
+            cursor = line_indexes[line];
+            column = 1;
+        }
+        column += count_code_points(code, cursor, offset, encoding);
+        cursor = offset;
+        positions[i] = {line + 1, column};
+    }
+
+    return positions;
+}
+
+// Locate: the (line, column) of every offset into code, the content result was parsed
+// from. Raises LookupError for encodings whose code points cannot be counted natively.
+py::list locate(const ParseTree& tree, const py::buffer& code, const std::vector<uint64_t>& offsets, const std::string& encoding_name) {
+    TextEncoding encoding;
+    if (!text_encoding_from_name(encoding_name, encoding)) {
+        PyErr_SetString(PyExc_LookupError, ("Cannot count code points natively in " + encoding_name).c_str());
+        throw py::error_already_set();
+    }
+
+    ByteBuffer buffer(code);
+    if (buffer.size() != tree.code_length)
+        throw std::invalid_argument("Code does not match the parse result");
+    for (uint64_t offset : offsets)
+        if (offset > tree.code_length)
+            throw std::out_of_range("Offset past the end of the code");
+
+    std::vector<TextPosition> positions;
+    {
+        py::gil_scoped_release release;
+        positions = locate_offsets(tree, buffer.data(), offsets, encoding);
+    }
+
+    py::list result;
+    for (const TextPosition& position : positions)
+        result.append(py::make_tuple(position.line, position.column));
+    return result;
+}
+
+#endif
@@ -0,0 +1,288 @@
+#ifndef SERIALIZE_H
+#define SERIALIZE_H
+
+// ---------- Parse Tree Serialization ----------
+
+// Binary image of a ParseTree, checkpoints included, so a parse can be stored and picked up
+// again by a later session. Numbers are written in native byte order: the image is meant
+// for a cache on the machine that wrote it, not for exchange. Bump the version whenever
+// ParseTree or ParserState change shape.
+constexpr char serialized_tree_magic[4] = {'H','E','P','T'};
+constexpr uint32_t serialized_tree_version = 2;
+
+class TreeWriter {
+public:
+    std::string data;
+
+    template <typename T>
+    void value(const T& value) {
+        static_assert(std::is_trivially_copyable_v<T>);
+        data.append(reinterpret_cast<const char*>(&value), sizeof(T));
+    }
+
+    template <typename T>
+    void array(const std::vector<T>& values) {
+        value<uint64_t>(values.size());
+        data.append(reinterpret_cast<const char*>(values.data()), values.size() * sizeof(T));
+    }
+
+    void text(const std::string& text) {
+        value<uint64_t>(text.size());
+        data.append(text);
+    }
+
+    void location(const Location& location) {
+        value(location.line);
+        value(location.start);
+        value(location.end);
+    }
+};
+
+class TreeReader {
+public:
+    TreeReader(const char* data, size_t size) : data(data), size(size) {}
+
+    template <typename T>
+    T value() {
+        T result;
+        take(&result, sizeof(T));
+        return result;
+    }
+
+    // Number of records that follow, each at least record_size bytes long
+    uint64_t count(size_t record_size) {
+        const uint64_t result = value<uint64_t>();
+        if (result > (size - position) / record_size)
+            throw std::invalid_argument("Truncated parse tree");
+        return result;
+    }
+
+    template <typename T>
+    void array(std::vector<T>& values) {
+        values.resize(count(sizeof(T)));
+        take(values.data(), values.size() * sizeof(T));
+    }
+
+    void text(std::string& text) {
+        text.resize(count(1));
+        take(text.data(), text.size());
+    }
+
+    Location location() {
+        Location result;
+        result.line = value<uint64_t>();
+        result.start = value<uint64_t>();
+        result.end = value<uint64_t>();
+        return result;
+    }
+
+    bool done() const {
+        return position == size;
+    }
+
+private:
+    const char* data;
+    size_t size;
+    size_t position = 0;
+
+    void take(void* destination, size_t count) {
+        if (count > size - position)
+            throw std::invalid_argument("Truncated parse tree");
+        std::memcpy(destination, data + position, count);
+        position += count;
+    }
+};
+
+void write_state(TreeWriter& writer, const ParserState& state) {
+    for (uint64_t ParserState::* offset : ParserState::offsets)
+        writer.value(state.*offset);
+    writer.value(state.plain_text_line);
+    writer.value(state.empty_prefix);
+    writer.value(state.cache_found);
+    writer.value(state.arg_found);
+    writer.value(state.in_directive_arg);
+    writer.value(state.bracket_count);
+    writer.value(state.cache_tail);
+    writer.value(state.directive);
+    writer.value(state.v_type);
+    writer.value(state.transition);
+
+    writer.array(state.tree_stack);
+    writer.value<uint64_t>(state.block_headers.size());
+    for (const Location& block_header : state.block_headers)
+        writer.location(block_header);
+}
+
+void read_state(TreeReader& reader, ParserState& state) {
+    for (uint64_t ParserState::* offset : ParserState::offsets)
+        state.*offset = reader.value<uint64_t>();
+    state.plain_text_line = reader.value<uint64_t>();
+    state.empty_prefix = reader.value<bool>();
+    state.cache_found = reader.value<bool>();
+    state.arg_found = reader.value<bool>();
+    state.in_directive_arg = reader.value<bool>();
+    state.bracket_count = reader.value<int64_t>();
+    state.cache_tail = reader.value<uint8_t>();
+    state.directive = reader.value<Directive>();
+    state.v_type = reader.value<vType>();
+    state.transition = reader.value<uint16_t>();
+
+    reader.array(state.tree_stack);
+    state.block_headers.resize(reader.count(sizeof(Location)));
+    for (Location& block_header : state.block_headers)
+        block_header = reader.location();
+}
+
+std::string serialize_tree(const ParseTree& tree) {
+    TreeWriter writer;
+    writer.data.append(serialized_tree_magic, sizeof(serialized_tree_magic));
+    writer.value(serialized_tree_version);
+
+    writer.array(tree.kind);
+    writer.array(tree.start);
+    writer.array(tree.end);
+    writer.array(tree.line);
+    writer.array(tree.parent);
+    writer.array(tree.first_child);
+    writer.array(tree.next_sibling);
+    writer.array(tree.last_child);
+    writer.value(tree.root_last_child);
+
+    writer.value<uint64_t>(tree.errors.size());
+    for (const ParseError& error : tree.errors) {
+        writer.value(error.code);
+        writer.location(error.location);
+    }
+
+    writer.value<uint64_t>(tree.names.size());
+    for (const ParseName& name : tree.names) {
+        writer.value(name.is_var);
+        writer.text(name.name);
+    }
+
+    writer.array(tree.line_indexes);
+
+    writer.value(tree.cache_found);
+    writer.value(tree.cache_start);
+    writer.value(tree.cache_end);
+    writer.value<uint64_t>(tree.cache_lines.size());
+    for (const Location& cache_line : tree.cache_lines)
+        writer.location(cache_line);
+
+    writer.value(tree.code_length);
+
+    writer.value<uint64_t>(tree.checkpoints.size());
+    for (const Checkpoint& checkpoint : tree.checkpoints) {
+        write_state(writer, checkpoint.state);
+        writer.value<uint64_t>(checkpoint.nodes);
+        writer.value<uint64_t>(checkpoint.errors);
+        writer.value<uint64_t>(checkpoint.names);
+        writer.value<uint64_t>(checkpoint.line_indexes);
+        writer.value<uint64_t>(checkpoint.cache_lines);
+        writer.value(checkpoint.root_last_child);
+    }
+
+    return std::move(writer.data);
+}
+
+// Rebuilds a tree written by serialize_tree. Throws std::invalid_argument on images of
+// another version, truncated ones, or ones whose indexes point outside of the tree.
+void deserialize_tree(const char* data, size_t size, ParseTree& tree) {
+    if (size < sizeof(serialized_tree_magic) || std::memcmp(data, serialized_tree_magic, sizeof(serialized_tree_magic)) != 0)
+        throw std::invalid_argument("Not a serialized parse tree");
+
+    TreeReader reader(data + sizeof(serialized_tree_magic), size - sizeof(serialized_tree_magic));
+    if (reader.value<uint32_t>() != serialized_tree_version)
+        throw std::invalid_argument("Unsupported parse tree version");
+
+    reader.array(tree.kind);
+    reader.array(tree.start);
+    reader.array(tree.end);
+    reader.array(tree.line);
+    reader.array(tree.parent);
+    reader.array(tree.first_child);
+    reader.array(tree.next_sibling);
+    reader.array(tree.last_child);
+    tree.root_last_child = reader.value<int64_t>();
+
+    tree.errors.resize(reader.count(1 + sizeof(Location)));
+    for (ParseError& error : tree.errors) {
+        error.code = reader.value<ErrorCode>();
+        error.location = reader.location();
+    }
+
+    tree.names.resize(reader.count(1 + sizeof(uint64_t)));
+    for (ParseName& name : tree.names) {
+        name.is_var = reader.value<bool>();
+        reader.text(name.name);
+    }
+
+    reader.array(tree.line_indexes);
+
+    tree.cache_found = reader.value<bool>();
+    tree.cache_start = reader.value<uint64_t>();
+    tree.cache_end = reader.value<uint64_t>();
+    tree.cache_lines.resize(reader.count(sizeof(Location)));
+    for (Location& cache_line : tree.cache_lines)
+        cache_line = reader.location();
+
+    tree.code_length = reader.value<uint64_t>();
+
+    tree.checkpoints.resize(reader.count(std::size(ParserState::offsets) * sizeof(uint64_t)));
+    for (Checkpoint& checkpoint : tree.checkpoints) {
+        read_state(reader, checkpoint.state);
+        checkpoint.nodes = reader.value<uint64_t>();
+        checkpoint.errors = reader.value<uint64_t>();
+        checkpoint.names = reader.value<uint64_t>();
+        checkpoint.line_indexes = reader.value<uint64_t>();
+        checkpoint.cache_lines = reader.value<uint64_t>();
+        checkpoint.root_last_child = reader.value<int64_t>();
+    }
+
+    if (!reader.done())
+        throw std::invalid_argument("Trailing data after parse tree");
+
+    const size_t nodes = tree.size();
+    const auto is_node = [nodes](int64_t index) { return index >= -1 && index < static_cast<int64_t>(nodes); };
+
+    bool valid = tree.start.size() == nodes && tree.end.size() == nodes && tree.line.size() == nodes
+        && tree.parent.size() == nodes && tree.first_child.size() == nodes
+        && tree.next_sibling.size() == nodes && tree.last_child.size() == nodes
+        && !tree.line_indexes.empty() && is_node(tree.root_last_child);
+
+    // Parents must come first and be able to hold children, as tree_to_list relies on it
+    const auto is_container = [&tree](int64_t index) {
+        const NodeKind kind = static_cast<NodeKind>(tree.kind[index]);
+        return kind == NodeKind::FOR || kind == NodeKind::IF || kind == NodeKind::BLOCK || kind == NodeKind::ELSE;
+    };
+
+    for (size_t i = 0; valid && i < nodes; ++i)
+        valid = tree.kind[i] <= static_cast<uint8_t>(NodeKind::ELSE)
+            && tree.parent[i] < static_cast<int64_t>(i) && (tree.parent[i] < 0 || is_container(tree.parent[i]))
+            && is_node(tree.parent[i]) && is_node(tree.first_child[i])
+            && is_node(tree.next_sibling[i]) && is_node(tree.last_child[i]);
+
+    for (size_t i = 0; valid && i < tree.errors.size(); ++i)
+        valid = static_cast<uint8_t>(tree.errors[i].code) <= static_cast<uint8_t>(ErrorCode::CLOSE_ROOT);
+
+    for (size_t i = 0; valid && i < tree.checkpoints.size(); ++i) {
+        const Checkpoint& checkpoint = tree.checkpoints[i];
+        valid = checkpoint.nodes <= nodes && checkpoint.errors <= tree.errors.size()
+            && checkpoint.names <= tree.names.size() && checkpoint.cache_lines <= tree.cache_lines.size()
+            && checkpoint.line_indexes >= (i == 0 ? 1 : 2) && checkpoint.line_indexes <= tree.line_indexes.size()
+            && checkpoint.root_last_child >= -1 && checkpoint.root_last_child < static_cast<int64_t>(checkpoint.nodes)
+            && checkpoint.state.ptr <= tree.code_length && checkpoint.state.tree_stack.size() == 1
+            && checkpoint.state.tree_stack[0] == -1 && checkpoint.state.block_headers.empty();
+        if (valid && i > 0) {
+            const Checkpoint& previous = tree.checkpoints[i-1];
+            valid = checkpoint.state.ptr > previous.state.ptr && checkpoint.nodes >= previous.nodes
+                && checkpoint.errors >= previous.errors && checkpoint.names >= previous.names
+                && checkpoint.line_indexes >= previous.line_indexes && checkpoint.cache_lines >= previous.cache_lines;
+        }
+    }
+
+    if (!valid || tree.checkpoints.empty() || tree.checkpoints[0].state.ptr != 0)
+        throw std::invalid_argument("Inconsistent parse tree");
+}
+
+#endif
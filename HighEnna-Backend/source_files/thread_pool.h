@@ -0,0 +1,37 @@
+#ifndef THREAD_POOL_H
+#define THREAD_POOL_H
+
+// Runs task(i) for every i in [0, count) on up to max_workers native threads, 0 meaning
+// one per hardware thread. Indexes are handed out in increasing order through a shared
+// counter and the calling thread works too. Tasks must not throw nor touch Python
+// objects: call it with the GIL released.
+template <typename Task>
+void parallel_for(size_t count, size_t max_workers, Task&& task) {
+    if (max_workers == 0)
+        max_workers = std::max<size_t>(1, std::thread::hardware_concurrency());
+
+    const size_t workers = std::min(max_workers, count);
+    if (workers <= 1) {
+        for (size_t i = 0; i < count; ++i)
+            task(i);
+        return;
+    }
+
+    std::atomic<size_t> next{0};
+    auto worker = [&]() {
+        for (size_t i = next++; i < count; i = next++)
+            task(i);
+    };
+
+    std::vector<std::thread> threads;
+    threads.reserve(workers - 1);
+    for (size_t w = 1; w < workers; ++w)
+        threads.emplace_back(worker);
+
+    worker();
+
+    for (std::thread& thread : threads)
+        thread.join();
+}
+
+#endif
@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import hashlib
+import json
+import zlib
+
+import highennabackend
+
+# A cache block stream starts with HEADER and a one character codec tag. Blocks written
+# before the tag existed hold a bare LZW stream, packed six bits per character from '0'
+# upwards, which never contains HEADER.
+HEADER = b'~'
+
+LEGACY = b''
+LZW85 = b'L'
+ZLIB85 = b'Z'
+CHUNKED = b'C'
+
+# Below this size both codecs are tried and the smaller stream kept: LZW has no framing
+# to pay for on tiny caches, while deflate wins on anything sizeable.
+TRY_ALL_BELOW = 4096
+ZLIB_LEVEL = 6
+
+# zlib and the backend release the GIL while they work, so chunks are encoded and decoded
+# on a thread pool once there is enough data to be worth it. Decoding runs at most
+# DECODE_AHEAD chunks ahead of the consumer. The pool is a Python one rather than the
+# backend's: a chunk job chains zlib, which only Python links, with the backend's base85
+# and LZW calls, and the threads still run side by side since both sides drop the GIL.
+PARALLEL_ABOVE = 1 << 20
+DECODE_AHEAD = 4
+
+executor = None
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(thread_name_prefix='cache_codec')
+    return executor
+
+def encode(data, codec=None):
+    if codec is None:
+        candidates = [ZLIB85, LZW85] if len(data) < TRY_ALL_BELOW else [ZLIB85]
+        return min((encode(data, candidate) for candidate in candidates), key=len)
+    if codec == LEGACY:
+        return highennabackend.encode(data)
+    if codec == LZW85:
+        return HEADER + codec + highennabackend.encode85(highennabackend.compress(data))
+    if codec == ZLIB85:
+        return HEADER + codec + highennabackend.encode85(zlib.compress(data, ZLIB_LEVEL))
+    raise ValueError(f'Unknown cache codec {codec!r}')
+
+def decode(stream):
+    if not stream.startswith(HEADER):
+        return highennabackend.decode(stream)
+    codec = stream[1:2]
+    if codec == CHUNKED:
+        return join_chunks({key:text for key,_,_,text in decode_chunks(stream)})
+    payload = highennabackend.decode85(memoryview(stream)[2:])
+    if codec == LZW85:
+        return highennabackend.decompress(payload)
+    if codec == ZLIB85:
+        return zlib.decompress(payload)
+    raise ValueError(f'Unknown cache codec {codec!r}')
+
+# A chunked stream holds one record per top-level key of the cache, separated by ','.
+# A record is the base85 key, the checksum of the chunk's JSON and the chunk encoded on
+# its own, separated by ':'. Neither separator is a base85 character, so a chunk whose
+# JSON did not change keeps its encoded bytes from one write to the next.
+def chunk_checksum(text):
+    return hashlib.blake2b(text, digest_size=16).hexdigest().encode()
+
+# chunks maps each key to its JSON text, previous maps keys to the (checksum, stream)
+# pairs of the last write. Returns the block stream and the pairs of this write.
+def encode_chunks(chunks, previous=None):
+    previous = previous or {}
+    checksums = {key:chunk_checksum(text) for key,text in chunks.items()}
+    stale = [key for key in chunks if not (key in previous and previous[key][0] == checksums[key])]
+
+    if len(stale) > 1 and sum(len(chunks[key]) for key in stale) >= PARALLEL_ABOVE:
+        streams = dict(zip(stale, get_executor().map(encode, [chunks[key] for key in stale])))
+    else:
+        streams = {key:encode(chunks[key]) for key in stale}
+
+    encoded = {key:(checksums[key], streams[key]) if key in streams else previous[key] for key in chunks}
+    stream = HEADER + CHUNKED + b','.join(
+            highennabackend.encode85(key.encode('utf-8')) + b':' + checksum + b':' + chunk
+            for key,(checksum,chunk) in encoded.items()
+        )
+    return stream, encoded
+
+def decode_chunk(key, checksum, chunk):
+    text = decode(chunk)
+    if chunk_checksum(text) != checksum:
+        raise ValueError('Cache chunk checksum mismatch')
+    return highennabackend.decode85(key).decode('utf-8'), checksum, chunk, text
+
+# Yields (key, checksum, stream, text) for every chunk in order, so each chunk can be
+# used and dropped before the later ones are decoded
+def iter_chunks(stream):
+    records = [record.split(b':', 2) for record in stream[2:].split(b',')] if len(stream) > 2 else []
+    if len(stream) < PARALLEL_ABOVE:
+        for record in records:
+            yield decode_chunk(*record)
+        return
+
+    pending = deque()
+    for record in records:
+        pending.append(get_executor().submit(decode_chunk, *record))
+        if len(pending) > DECODE_AHEAD:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def decode_chunks(stream):
+    return list(iter_chunks(stream))
+
+def join_chunks(chunks):
+    return b'{' + b','.join(json.dumps(key).encode('utf-8') + b':' + text for key,text in chunks.items()) + b'}'
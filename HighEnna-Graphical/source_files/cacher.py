@@ -1,4 +1,17 @@
+from safeIO import safewrite,FSYNC_DIR
+
+from collections import deque
+
+from collections.abc import Mapping, Sequence
+from contextlib import contextmanager
+
+import itertools
+import sqlite3
+import traceback
+import threading
+import atexit
 import json
+import time
 import os
 
 class CustomEncoder(json.JSONEncoder):
@@ -9,6 +22,14 @@ class CustomEncoder(json.JSONEncoder):
             return {"__tuple__": list(obj)}
         return super().default(obj)
 
+# Caches are written as compact JSON
+def dumps(v):
+    return json.dumps(v, separators=(',', ':'), cls=CustomEncoder)
+
+# A dict key as json writes it, non-string keys being turned into strings first
+def dumps_key(k):
+    return json.dumps(k if isinstance(k, str) else json.dumps(k))
+
 def custom_decoder(obj):
     if "__set__" in obj:
         return set(obj["__set__"])
@@ -16,9 +37,325 @@ def custom_decoder(obj):
         return tuple(obj["__tuple__"])
     return obj
 
+# Cachers mark themselves dirty on every mutation and are written by a single background
+# thread, once no mutation came for flush_delay seconds or at most max_flush_delay seconds
+# after the first one. Whatever is still pending is written at exit.
+class Flusher:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = {}
+        self.thread = None
+        atexit.register(self.flush_all)
+
+    def schedule(self, cacher):
+        now = time.monotonic()
+        with self.condition:
+            _, first, _ = self.pending.get(id(cacher), (cacher, now, now))
+            self.pending[id(cacher)] = (cacher, first, now)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='CacherFlusher', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def cancel(self, cacher):
+        with self.condition:
+            self.pending.pop(id(cacher), None)
+
+    @staticmethod
+    def deadline(cacher, first, last):
+        return min(last + cacher.flush_delay, first + cacher.max_flush_delay)
+
+    def take_due(self):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                deadlines = {key: self.deadline(*entry) for key, entry in self.pending.items()}
+                due = [self.pending.pop(key)[0] for key, deadline in deadlines.items() if deadline <= now]
+                if due:
+                    return due
+                self.condition.wait(min(deadlines.values()) - now if deadlines else None)
+
+    def run(self):
+        while True:
+            for cacher in self.take_due():
+                try:
+                    cacher.flush(background=True)
+                except Exception:
+                    traceback.print_exc()
+
+    def flush_all(self):
+        with self.condition:
+            cachers = [cacher for cacher, _, _ in self.pending.values()]
+            self.pending.clear()
+        for cacher in cachers:
+            try:
+                cacher.flush()
+            except Exception:
+                traceback.print_exc()
+
+flusher = Flusher()
+
+# Journal operations address values by their path of dict keys from the root:
+#   ["set", path, value], ["del", path], ["add", path, items], ["discard", path, items]
+# List indexes move as items come and go, so a change anywhere under a list is journaled
+# as a "set" of the outermost list. Every operation is idempotent, which makes replaying
+# a journal over a snapshot that already holds part of it harmless.
+def apply_operation(data, operation):
+    kind, path, *value = operation
+    if not path:
+        data.clear()
+        data.update(value[0])
+        return
+
+    node = data
+    for key in path[:-1]:
+        if not isinstance(node, dict):
+            return
+        node = node.setdefault(key, {})
+    if not isinstance(node, dict):
+        return
+
+    key = path[-1]
+    if kind == 'set':
+        node[key] = value[0]
+    elif kind == 'del':
+        node.pop(key, None)
+    elif kind == 'add':
+        target = node.setdefault(key, set())
+        if isinstance(target, set):
+            target.update(value[0])
+    elif kind == 'discard':
+        target = node.get(key)
+        if isinstance(target, set):
+            target.difference_update(value[0])
+
+# Storage for a Cacher made of a JSON snapshot at file_path and a journal of the operations
+# applied since, one JSON record per line, next to it. The snapshot is rewritten and the
+# journal emptied once the journal outgrows compaction_ratio times the snapshot.
+class Journal:
+    def __init__(self, file_path, compaction_ratio=1.0, min_compaction_size=64*1024):
+        self.snapshot_path = file_path
+        self.journal_path = file_path + '.journal'
+        self.compaction_ratio = compaction_ratio
+        self.min_compaction_size = min_compaction_size
+        self.snapshot_size = os.path.getsize(self.snapshot_path) if os.path.isfile(self.snapshot_path) else 0
+        self.journal_size = os.path.getsize(self.journal_path) if os.path.isfile(self.journal_path) else 0
+
+    def load(self):
+        data = {}
+        if os.path.isfile(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                data = json.load(f, object_hook=custom_decoder)
+
+        if os.path.isfile(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    # A record cut short by a crash ends the journal
+                    try:
+                        operation = json.loads(line, object_hook=custom_decoder)
+                    except ValueError:
+                        break
+                    try:
+                        apply_operation(data, operation)
+                    except TypeError:
+                        pass
+        return data, {}
+
+    def store(self, cacher, operations):
+        if operations:
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(operation + '\n' for operation in operations))
+                self.journal_size = f.tell()
+
+        if self.journal_size > max(self.min_compaction_size, self.compaction_ratio * self.snapshot_size):
+            self.compact(cacher)
+
+    def compact(self, cacher):
+        serialization = cacher.snapshot()
+        os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        # The journal is only emptied once the snapshot holding it is on disk
+        safewrite('w', self.snapshot_path, serialization, fsync=FSYNC_DIR)
+        with open(self.journal_path, 'w', encoding='utf-8'):
+            pass
+        self.snapshot_size = len(serialization)
+        self.journal_size = 0
+
+    def delete(self):
+        for path in (self.snapshot_path, self.journal_path):
+            if os.path.isfile(path):
+                os.remove(path)
+
+# The path of a journal operation, read without decoding the value that follows it
+def operation_path(operation):
+    return json.JSONDecoder().raw_decode(operation, operation.index(',') + 1)[0]
+
+# Storage for a Cacher as an SQLite database in WAL mode holding one row per top-level key,
+# so several processes can share it and a flush only rewrites the keys that changed. Each
+# row holds the key's JSON, which also seeds the Cacher's serialized text.
+class Database:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        # Flushes run on the flusher thread, always under the Cacher's flush_lock
+        self.connection = sqlite3.connect(self.file_path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    @staticmethod
+    def row_key(k):
+        return k if isinstance(k, str) else json.dumps(k)
+
+    def load(self):
+        texts = dict(self.connection.execute('SELECT key, value FROM cache'))
+        return {k: json.loads(text, object_hook=custom_decoder) for k, text in texts.items()}, texts
+
+    def store(self, cacher, operations):
+        keys = set()
+        for operation in operations:
+            path = operation_path(operation)
+            if not path:
+                keys = None
+                break
+            keys.add(path[0])
+
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            if keys is None:
+                self.connection.execute('DELETE FROM cache')
+                keys = list(dict.keys(cacher))
+            for k in keys:
+                if k in dict.keys(cacher):
+                    self.connection.execute('INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)', (self.row_key(k), cacher.encode_key(cacher, k)))
+                else:
+                    self.connection.execute('DELETE FROM cache WHERE key = ?', (self.row_key(k),))
+
+    def delete(self):
+        self.connection.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.isfile(self.file_path + suffix):
+                os.remove(self.file_path + suffix)
+
+# Containers are stored as loaded, or as plain copies when assigned, and only wrapped when
+# first reached through their parent, so a cache costs about one json.loads to open and
+# subtrees nobody looks at are never rebuilt.
+def wrap(parent, v, key=None):
+    if type(v) is dict:
+        return Cacher.WrappedDict(parent, v, key)
+    if type(v) is list:
+        return Cacher.WrappedList(parent, v, key)
+    if type(v) is set:
+        return Cacher.WrappedSet(parent, v, key)
+    return v
+
+# Plain containers to serialize, sharing the subtrees that were never wrapped
+def unwrap(v):
+    if isinstance(v, (Cacher, Cacher.WrappedDict)):
+        return {k: unwrap(val) for k, val in dict.items(v)}
+    if isinstance(v, Cacher.WrappedList):
+        return [unwrap(val) for val in list.__iter__(v)]
+    if isinstance(v, Cacher.WrappedSet):
+        return set(v)
+    return v
+
+# Plain deep copy, so nothing outside the cache shares a container with it
+def detach(v):
+    if isinstance(v, dict):
+        return {k: detach(val) for k, val in dict.items(v)}
+    if isinstance(v, list):
+        return [detach(val) for val in list.__iter__(v)]
+    if isinstance(v, set):
+        return set(v)
+    return v
+
+# The wrapped containers under node, the only ones that may have been handed out, each with
+# its own, by key or index
+def skeleton(node):
+    if isinstance(node, dict):
+        items = dict.items(node)
+    elif isinstance(node, list):
+        items = enumerate(list.__iter__(node))
+    else:
+        return {}
+    return {k: (v, skeleton(v)) for k, v in items if isinstance(v, (Cacher.WrappedDict, Cacher.WrappedList, Cacher.WrappedSet))}
+
+# Puts data back into node, reusing the containers of its skeleton, so the ones handed out
+# stay part of the cache. Dicts added since are emptied and go back to being placeholders.
+def restore(node, containers, data):
+    if isinstance(node, dict):
+        children = dict(dict.items(node))
+        dict.clear(node)
+        for k, v in data.items():
+            dict.__setitem__(node, k, restore(*containers[k], v) if k in containers else v)
+        if isinstance(node, (Cacher, Cacher.WrappedDict)):
+            node.texts = {}
+            node.stamps = {}
+            for k, child in children.items():
+                if isinstance(child, Cacher.WrappedDict) and k not in data and k not in node.pending:
+                    restore(child, {}, {})
+                    child.is_placeholder = True
+                    node.pending[k] = child
+    elif isinstance(node, list):
+        list.__setitem__(node, slice(None), [restore(*containers[i], v) if i in containers else v for i, v in enumerate(data)])
+    else:
+        set.clear(node)
+        set.update(node, data)
+    return node
+
+# Read-only views over cached data, for code paths that only look values up. Nothing is
+# wrapped, created or saved through them.
+def view(v):
+    if isinstance(v, dict):
+        return DictView(v)
+    if isinstance(v, list):
+        return ListView(v)
+    if isinstance(v, set):
+        return frozenset(v)
+    return v
+
+class DictView(Mapping):
+    def __init__(self, data):
+        self.data = data
+
+    def __getitem__(self, k):
+        return view(dict.__getitem__(self.data, k))
+
+    def __iter__(self):
+        return iter(dict.keys(self.data))
+
+    def __len__(self):
+        return dict.__len__(self.data)
+
+class ListView(Sequence):
+    def __init__(self, data):
+        self.data = data
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [view(v) for v in list.__getitem__(self.data, index)]
+        return view(list.__getitem__(self.data, index))
+
+    def __len__(self):
+        return list.__len__(self.data)
+
 class Cacher(dict):
-    def __init__(self,file_path, *, reader=None, writer=None, attributes={}):
+    def __init__(self,file_path, *, reader=None, writer=None, journal=False, database=False, chunked=False, flush_delay=0.5, max_flush_delay=2.0, attributes={}):
         self.file_path = os.path.abspath(file_path)
+        self.chunked = chunked
+        self.flush_delay = flush_delay
+        self.max_flush_delay = max_flush_delay
+        self.flush_lock = threading.RLock()
+        self.transaction_lock = threading.Lock()
+        self.dirty = False
+        self.root = self
+        self.pending = {}
+        self.clock = itertools.count(1)
+        self.texts = {}
+        self.stamps = {}
+        self.epoch = 0
+        self.storage = Journal(self.file_path) if journal else Database(self.file_path) if database else None
+        self.operations = deque()
 
         if reader:
             self.read = reader
@@ -38,47 +375,217 @@ class Cacher(dict):
             def defaultWriter(file_path,serialization):
                 os.makedirs(os.path.dirname(file_path), exist_ok=True)
                 with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(self, f, indent=2, cls= CustomEncoder)
+                    f.write(serialization)
             self.write = defaultWriter
 
 
-        data = self.wrap_item(json.loads(self.read(), object_hook=custom_decoder))
+        texts = {}
+        if self.storage:
+            data, texts = self.storage.load()
+        else:
+            # A reader may also hand over (key, serialization) pairs, one per top-level key
+            serialization = self.read()
+            if isinstance(serialization, str):
+                data = json.loads(serialization, object_hook=custom_decoder)
+            else:
+                data = {k: json.loads(v, object_hook=custom_decoder) for k, v in serialization}
 
         super().__init__(data)
+        self.texts.update((k, (next(self.clock), text)) for k, text in texts.items())
         self.__dict__.update(attributes)
 
         self.write_enable = True
         self.modified = False
-
-    def wrap_item(self, v):
-        if isinstance(v, dict):
-            return Cacher.WrappedDict(self, v)
-        if isinstance(v, list):
-            return Cacher.WrappedList(self, v)
-        if isinstance(v, set):
-            return Cacher.WrappedSet(self, v)
-        else:
-            return v
-
-    def unwrap_item(self, v):
-        if isinstance(v, Cacher.WrappedDict):
-            return {k: self.unwrap_item(val) for k, val in v.items()}
-        if isinstance(v, Cacher.WrappedList):
-            return [self.unwrap_item(val) for val in v]
-        if isinstance(v, Cacher.WrappedSet):
-            return {self.unwrap_item(val) for val in v}
-        else:
-            return v
+        self.depth = 0
+
+    # Wraps the value stored under k in place the first time it is reached
+    def wrapped(self, k, v):
+        w = wrap(self, v, k)
+        if w is not v:
+            dict.__setitem__(self, k, w)
+        return w
+
+    # Empty dicts handed out for missing keys only become part of the cache once something
+    # is written to them
+    def placeholder(self, k):
+        if k not in self.pending:
+            self.pending[k] = Cacher.WrappedDict(self, {}, k, placeholder=True)
+        return self.pending[k]
+
+    def adopt(self, k, child):
+        if self.pending.get(k) is not child or k in self.keys():
+            return False
+        del self.pending[k]
+        dict.__setitem__(self, k, child)
+        self.changed(('set', k))
+        return True
+
+    def changed(self, change=None):
+        self.record(self, change)
 
     def copy(self):
-        return {sk:self.unwrap_item(sv) for sk,sv in self.items()}
+        return detach(self)
+
+    def view(self):
+        return DictView(self)
+
+    # The value at the end of a path of keys and indexes as a read-only view, or default
+    # when the path does not exist
+    def get_path(self, *path, default=None):
+        node = self
+        for k in path:
+            try:
+                node = dict.__getitem__(node, k) if isinstance(node, dict) else list.__getitem__(node, k)
+            except (KeyError, IndexError, TypeError):
+                return default
+        return view(node)
+
+    # Every dict in the cache keeps the serialized text of its children along with the clock
+    # reading taken before encoding them. A change stamps the keys on its path to the root
+    # with a later reading, so only the subtrees that changed since are encoded again and
+    # the text of everything else is reused as is.
+    def encode_key(self, node, k):
+        entry = node.texts.get(k)
+        if entry is None or entry[0] <= max(node.epoch, node.stamps.get(k, -1)):
+            clock = next(self.clock)
+            entry = node.texts[k] = (clock, self.encode(dict.__getitem__(node, k)))
+        return entry[1]
+
+    def encode_items(self, node):
+        for k in dict.keys(node):
+            yield k, self.encode_key(node, k)
+
+    def encode(self, v):
+        if isinstance(v, (Cacher, Cacher.WrappedDict)):
+            return '{' + ','.join(dumps_key(k) + ':' + text for k, text in self.encode_items(v)) + '}'
+        return dumps(unwrap(v))
+
+    # A chunked Cacher hands its writer one serialization per top-level key
+    def serialize(self):
+        if self.chunked:
+            return dict(self.encode_items(self))
+        return self.encode(self)
+
+    # Another thread may mutate the cache while it is serialized, in which case it is
+    # serialized again
+    @staticmethod
+    def consistent(serialize):
+        while True:
+            try:
+                return serialize()
+            except RuntimeError:
+                continue
+
+    def snapshot(self):
+        return self.consistent(self.serialize)
+
+    # Notes a change made to container, the cache itself or one of its wrapped containers.
+    # change is ('set', key), ('del', key), ('add', items), ('discard', items) or None when
+    # the whole container changed.
+    def record(self, container, change=None):
+        self.invalidate(container, change)
+        if self.storage is not None:
+            operation = self.operation(container, change)
+            if operation is not None:
+                self.operations.append(operation)
+        self.save()
 
+    def invalidate(self, container, change):
+        clock = next(self.clock)
+        if isinstance(container, (Cacher, Cacher.WrappedDict)):
+            if change is None:
+                container.epoch = clock
+                container.texts = {}
+            elif change[0] == 'del':
+                container.texts.pop(change[1], None)
+                container.stamps.pop(change[1], None)
+            else:
+                container.stamps[change[1]] = clock
+        node = container
+        while node is not self:
+            parent = node.parent
+            if isinstance(parent, Cacher.WrappedDict) or parent is self:
+                parent.stamps[node.key] = clock
+            node = parent
+
+    def operation(self, container, change):
+        target = container
+        path = []
+        node = container
+        while node is not self:
+            parent = node.parent
+            if isinstance(parent, Cacher.WrappedList):
+                if not any(item is node for item in list.__iter__(parent)):
+                    return None
+                target, change, path = parent, None, []
+            else:
+                # Containers that were replaced or removed are no longer part of the cache
+                if dict.get(parent, node.key) is not node:
+                    return None
+                path.append(node.key)
+            node = parent
+        path.reverse()
+
+        if change is None:
+            return dumps(['set', path, unwrap(target)])
+        kind, value = change
+        if kind == 'set':
+            return dumps(['set', path + [value], unwrap(dict.__getitem__(target, value))])
+        if kind == 'del':
+            return dumps(['del', path + [value]])
+        return dumps([kind, path, list(value)])
+
+    # Only marks the cache dirty; the write happens on flush. Without a flush_delay every
+    # save is written straight away.
     def save(self):
         if self.write_enable:
-            self.write(self.file_path,json.dumps(self, indent=2, cls=CustomEncoder))
+            self.dirty = True
+            if self.flush_delay is None:
+                self.flush()
+            else:
+                flusher.schedule(self)
         else:
             self.modified = True
 
+    # Writes the cache now if it changed since the last write. Background flushes hold off
+    # while sync is disabled, enable_sync schedules them again.
+    def flush(self, background=False):
+        if not background:
+            flusher.cancel(self)
+        with self.flush_lock:
+            if not self.dirty or self.depth:
+                return
+            if background and not self.write_enable:
+                self.modified = True
+                return
+
+            # A mutation landing after the flag is cleared marks the cache dirty again
+            # Operations are appended from the mutating thread, so they are drained one by one
+            self.dirty = False
+            operations = []
+            while self.operations:
+                operations.append(self.operations.popleft())
+            try:
+                if self.storage:
+                    self.storage.store(self, operations)
+                else:
+                    self.write(self.file_path,self.snapshot())
+            except BaseException:
+                self.dirty = True
+                self.operations.extendleft(reversed(operations))
+                raise
+
+    # Drops whatever is pending and removes the cache from disk
+    def delete(self):
+        flusher.cancel(self)
+        with self.flush_lock:
+            self.dirty = False
+            self.operations.clear()
+            if self.storage:
+                self.storage.delete()
+            elif os.path.isfile(self.file_path):
+                os.remove(self.file_path)
+
     def disable_sync(self):
         self.write_enable = False
 
@@ -88,40 +595,92 @@ class Cacher(dict):
             self.save()
             self.modified = False
 
+    # Changes made in a transaction are written once, when the outermost one exits. An
+    # exception leaving a transaction restores the cache as it was when it was entered.
+    # Both cover the whole Cacher rather than the calling thread: writes made by other
+    # threads meanwhile are held back with the transaction's and undone by its rollback.
+    # The outermost exit runs the writer, so a transaction is entered before any lock the
+    # writer takes.
+    @contextmanager
+    def transaction(self):
+        savepoint = (*self.consistent(lambda: (self.encode(self), skeleton(self))), len(self.operations), self.modified)
+        with self.transaction_lock:
+            if not self.depth:
+                self.disable_sync()
+            self.depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.rollback(*savepoint)
+            raise
+        finally:
+            with self.transaction_lock:
+                self.depth -= 1
+                outermost = not self.depth
+            if outermost:
+                self.enable_sync()
+        if outermost:
+            self.flush()
+
+    def rollback(self, serialization, containers, operations, modified):
+        restore(self, containers, json.loads(serialization, object_hook=custom_decoder))
+        while len(self.operations) > operations:
+            self.operations.pop()
+        self.invalidate(self, None)
+        self.modified = modified
+
     def __getitem__(self, k):
         if not k in self.keys():
-            self[k] = Cacher.WrappedDict(self,{})
-        return super().__getitem__(k)
+            return self.placeholder(k)
+        return self.wrapped(k, super().__getitem__(k))
+
+    def get(self, k, default=None):
+        if k in self.keys():
+            return self.wrapped(k, super().__getitem__(k))
+        return default
+
+    def values(self):
+        for k, v in dict.items(self):
+            self.wrapped(k, v)
+        return super().values()
+
+    def items(self):
+        for k, v in dict.items(self):
+            self.wrapped(k, v)
+        return super().items()
 
     def __setitem__(self, k, v):
-        super().__setitem__(k, self.wrap_item(v))
-        self.save()
+        self.pending.pop(k, None)
+        super().__setitem__(k, detach(v))
+        self.record(self, ('set', k))
 
     def __delitem__(self, k):
         super().__delitem__(k)
-        self.save()
+        self.record(self, ('del', k))
 
     def clear(self):
         super().clear()
-        self.save()
+        self.record(self)
 
     def pop(self, k, *args):
-        val = super().pop(k, *args)
-        self.save()
+        if not k in self.keys():
+            return super().pop(k, *args)
+        val = super().pop(k)
+        self.record(self, ('del', k))
         return val
 
     def popitem(self):
         val = super().popitem()
-        self.save()
+        self.record(self, ('del', val[0]))
         return val
 
     def update(self, *args, **kwargs):
-        wrapped_args = []
-        for mapping in args:
-            wrapped_args.append({k: self.wrap_item(v) for k, v in mapping.items()})
-        wrapped_kwargs = {k: self.wrap_item(v) for k, v in kwargs.items()}
-        super().update(*wrapped_args, **wrapped_kwargs)
-        self.save()
+        mappings = [{k: detach(v) for k, v in dict(mapping).items()} for mapping in args]
+        mappings.append({k: detach(v) for k, v in kwargs.items()})
+        for mapping in mappings:
+            super().update(mapping)
+            for k in mapping:
+                self.record(self, ('set', k))
 
     def setdefault(self, k, default=None):
         if not k in self.keys():
@@ -129,214 +688,243 @@ class Cacher(dict):
         return self[k]
 
     class WrappedList(list):
-        def __init__(self, parent, iterable=()):
-            super().__init__([self.wrap_item(v) for v in iterable])
+        def __init__(self, parent, iterable=(), key=None):
             self.parent = parent
+            self.root = parent.root
+            self.key = key
+            super().__init__(iterable)
 
-        def wrap_item(self, v):
-            if isinstance(v, dict):
-                return Cacher.WrappedDict(self, v)
-            if isinstance(v, list):
-                return Cacher.WrappedList(self, v)
-            if isinstance(v, set):
-                return Cacher.WrappedSet(self, v)
-            else:
-                return v
-
-        def unwrap_item(self, v):
-            if isinstance(v, Cacher.WrappedDict):
-                return {k: self.unwrap_item(val) for k, val in v.items()}
-            if isinstance(v, Cacher.WrappedList):
-                return [self.unwrap_item(val) for val in v]
-            if isinstance(v, Cacher.WrappedSet):
-                return {self.unwrap_item(val) for val in v}
-            else:
-                return v
+        def wrapped(self, index, v):
+            w = wrap(self, v)
+            if w is not v:
+                list.__setitem__(self, index, w)
+            return w
 
         def copy(self):
-            return [self.unwrap_item(sv) for sv in self]
+            return detach(self)
 
         def save(self):
             self.parent.save()
 
+        def changed(self):
+            self.root.record(self)
+
+        def __getitem__(self, index):
+            if isinstance(index, slice):
+                for i in range(*index.indices(len(self))):
+                    self.wrapped(i, super().__getitem__(i))
+                return super().__getitem__(index)
+            return self.wrapped(index, super().__getitem__(index))
+
+        def __iter__(self):
+            for index, v in enumerate(super().__iter__()):
+                yield self.wrapped(index, v)
+
+        def __reversed__(self):
+            for index in range(len(self) - 1, -1, -1):
+                yield self[index]
+
         def append(self, item):
-            super().append(self.wrap_item(item))
-            self.parent.save()
+            super().append(detach(item))
+            self.changed()
 
         def extend(self, iterable):
-            super().extend(self.wrap_item(iterable))
-            self.parent.save()
+            super().extend([detach(item) for item in iterable])
+            self.changed()
 
         def insert(self, index, item):
-            super().insert(index, self.wrap_item(item))
-            self.parent.save()
+            super().insert(index, detach(item))
+            self.changed()
 
         def remove(self, item):
             super().remove(item)
-            self.parent.save()
+            self.changed()
 
         def pop(self, index=-1):
-            result = super().pop(index)
-            self.parent.save()
+            result = self[index]
+            super().pop(index)
+            self.changed()
             return result
 
         def clear(self):
             super().clear()
-            self.parent.save()
+            self.changed()
 
         def sort(self, *args, **kwargs):
             super().sort(*args, **kwargs)
-            self.parent.save()
+            self.changed()
 
         def reverse(self):
             super().reverse()
-            self.parent.save()
+            self.changed()
 
         def __setitem__(self, index, v):
-            super().__setitem__(index, self.wrap_item(v))
-            self.parent.save()
+            if isinstance(index, slice):
+                super().__setitem__(index, [detach(item) for item in v])
+            else:
+                super().__setitem__(index, detach(v))
+            self.changed()
 
         def __delitem__(self, index):
             super().__delitem__(index)
-            self.parent.save()
+            self.changed()
 
     class WrappedDict(dict):
-        def __init__(self, parent, mapping=(), **kwargs):
-            super().__init__({k: self.wrap_item(v) for k,v in mapping.items()}, **kwargs)
+        def __init__(self, parent, mapping=(), key=None, placeholder=False):
             self.parent = parent
-
-        def wrap_item(self, v):
-            if isinstance(v, dict):
-                return Cacher.WrappedDict(self, v)
-            if isinstance(v, list):
-                return Cacher.WrappedList(self, v)
-            if isinstance(v, set):
-                return Cacher.WrappedSet(self, v)
-            else:
-                return v
-
-        def unwrap_item(self, v):
-            if isinstance(v, Cacher.WrappedDict):
-                return {k: self.unwrap_item(val) for k, val in v.items()}
-            if isinstance(v, Cacher.WrappedList):
-                return [self.unwrap_item(val) for val in v]
-            if isinstance(v, Cacher.WrappedSet):
-                return {self.unwrap_item(val) for val in v}
-            else:
-                return v
+            self.root = parent.root
+            self.key = key
+            self.pending = {}
+            self.is_placeholder = placeholder
+            self.texts = {}
+            self.stamps = {}
+            self.epoch = 0
+            super().__init__(mapping)
+
+        def wrapped(self, k, v):
+            w = wrap(self, v, k)
+            if w is not v:
+                dict.__setitem__(self, k, w)
+            return w
+
+        def placeholder(self, k):
+            if k not in self.pending:
+                self.pending[k] = Cacher.WrappedDict(self, {}, k, placeholder=True)
+            return self.pending[k]
+
+        def adopt(self, k, child):
+            if self.pending.get(k) is not child or k in self.keys():
+                return False
+            del self.pending[k]
+            dict.__setitem__(self, k, child)
+            self.changed(('set', k))
+            return True
 
         def copy(self):
-            return {sk:self.unwrap_item(sv) for sk,sv in self.items()}
+            return detach(self)
 
         def save(self):
             self.parent.save()
 
+        # A placeholder written to for the first time joins its parent, which journals it whole
+        def changed(self, change=None):
+            if self.is_placeholder:
+                self.is_placeholder = False
+                if self.parent.adopt(self.key, self):
+                    return
+            self.root.record(self, change)
+
         def __getitem__(self, k):
             if not k in self.keys():
-                self[k] = Cacher.WrappedDict(self,{})
-            return super().__getitem__(k)
+                return self.placeholder(k)
+            return self.wrapped(k, super().__getitem__(k))
+
+        def get(self, k, default=None):
+            if k in self.keys():
+                return self.wrapped(k, super().__getitem__(k))
+            return default
+
+        def values(self):
+            for k, v in dict.items(self):
+                self.wrapped(k, v)
+            return super().values()
+
+        def items(self):
+            for k, v in dict.items(self):
+                self.wrapped(k, v)
+            return super().items()
 
         def __setitem__(self, k, v):
-            super().__setitem__(k, self.wrap_item(v))
-            self.parent.save()
+            self.pending.pop(k, None)
+            super().__setitem__(k, detach(v))
+            self.changed(('set', k))
 
         def __delitem__(self, k):
             super().__delitem__(k)
-            self.parent.save()
+            self.changed(('del', k))
 
         def clear(self):
             super().clear()
-            self.parent.save()
+            self.changed()
 
         def pop(self, k, *args):
-            val = super().pop(k, *args)
-            self.parent.save()
+            if not k in self.keys():
+                return super().pop(k, *args)
+            val = super().pop(k)
+            self.changed(('del', k))
             return val
 
         def popitem(self):
             val = super().popitem()
-            self.parent.save()
+            self.changed(('del', val[0]))
             return val
 
         def update(self, *args, **kwargs):
-            wrapped_args = []
-            for mapping in args:
-                wrapped_args.append({k: self.wrap_item(v) for k, v in mapping.items()})
-            wrapped_kwargs = {k: self.wrap_item(v) for k, v in kwargs.items()}
-            super().update(*wrapped_args, **wrapped_kwargs)
-            self.parent.save()
+            mappings = [{k: detach(v) for k, v in dict(mapping).items()} for mapping in args]
+            mappings.append({k: detach(v) for k, v in kwargs.items()})
+            for mapping in mappings:
+                super().update(mapping)
+                for k in mapping:
+                    self.changed(('set', k))
 
         def setdefault(self, k, default=None):
-            val = super().setdefault(k, self.wrap_item(default))
-            self.parent.save()
-            return val
+            if not k in self.keys():
+                super().__setitem__(k, detach(default))
+                self.changed(('set', k))
+            return self.wrapped(k, super().__getitem__(k))
 
+    # Items of a set are hashable, so never containers to wrap
     class WrappedSet(set):
-        def __init__(self, parent, iterable=()):
-            super().__init__({self.wrap_item(v) for v in iterable})
+        def __init__(self, parent, iterable=(), key=None):
             self.parent = parent
-
-        def wrap_item(self, v):
-            if isinstance(v, dict):
-                return Cacher.WrappedDict(self, v)
-            if isinstance(v, list):
-                return Cacher.WrappedList(self, v)
-            if isinstance(v, set):
-                return Cacher.WrappedSet(self, v)
-            else:
-                return v
-
-        def unwrap_item(self, v):
-            if isinstance(v, Cacher.WrappedDict):
-                return {k: self.unwrap_item(val) for k, val in v.items()}
-            if isinstance(v, Cacher.WrappedList):
-                return [self.unwrap_item(val) for val in v]
-            if isinstance(v, Cacher.WrappedSet):
-                return {self.unwrap_item(val) for val in v}
-            else:
-                return v
+            self.root = parent.root
+            self.key = key
+            super().__init__(iterable)
 
         def copy(self):
-            return {self.unwrap_item(v) for v in self}
+            return detach(self)
 
         def save(self):
             self.parent.save()
 
+        def changed(self, change=None):
+            self.root.record(self, change)
+
         # Mutating methods
         def add(self, elem):
-            super().add(self.wrap_item(elem))
-            self.parent.save()
+            super().add(elem)
+            self.changed(('add', [elem]))
 
         def remove(self, elem):
             super().remove(elem)
-            self.parent.save()
+            self.changed(('discard', [elem]))
 
         def discard(self, elem):
             super().discard(elem)
-            self.parent.save()
+            self.changed(('discard', [elem]))
 
         def pop(self):
             val = super().pop()
-            self.parent.save()
+            self.changed(('discard', [val]))
             return val
 
         def clear(self):
             super().clear()
-            self.parent.save()
+            self.changed()
 
         def update(self, *others):
-            wrapped = [self.wrap_item(v) for o in others for v in o]
-            super().update(wrapped)
-            self.parent.save()
+            added = [v for o in others for v in o]
+            super().update(added)
+            self.changed(('add', added))
 
         def intersection_update(self, *others):
             super().intersection_update(*others)
-            self.parent.save()
+            self.changed()
 
         def difference_update(self, *others):
             super().difference_update(*others)
-            self.parent.save()
+            self.changed()
 
         def symmetric_difference_update(self, other):
             super().symmetric_difference_update(other)
-            self.parent.save()
\ No newline at end of file
+            self.changed()
@@ -0,0 +1,62 @@
+import stat
+import os
+
+# scandir leaves the inode out on Windows, where size and mtime alone tell versions apart
+INODES = os.name != 'nt'
+
+# Keeps (inode, size, mtime_ns) for every accepted file right inside directory. scan lists
+# the directory again, refresh only stats the names it is given, and both return the names
+# added, removed and modified since the last look.
+class DirectorySnapshot:
+    def __init__(self, directory, accept=None):
+        self.directory = directory
+        self.accept = accept or (lambda name: True)
+        self.stats = {}
+
+    @staticmethod
+    def signature(st):
+        return (st.st_ino if INODES else 0, st.st_size, st.st_mtime_ns)
+
+    def paths(self, names=None):
+        return [os.path.join(self.directory, name) for name in (self.stats if names is None else names)]
+
+    def scan(self):
+        stats = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        if self.accept(entry.name) and entry.is_file():
+                            stats[entry.name] = self.signature(entry.stat())
+                    except OSError:
+                        pass
+        except FileNotFoundError:
+            pass
+
+        added = stats.keys() - self.stats.keys()
+        removed = self.stats.keys() - stats.keys()
+        modified = {name for name in stats.keys() & self.stats.keys() if stats[name] != self.stats[name]}
+        self.stats = stats
+        return added, removed, modified
+
+    def refresh(self, names):
+        added, removed, modified = set(), set(), set()
+        for name in names:
+            if not self.accept(name):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+                signature = self.signature(st) if stat.S_ISREG(st.st_mode) else None
+            except OSError:
+                signature = None
+
+            if signature is None:
+                if self.stats.pop(name, None) is not None:
+                    removed.add(name)
+                continue
+            if name not in self.stats:
+                added.add(name)
+            elif self.stats[name] != signature:
+                modified.add(name)
+            self.stats[name] = signature
+        return added, removed, modified
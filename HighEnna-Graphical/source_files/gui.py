@@ -44,19 +44,28 @@ APPLICATION_NAME = "High Enna"
 class UpdateWorker(QThread):
     scenario_changed = pyqtSignal()
     module_changed = pyqtSignal()
+    watch_changed = pyqtSignal(list,list)
 
-    def __init__(self, parent):
+    def __init__(self, parent, directories=(), files=()):
         super().__init__(parent)
         self.parent = parent
+        self.directories = directories
+        self.files = files
 
     def run(self):
-        scenario_changed_b, module_change_b = self.parent.project.update()
+        scenario_changed_b, module_change_b, watch, unwatch = self.parent.project.update(self.directories, self.files)
+        if watch or unwatch:
+            self.watch_changed.emit(watch, unwatch)
         if scenario_changed_b:
             self.scenario_changed.emit()
         if module_change_b:
             self.module_changed.emit()
 
 class MainWindow(QMainWindow):
+    # Emitted from the project's loading threads, delivered on the GUI thread
+    scenario_loaded = pyqtSignal(str)
+    scenario_failed = pyqtSignal(str,str)
+
     def __init__(self,init_path=None):
         super().__init__()
 
@@ -66,16 +75,12 @@ class MainWindow(QMainWindow):
         self.dictionary = {"main_window":self,"project":Project()}
         self.__dict__.update(self.dictionary)
 
-        self.base_cache_path = os.path.join(user_cache_dir(APPLICATION_NAME),"application_cache_2_0_0.json")
-        self.session_id = UUID()
-        self.application_cache_path = self.base_cache_path.replace('.json',f'_{self.session_id}.json')
-        while os.path.isfile(self.application_cache_path):
-            self.session_id = UUID()
-            self.application_cache_path = self.base_cache_path.replace('.json',f'_{self.session_id}.json')
-
-        base_cache = Cacher(self.base_cache_path)
-        self.application_cache = Cacher(self.application_cache_path)
-        self.application_cache.update(base_cache)
+        # Shared by every running session, each one only writing back the keys it changes
+        self.application_cache_path = os.path.join(user_cache_dir(APPLICATION_NAME),"application_cache_2_0_0.sqlite3")
+        self.application_cache = Cacher(self.application_cache_path, database=True)
+        legacy_cache_path = os.path.join(user_cache_dir(APPLICATION_NAME),"application_cache_2_0_0.json")
+        if not self.application_cache and os.path.isfile(legacy_cache_path):
+            self.application_cache.update(Cacher(legacy_cache_path, journal=True))
         self.project.application_cache = self.application_cache
 
         self.application_cache.setdefault('current_project_path',None)
@@ -134,9 +139,14 @@ class MainWindow(QMainWindow):
 
         self.watcher = QFileSystemWatcher()
         self.watcher.directoryChanged.connect(self.on_watcher_directory_changed)
+        self.watcher.fileChanged.connect(self.on_watcher_file_changed)
+        self.changed_directories = set()
+        self.changed_files = set()
         self.watch_debouncer = QTimer()
         self.watch_debouncer.setSingleShot(True)
         self.watch_debouncer.timeout.connect(self.on_watch_debouncer_timeout)
+        self.scenario_loaded.connect(self.on_scenario_loaded)
+        self.scenario_failed.connect(self.on_scenario_failed)
         
         global desktop_path
         desktop_path = os.path.join(os.environ["USERPROFILE"], "Desktop")
@@ -260,10 +270,23 @@ class MainWindow(QMainWindow):
 
 #--- Slots --- #
 
-    def on_watcher_directory_changed(self):
+    def on_watcher_directory_changed(self, path):
+        self.changed_directories.add(path)
+        self.watch_debouncer.start(50)
+
+    def on_watcher_file_changed(self, path):
+        self.changed_files.add(path)
         self.watch_debouncer.start(50)
 
+    def on_watch_changed(self, watch, unwatch):
+        if unwatch:
+            self.watcher.removePaths(unwatch)
+        if watch and self.project.is_open:
+            self.watcher.addPaths(watch)
+
     def on_watch_debouncer_timeout(self):
+        directories,self.changed_directories = self.changed_directories,set()
+        files,self.changed_files = self.changed_files,set()
         if self.project.is_open:
             def on_scenario_changed():
                 if self.render_window:
@@ -276,8 +299,9 @@ class MainWindow(QMainWindow):
                     self.imports_window.update()
 
 
-            worker = UpdateWorker(self)
+            worker = UpdateWorker(self, directories, files)
 
+            worker.watch_changed.connect(self.on_watch_changed)
             worker.scenario_changed.connect(on_scenario_changed)
             worker.module_changed.connect(on_module_changed)
 
@@ -285,6 +309,24 @@ class MainWindow(QMainWindow):
 
             worker.start()
 
+    def on_scenario_loaded(self, entry):
+        if not self.project.register_scenario(entry):
+            return
+        self.check_obsolete([entry])
+        scenario_view = self.scenario_views.get(entry)
+        if not scenario_view or scenario_view.loaded:
+            return
+        index = self.scroll_area_layout.indexOf(scenario_view.frame)
+        self.scroll_area_layout.removeWidget(scenario_view.frame)
+        scenario_view.frame.deleteLater()
+        self.scenario_views[entry] = ScenarioView(scenario_view.scenario_file,self.dictionary,index)
+
+    def on_scenario_failed(self, entry, message):
+        scenario_view = self.scenario_views.get(entry)
+        if scenario_view and not scenario_view.loaded:
+            scenario_view.show_load_error(message)
+        CFooter.broadcast("{script} failed to load: {message}".format(script=entry,message=message), 4000)
+
 #--- Menu Bar Slots --- #
 
     def open_project_folder_slot(self):
@@ -402,7 +444,7 @@ class MainWindow(QMainWindow):
         any_cache_error = False
         for scenario_file in self.project.scenario_files.values():
             any_cache_error |= scenario_file.cache_error
-            if not scenario_file.cache_error:
+            if scenario_file.loaded and not scenario_file.cache_error:
                 scenario_file.save()
         if any_cache_error:
             CFooter.broadcast("Some scripts did not save. Look for Cache errors...", 2500)
@@ -410,9 +452,11 @@ class MainWindow(QMainWindow):
             CFooter.broadcast("All scripts saved.", 1500)
 
     def save_slot(self):
-        active_scenario_entry = self.project.project_cache['active_scenario_entry']
+        active_scenario_entry = self.project.project_cache.get_path('active_scenario_entry')
         if active_scenario_entry:
-            if self.project.scenario_files[active_scenario_entry].cache_error:
+            if not self.project.scenario_files[active_scenario_entry].loaded:
+                CFooter.broadcast("{script} is still loading.".format(script=active_scenario_entry), 1500)
+            elif self.project.scenario_files[active_scenario_entry].cache_error:
                 CFooter.broadcast("{script} did not save. Look for Cache errors...".format(script=active_scenario_entry), 2500)
             else:
                 self.project.scenario_files[active_scenario_entry].save()
@@ -427,6 +471,9 @@ class MainWindow(QMainWindow):
                 for scenario_file_name, scenario_file in self.project.scenario_files.items()
                 if scenario_file.scripts_table or scenario_file.vals_table
             }
+            if not all(scenario_file.loaded for scenario_file in self.project.scenario_files.values()):
+                CFooter.broadcast("Scripts are still loading.", 2500)
+                return
             if not items:
                 CFooter.broadcast("No scripts to render.", 2500)
                 return
@@ -440,12 +487,15 @@ class MainWindow(QMainWindow):
             CFooter.broadcast("Rendering window is open.", 2500)
 
     def render_slot(self):
-        active_scenario_entry = self.project.project_cache['active_scenario_entry']
+        active_scenario_entry = self.project.project_cache.get_path('active_scenario_entry')
         if active_scenario_entry:
             if not self.render_window:
                 scenario_file = self.project.scenario_files[active_scenario_entry]
 
-                if scenario_file.scripts_table:  # Non-empty scripts_table
+                if not scenario_file.loaded:
+                    CFooter.broadcast("{script} is still loading.".format(script=active_scenario_entry), 2500)
+                    return
+                elif scenario_file.scripts_table:  # Non-empty scripts_table
                     items = {active_scenario_entry: list(range(len(scenario_file.scripts_table)))}
                 elif scenario_file.vals_table:  # Empty scripts_table but non-empty vals_table
                     items = {active_scenario_entry: [-1]}
@@ -478,8 +528,9 @@ class MainWindow(QMainWindow):
         def extensions_window_on_config_accepted(result):
             self.application_cache['extensions'] = result
 
-            worker = UpdateWorker(self)
+            worker = UpdateWorker(self, directories=[self.project.project_path])
 
+            worker.watch_changed.connect(self.on_watch_changed)
             worker.scenario_changed.connect(self.populate)
             worker.module_changed.connect(lambda: self.imports_window.update() if self.imports_window else None)
 
@@ -517,7 +568,8 @@ class MainWindow(QMainWindow):
                 self.project.project_cache["modules"]['module_assignments'] = result
 
                 for scenario_file in self.project.scenario_files.values():
-                    scenario_file.update_modules()
+                    if scenario_file.loaded:
+                        scenario_file.update_modules()
 
             self.imports_window = ImportsWindow(self)
             self.imports_window.finished.connect(imports_window_on_finished)
@@ -590,10 +642,12 @@ class MainWindow(QMainWindow):
             action.triggered.connect(lambda _, p=path: self.open_project_slot(p))
             submenu.addAction(action)
 
-    def check_obsolete(self):
+    def check_obsolete(self, entries=None):
 
         obsolete_by_file = defaultdict(dict)
         for scenario_file_key, scenario_file in self.project.scenario_files.items():
+            if not scenario_file.loaded or (entries is not None and scenario_file_key not in entries):
+                continue
             obsolete_vars = [var for var in scenario_file.vars_table.column_names
                              if var not in scenario_file.result_parse['names']['vars']]
             obsolete_vals = [val for val in scenario_file.vals_table.column_names
@@ -704,8 +758,9 @@ class MainWindow(QMainWindow):
             self.main_window.menu_widgets['File']['Close Project'].setEnabled(True)
             self.setWindowTitle(APPLICATION_NAME + ' - (' + self.project.project_name + ')')
             self.project.project_cache['active_scenario_entry'] = None
-            self.watcher.addPaths([new_path,self.project.modules_path])
+            self.watcher.addPaths([new_path,self.project.modules_path]+self.project.watched_paths())
             self.populate()
+            self.project.load_scenarios(self.scenario_loaded.emit, lambda entry,e: self.scenario_failed.emit(entry,f"{type(e).__name__}: {e}"))
         elif not is_open_ok:
             msg = QMessageBox(self)
             msg.setIcon(QMessageBox.Icon.Warning)
@@ -765,9 +820,7 @@ class MainWindow(QMainWindow):
 
         def finish():
             self.project.close()
-            base_cache = Cacher(self.base_cache_path)
-            base_cache.update(self.application_cache)
-            os.remove(self.application_cache_path)
+            self.application_cache.flush()
 
         if any(scenario_file.has_unsaved_changes() for scenario_file in self.project.scenario_files.values()):
             reply = QMessageBox.question(
@@ -3,8 +3,11 @@ import sys
 import os
 
 from gui import *
+import safeIO
 
 if __name__ == "__main__":
+    safeIO.umask = safeIO.read_umask()
+
     init_path = None
     if len(sys.argv) > 2:
         sys.exit()
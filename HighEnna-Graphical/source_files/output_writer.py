@@ -0,0 +1,95 @@
+from safeIO import safewrite,safewrite_many,sync_directory,FSYNC_NONE,FSYNC_DIR
+
+import threading
+import queue
+import os
+
+WORKERS = 4
+MAX_PENDING = 64
+BATCH = 16
+
+# Writes rendered outputs on a few I/O threads while the next script is evaluated. At most
+# max_pending outputs wait in the queue, submit blocks past that. The threads are started
+# by the first submit, and close waits for every write and reports how each one went.
+# Each thread commits whatever is queued at once with safewrite_many.
+class OutputWriter:
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING, fsync=FSYNC_DIR, skip_unchanged=True):
+        self.workers = workers
+        self.fsync = fsync
+        self.skip_unchanged = skip_unchanged
+        self.queue = queue.Queue(max_pending)
+        self.threads = []
+        self.lock = threading.Lock()
+        self.written = 0
+        self.skipped = 0
+        self.errors = []
+        self.directories = set()
+
+    def submit(self, file_path, content, tag=None):
+        if not self.threads:
+            for index in range(self.workers):
+                thread = threading.Thread(target=self.run, name=f'OutputWriter-{index}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        self.queue.put((file_path, content, tag))
+
+    # Takes whatever is queued, up to BATCH outputs, waiting only for the first one
+    def take(self):
+        batch = []
+        while len(batch) < BATCH:
+            try:
+                item = self.queue.get(block=not batch)
+            except queue.Empty:
+                break
+            if item is None:
+                # Handed back for the next take once the batch is written, every thread
+                # still stops on exactly one
+                if batch:
+                    self.queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def run(self):
+        # Only FSYNC_FILE syncs each file, FSYNC_DIR syncs the directories once, in close
+        fsync = FSYNC_NONE if self.fsync == FSYNC_DIR else self.fsync
+        while batch := self.take():
+            try:
+                written, skipped = safewrite_many('wb', [(file_path, content) for file_path, content, _ in batch], fsync=fsync, skip_unchanged=self.skip_unchanged)
+                outcomes = [(batch, written, skipped, None)]
+            except Exception:
+                # Written again one by one to tell which failed. A file the batch had already
+                # replaced is then left alone as unchanged.
+                outcomes = []
+                for item in batch:
+                    file_path, content, _ = item
+                    try:
+                        written = safewrite('wb', file_path, content, fsync=fsync, skip_unchanged=self.skip_unchanged)
+                        outcomes.append(([item], int(written), int(not written), None))
+                    except Exception as e:
+                        outcomes.append(([item], 0, 0, e))
+            with self.lock:
+                for items, written, skipped, e in outcomes:
+                    if e is not None:
+                        file_path, _, tag = items[0]
+                        self.errors.append((tag, file_path, e))
+                        continue
+                    self.written += written
+                    self.skipped += skipped
+                    if written:
+                        self.directories.update(os.path.dirname(os.path.abspath(file_path)) for file_path, _, _ in items)
+
+    # Returns the written and skipped counts and a (tag, file_path, exception) per failed write
+    def close(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+        if self.fsync == FSYNC_DIR:
+            for directory in self.directories:
+                sync_directory(directory)
+        self.directories = set()
+
+        return self.written, self.skipped, self.errors
@@ -0,0 +1,119 @@
+from safeIO import safewrite,FSYNC_NONE
+
+import hashlib
+import struct
+import os
+
+import highennabackend
+
+# Entry layout: magic, format version, then the encoding name, the decoded cache block
+# and the serialized parse result, each prefixed by its length. Entries written by any
+# other format version are dropped on sight.
+MAGIC = b'HEPC'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sI')
+LENGTH = struct.Struct('<Q')
+
+class ParseCacheEntry:
+    def __init__(self, result, encoding, cache):
+        self.result = result
+        self.encoding = encoding
+        self.cache = cache
+
+class ParseCache:
+    def __init__(self, cache_dir, max_size=256*1024*1024):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    @staticmethod
+    def key(content):
+        return hashlib.blake2b(content, digest_size=20).hexdigest()
+
+    def entry_path(self, content):
+        return os.path.join(self.cache_dir, self.key(content))
+
+    def get(self, content):
+        entry_path = self.entry_path(content)
+        try:
+            with open(entry_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        try:
+            magic, version = HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError('Unsupported parse cache entry')
+
+            fields = []
+            offset = HEADER.size
+            for _ in range(3):
+                (length,) = LENGTH.unpack_from(data, offset)
+                offset += LENGTH.size
+                if offset + length > len(data):
+                    raise ValueError('Truncated parse cache entry')
+                fields.append(memoryview(data)[offset:offset+length])
+                offset += length
+
+            encoding, cache, result = fields
+            entry = ParseCacheEntry(
+                    highennabackend.ParseResult.from_bytes(result),
+                    bytes(encoding).decode('utf-8') or None,
+                    bytes(cache).decode('utf-8'),
+                )
+            if entry.result.code_length != len(content):
+                raise ValueError('Stale parse cache entry')
+        except (ValueError, struct.error):
+            self.remove(entry_path)
+            return None
+
+        self.touch(entry_path)
+        return entry
+
+    def contains(self, content):
+        entry_path = self.entry_path(content)
+        if os.path.isfile(entry_path):
+            self.touch(entry_path)
+            return True
+        return False
+
+    def put(self, content, result, encoding, cache):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fields = [(encoding or '').encode('utf-8'), cache.encode('utf-8'), result.to_bytes()]
+        data = HEADER.pack(MAGIC, FORMAT_VERSION) + b''.join(LENGTH.pack(len(field)) + field for field in fields)
+        safewrite('wb', self.entry_path(content), data, fsync=FSYNC_NONE)
+
+    # Least recently used entries go first, the last use being recorded in the mtime
+    def trim(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        entries = []
+        total_size = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                    total_size += stat.st_size
+
+        entries.sort()
+        for _, size, entry_path in entries:
+            if total_size <= self.max_size:
+                break
+            self.remove(entry_path)
+            total_size -= size
+
+    @staticmethod
+    def touch(entry_path):
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def remove(entry_path):
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
@@ -0,0 +1,68 @@
+import highennabackend
+
+import codecs
+
+NODE_KINDS = highennabackend.node_kinds
+
+class ParseView(dict):
+    def __init__(self, result):
+        super().__init__(
+                errors = result.errors,
+                names = result.names,
+                cache = result.cache,
+                line_indexes = memoryview(result.line_indexes),
+            )
+
+        self.result = result
+
+        self.kind = memoryview(result.kind)
+        self.start = memoryview(result.start)
+        self.end = memoryview(result.end)
+        self.line = memoryview(result.line)
+        self.parent = memoryview(result.parent)
+        self.first_child = memoryview(result.first_child)
+        self.next_sibling = memoryview(result.next_sibling)
+
+    def children(self, node=-1):
+        if node < 0:
+            child = 0 if len(self.kind) else -1
+        else:
+            child = self.first_child[node]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def type(self, node):
+        return NODE_KINDS[self.kind[node]]
+
+    def has_argument(self, node):
+        return self.type(node) not in ('IF','ELSE')
+
+    def argument(self, node):
+        if self.type(node) == 'plain_text':
+            return (self.start[node], self.end[node])
+        return (self.line[node], self.start[node], self.end[node])
+
+    # (line, column) of every byte offset into content, columns counted in characters
+    def locate(self, content, offsets, encoding):
+        encoding = codecs.lookup(encoding or 'utf-8').name
+        try:
+            return self.result.locate(content, offsets, encoding)
+        except LookupError:
+            pass
+
+        line_indexes = self['line_indexes']
+        positions = [None]*len(offsets)
+        line = -1
+        for index in sorted(range(len(offsets)), key=offsets.__getitem__):
+            offset = offsets[index]
+            if line < 0 or (line+1 < len(line_indexes) and line_indexes[line+1] <= offset):
+                while line+1 < len(line_indexes) and line_indexes[line+1] <= offset:
+                    line += 1
+                decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+                cursor = line_indexes[line]
+                column = 1
+            column += len(decoder.decode(content[cursor:offset]))
+            cursor = offset
+            positions[index] = (line+1, column)
+        return positions
@@ -1,8 +1,12 @@
 from error_messages import get_error_message
 from safeIO import saferead,safewrite
+from scenario_loader import ScenarioLoader
 from scenario_file import ScenarioFile
+from dir_snapshot import DirectorySnapshot
+from parse_cache import ParseCache
 from cacher import Cacher
 
+import threading
 import random
 import re
 import os
@@ -24,10 +28,16 @@ class Project:
         self.__dict__.update(self.dictionary)
 
         self.project_cache = None
+        self.parse_cache = None
         self.project_path = None
         self.project_name = None
 
         self.scenario_files = {}
+        self.loader = None
+        # Loaded by load_scenarios, waiting for register_scenario
+        self.unregistered = set()
+        # Held by whatever changes the project's modules, as updates run on a worker thread
+        self.lock = threading.RLock()
 
         self.is_open = False
 
@@ -46,7 +56,7 @@ class Project:
         else:
             project_cache_name = upper_camel_case(os.path.basename(project_path))
             heproj_file = f"{project_cache_name}.heproj"
-        self.project_cache = Cacher(os.path.join(project_path,heproj_file))
+        self.project_cache = Cacher(os.path.join(project_path,heproj_file), journal=True)
 
         self.project_cache.setdefault('is_open',False)
         if self.project_cache['is_open'] and not force:
@@ -55,210 +65,283 @@ class Project:
             
         self.project_path = project_path
         self.project_name = os.path.basename(project_path)
+        self.parse_cache = ParseCache(os.path.join(project_path,os.path.splitext(heproj_file)[0]+'.hecache'))
 
-        self.project_cache.disable_sync()
-        
-        if not os.path.isdir(self.project_cache.get('render_dir','')):
-            self.project_cache['render_dir'] = os.path.join(self.project_path,'scripts')
-        self.project_cache["modules"].setdefault('modules_set',set())
-        self.modules_path = os.path.join(self.project_path,"Modules")
-        self.modules_mod_time = 0
-        self.uuid_to_name={}
-        self.name_to_uuid={}
+        with self.project_cache.transaction():
+            if not os.path.isdir(self.project_cache.get('render_dir','')):
+                self.project_cache['render_dir'] = os.path.join(self.project_path,'scripts')
+            self.project_cache["modules"].setdefault('modules_set',set())
+            self.modules_path = os.path.join(self.project_path,"Modules")
+            self.uuid_to_name={}
+            self.name_to_uuid={}
 
-        self.update_modules()
+            self.scenario_snapshot = DirectorySnapshot(project_path, lambda name: any([name.endswith(ext) for ext in self.application_cache['extensions']]))
+            self.modules_snapshot = DirectorySnapshot(self.modules_path, lambda name: name.endswith('py'))
 
-        uuid_name_pattern = re.compile(r"\([A-Z0-9]{4}-[A-Z0-9]{4}-[A-Z0-9]{4}-[A-Z0-9]{4}\)")
-        for entry in os.listdir(project_path):
-            entry_path = os.path.join(project_path,entry)
-            if os.path.isfile(entry_path) and any([entry.endswith(ext) for ext in self.application_cache['extensions']]):
-                self.scenario_files[entry] = ScenarioFile(self.dictionary, entry_path)
+            self.update_modules()
+
+            # Scenario files start as stubs, load_scenarios loads them
+            self.scenario_snapshot.scan()
+            for entry,(_,size,_) in self.scenario_snapshot.stats.items():
+                self.scenario_files[entry] = ScenarioFile(self.dictionary, os.path.join(project_path,entry), lazy=True, size=size)
                 self.project_cache["modules"]['module_assignments'].setdefault(entry,self.project_cache["modules"]['modules_set'].copy())
-                self.project_cache["modules"]['module_assignments'][entry].update(self.scenario_files[entry].file_cache['modules']['module_assignment'])
-                for module_uuid in self.scenario_files[entry].file_cache['modules']['module_assignment']:
-                    if not module_uuid in self.project_cache["modules"]['modules_set']:
-                        module_name = uuid_name_pattern.sub(f"({module_uuid})",self.scenario_files[entry].file_cache['modules']['module_uuid_to_name'][module_uuid])
-                        module_path = os.path.join(self.modules_path, module_name)
-                        if os.path.isfile(module_path):
-                            base,ext = os.path.splitext(module_name)
-                            module_name = f"{base}({module_uuid}){ext}"
-                            module_path = os.path.join(self.modules_path, module_name)
-                        safewrite('w',module_path,self.scenario_files[entry].file_cache['modules']['module_assignment'][module_uuid])
 
-                        timestamp = (os.path.getctime(module_path),os.path.getmtime(module_path))
-                        self.modules_mod_time = max(self.modules_mod_time, timestamp[1])
+            for entry in [entry for entry in self.project_cache["modules"]['module_assignments'].keys() if entry not in self.scenario_files.keys()] :
+                self.project_cache["modules"]['module_assignments'].pop(entry,None)
+
+        self.is_open = True
+        self.project_cache['is_open'] = True
+        return True
 
-                        self.uuid_to_name[module_uuid] = module_name
-                        self.name_to_uuid[module_name] = module_uuid
+    # Loads the stubs left by open on a thread pool: first the ones asked for, then the
+    # expanded ones, then the rest, each in the order they are shown. on_loaded is called
+    # with the entry of every scenario file as it finishes and on_failed with the entry and
+    # the exception of every one that could not load, both from the loading thread.
+    # Loading only reads and parses the file. Whatever it changes in the project cache is
+    # left to register_scenario, to be called from the thread that owns the cache.
+    def load_scenarios(self, on_loaded, on_failed):
+        def rank(entry):
+            return 1 if self.project_cache.get_path('scenarioview',entry,'is_closed',default=True) is False else 2
+        self.loader = ScenarioLoader(self.load_scenario, on_loaded, on_failed)
+        for entry in sorted(self.scenario_files):
+            if not self.scenario_files[entry].loaded:
+                self.loader.submit(entry, rank(entry))
+
+    def prioritize(self, entry):
+        if self.loader:
+            self.loader.submit(entry, 0)
+
+    def load_scenario(self, entry):
+        scenario_file = self.scenario_files.get(entry)
+        if scenario_file is None or scenario_file.loaded:
+            return False
+        scenario_file.start_up()
+        self.unregistered.add(entry)
+        return True
 
-                        self.project_cache["modules"]['modules_set'].add(module_uuid)
-                        self.project_cache["modules"]['module_timestamps'][module_uuid] = timestamp
+    # Brings the modules of a scenario file loaded by load_scenarios into the project, once.
+    # Returns whether it did.
+    def register_scenario(self, entry):
+        scenario_file = self.scenario_files.get(entry)
+        if entry not in self.unregistered or scenario_file is None:
+            return False
+        self.unregistered.discard(entry)
 
-                self.scenario_files[entry].update_modules()
+        uuid_name_pattern = re.compile(r"\([A-Z0-9]{4}-[A-Z0-9]{4}-[A-Z0-9]{4}-[A-Z0-9]{4}\)")
+        with self.lock, self.project_cache.transaction():
+            self.project_cache["modules"]['module_assignments'].setdefault(entry,self.project_cache["modules"]['modules_set'].copy())
+            self.project_cache["modules"]['module_assignments'][entry].update(scenario_file.file_cache['modules']['module_assignment'])
+            for module_uuid in scenario_file.file_cache['modules']['module_assignment']:
+                if not module_uuid in self.project_cache["modules"]['modules_set']:
+                    module_name = uuid_name_pattern.sub(f"({module_uuid})",scenario_file.file_cache['modules']['module_uuid_to_name'][module_uuid])
+                    module_path = os.path.join(self.modules_path, module_name)
+                    if os.path.isfile(module_path):
+                        base,ext = os.path.splitext(module_name)
+                        module_name = f"{base}({module_uuid}){ext}"
+                        module_path = os.path.join(self.modules_path, module_name)
+                    safewrite('w',module_path,scenario_file.file_cache['modules']['module_assignment'][module_uuid])
+                    self.modules_snapshot.refresh([module_name])
 
-        for entry in [entry for entry in self.project_cache["modules"]['module_assignments'].keys() if entry not in self.scenario_files.keys()] :
-            self.project_cache["modules"]['module_assignments'].pop(entry,None)
+                    timestamp = (os.path.getctime(module_path),os.path.getmtime(module_path))
 
-        self.project_cache.enable_sync()
+                    self.uuid_to_name[module_uuid] = module_name
+                    self.name_to_uuid[module_name] = module_uuid
 
-        self.is_open = True
-        self.project_cache['is_open'] = True
+                    self.project_cache["modules"]['modules_set'].add(module_uuid)
+                    self.project_cache["modules"]['module_timestamps'][module_uuid] = timestamp
+
+            scenario_file.update_modules()
         return True
 
     def close(self):
         if not self.is_open:
             return
 
+        if self.loader:
+            self.loader.stop()
+            self.loader = None
+
+        for scenario_file in self.scenario_files.values():
+            if not scenario_file.loaded:
+                continue
+            try:
+                scenario_file.file_cache.flush()
+                scenario_file.store_parse_cache()
+            except OSError:
+                pass
+        self.parse_cache.trim()
+
         self.scenario_files.clear()
+        self.unregistered.clear()
         self.uuid_to_name.clear()
         self.name_to_uuid.clear()
 
-        self.modules_mod_time = 0
+        self.scenario_snapshot = None
+        self.modules_snapshot = None
         self.modules_path = None
 
         self.project_cache['is_open'] = False
+        self.project_cache.flush()
         self.project_cache = None
+        self.parse_cache = None
         self.project_path = None
         self.project_name = None
 
         self.is_open = False
 
-    def update(self):
+    # Every scenario file and module, for the watcher to report their changes one by one
+    def watched_paths(self):
+        return self.scenario_snapshot.paths()+self.modules_snapshot.paths()
+
+    # A changed directory is listed again, changed files are only stat'ed on their own
+    @staticmethod
+    def snapshot_changes(snapshot, directories, files):
+        directory = os.path.normcase(os.path.abspath(snapshot.directory))
+        if directory in {os.path.normcase(os.path.abspath(path)) for path in directories}:
+            return snapshot.scan()
+        return snapshot.refresh([
+                os.path.basename(path) for path in files
+                if os.path.normcase(os.path.dirname(os.path.abspath(path))) == directory
+            ])
+
+    # Takes the directories and files the watcher reported, returns whether scenario files and
+    # modules changed and the paths to start and stop watching
+    def update(self, directories=(), files=()):
         if not self.is_open:
-            return (False,False)
+            return (False,False,[],[])
 
-        self.project_cache.disable_sync()
+        with self.lock, self.project_cache.transaction():
+            scenario_changed = False
 
-        scenario_changed = False
+            added,removed,modified = self.snapshot_changes(self.scenario_snapshot, directories, files)
+            module_changes = self.snapshot_changes(self.modules_snapshot, directories, files)
 
-        for entry in [entry for entry in self.scenario_files.keys() if not os.path.exists(os.path.join(self.project_path, entry))]:
-            del self.scenario_files[entry]
-            self.project_cache["modules"]['module_assignments'].pop(entry,None)
-            scenario_changed = True
+            for entry in removed:
+                if self.scenario_files.pop(entry,None):
+                    self.project_cache["modules"]['module_assignments'].pop(entry,None)
+                    scenario_changed = True
 
-        module_change = self.update_modules()
+            module_change = self.update_modules(module_changes)
 
-        for entry in sorted(os.listdir(self.project_path)):
-            entry_path = os.path.join(self.project_path,entry)
-            if entry in self.scenario_files:
-                if os.path.getmtime(entry_path) > self.scenario_files[entry].mod_time:
-                    self.scenario_files[entry].update()
+            for entry in sorted(modified):
+                scenario_file = self.scenario_files.get(entry)
+                if scenario_file and scenario_file.loaded and os.path.getmtime(scenario_file.scenario_path) > scenario_file.mod_time:
+                    scenario_file.update()
                     scenario_changed = True
-            else:
-                if os.path.isfile(entry_path) and any([entry.endswith(ext) for ext in self.application_cache['extensions']]):
-                    self.scenario_files[entry] = ScenarioFile(self.dictionary, entry_path)
+
+            for entry in sorted(added):
+                if entry not in self.scenario_files:
+                    self.scenario_files[entry] = ScenarioFile(self.dictionary, os.path.join(self.project_path,entry))
                     self.project_cache["modules"]['module_assignments'].setdefault(entry,self.project_cache["modules"]['modules_set'].copy())
                     self.scenario_files[entry].update_modules()
                     scenario_changed = True
 
-        self.project_cache.enable_sync()
-        return scenario_changed, module_change
-
-    def update_modules(self):
-        module_change = False
-
-        if os.path.isdir(self.modules_path):
+        # Files replaced by a rename are dropped by the watcher, so modified ones are watched again
+        watch = self.scenario_snapshot.paths(added|modified)+self.modules_snapshot.paths(module_changes[0]|module_changes[2])
+        unwatch = self.scenario_snapshot.paths(removed)+self.modules_snapshot.paths(module_changes[1])
+        return scenario_changed, module_change, watch, unwatch
+
+    # Reads again only the modules in changes, the (added, removed, modified) names of the
+    # modules snapshot, which is scanned in full when changes is None
+    def update_modules(self, changes=None):
+        os.makedirs(self.modules_path, exist_ok=True)
+        added,removed,modified = self.modules_snapshot.scan() if changes is None else changes
+        if changes is not None and not (added or removed or modified):
+            return False
 
-            module_files = {
-                file_name : file_path
-                for file_name in os.listdir(self.modules_path)
-                if os.path.isfile(file_path := os.path.join(self.modules_path, file_name)) and file_name.endswith('py')
+        uuid_pattern = re.compile(r"# *MODULE_ID *: *([A-Z0-9]{4}-[A-Z0-9]{4}-[A-Z0-9]{4}-[A-Z0-9]{4})")
+
+        # Modules left alone keep their uuid and timestamps
+        for file_name in removed|modified:
+            file_uuid = self.name_to_uuid.pop(file_name,None)
+            if self.uuid_to_name.get(file_uuid) == file_name:
+                del self.uuid_to_name[file_uuid]
+        module_timestamps = self.project_cache["modules"].get('module_timestamps',{})
+        collected_timestamps = {
+                file_uuid : tuple(module_timestamps[file_uuid])
+                for file_uuid in self.uuid_to_name if file_uuid in module_timestamps
             }
-            modules_mod_time = max([
-                    os.path.getmtime(self.modules_path),
-                    *[os.path.getmtime(module_path) for module_path in module_files.values()]
-                ])
-            if  modules_mod_time > self.modules_mod_time:
-                self.modules_mod_time = modules_mod_time
-
-                self.uuid_to_name.clear()
-                self.name_to_uuid.clear()
-
-                uuid_name_pattern = re.compile(r"\([A-Z0-9]{4}-[A-Z0-9]{4}-[A-Z0-9]{4}-[A-Z0-9]{4}\)")
-                uuid_pattern = re.compile(r"# *MODULE_ID *: *([A-Z0-9]{4}-[A-Z0-9]{4}-[A-Z0-9]{4}-[A-Z0-9]{4})")
-
-                collected_timestamps = {}
-                for file_name,file_path in module_files.items():
-
-                    with open(file_path, 'r') as f:
-                        file_content = f.read()
-
-                    file_timestamps = (
-                            os.path.getctime(file_path),
-                            os.path.getmtime(file_path)
-                        )
-
-                    match = uuid_pattern.search(file_content)
-                    if match:
-                        file_uuid = match.group(1)
-                        if file_uuid in collected_timestamps:
-                            other_timestamps = collected_timestamps[file_uuid]
-
-                            new_uuid = UUID()
-                            while new_uuid in self.project_cache["modules"]['modules_set']:
-                                new_uuid = UUID()
-
-                            if other_timestamps < file_timestamps:
-                                file_uuid = new_uuid
-                                safewrite('w',file_path,uuid_pattern.sub(f"# MODULE_ID: {file_uuid}", file_content))
-
-                                collected_timestamps[file_uuid] = (
-                                        os.path.getctime(file_path),
-                                        os.path.getmtime(file_path)
-                                    )
-                                modules_mod_time = max(modules_mod_time, collected_timestamps[file_uuid][1])
-                            else:
-                                other_uuid = new_uuid
-                                other_name = self.uuid_to_name[file_uuid]
-                                other_path = module_files[other_name]
-
-                                with open(other_path, 'r') as f:
-                                    other_content = f.read()
-                                
-                                safewrite('w',other_path,uuid_pattern.sub(f"# MODULE_ID: {other_uuid}", other_content))
-
-                                collected_timestamps[other_uuid] = (
-                                        os.path.getctime(other_path),
-                                        os.path.getmtime(other_path)
-                                    )
-                                modules_mod_time = max(modules_mod_time, collected_timestamps[other_uuid][1])
-
-                                self.uuid_to_name[other_uuid] = other_name
-                                self.name_to_uuid[other_name] = other_uuid
 
+        rewritten = set()
+        for file_name in sorted(added|modified):
+            file_path = os.path.join(self.modules_path, file_name)
+
+            with open(file_path, 'r') as f:
+                file_content = f.read()
+
+            file_timestamps = (
+                    os.path.getctime(file_path),
+                    os.path.getmtime(file_path)
+                )
+
+            match = uuid_pattern.search(file_content)
+            if match:
+                file_uuid = match.group(1)
+                if file_uuid in collected_timestamps:
+                    other_timestamps = collected_timestamps[file_uuid]
+
+                    new_uuid = UUID()
+                    while new_uuid in self.project_cache["modules"]['modules_set']:
+                        new_uuid = UUID()
+
+                    if other_timestamps < file_timestamps:
+                        file_uuid = new_uuid
+                        safewrite('w',file_path,uuid_pattern.sub(f"# MODULE_ID: {file_uuid}", file_content))
+                        rewritten.add(file_name)
+
+                        file_timestamps = (
+                                os.path.getctime(file_path),
+                                os.path.getmtime(file_path)
+                            )
                     else:
-                        file_uuid = UUID()
-                        while file_uuid in self.project_cache["modules"]['modules_set']:
-                            file_uuid = UUID()
-                        safewrite('w',file_path,f"# MODULE_ID: {file_uuid}\n\n{file_content}")
+                        other_uuid = new_uuid
+                        other_name = self.uuid_to_name[file_uuid]
+                        other_path = os.path.join(self.modules_path, other_name)
 
-                    collected_timestamps[file_uuid] = file_timestamps
+                        with open(other_path, 'r') as f:
+                            other_content = f.read()
+                        
+                        safewrite('w',other_path,uuid_pattern.sub(f"# MODULE_ID: {other_uuid}", other_content))
+                        rewritten.add(other_name)
 
-                    self.uuid_to_name[file_uuid] = file_name
-                    self.name_to_uuid[file_name] = file_uuid
+                        collected_timestamps[other_uuid] = (
+                                os.path.getctime(other_path),
+                                os.path.getmtime(other_path)
+                            )
 
+                        self.uuid_to_name[other_uuid] = other_name
+                        self.name_to_uuid[other_name] = other_uuid
 
-                collected_uuids = set(collected_timestamps.keys())
-                old_uuids = self.project_cache["modules"]['modules_set']
+            else:
+                file_uuid = UUID()
+                while file_uuid in self.project_cache["modules"]['modules_set']:
+                    file_uuid = UUID()
+                safewrite('w',file_path,f"# MODULE_ID: {file_uuid}\n\n{file_content}")
+                rewritten.add(file_name)
 
-                new_uuids = collected_uuids - old_uuids
-                del_uuids = old_uuids - collected_uuids
+            collected_timestamps[file_uuid] = file_timestamps
 
-                if new_uuids or del_uuids:
-                    module_change = True
+            self.uuid_to_name[file_uuid] = file_name
+            self.name_to_uuid[file_name] = file_uuid
 
-                self.project_cache["modules"]['modules_set'] = collected_uuids
-                self.project_cache["modules"]['module_timestamps'] = collected_timestamps
+        # Keeps the rewrites above from coming back as changes
+        self.modules_snapshot.refresh(rewritten)
 
-                # for a in self.project_cache["modules"]['module_assignments'].items():
-                for scenario_file_key,scenario_file_assignment in self.project_cache["modules"]['module_assignments'].items():
-                    scenario_file_assignment.difference_update(del_uuids)
-                    scenario_file_assignment.update(new_uuids)
+        collected_uuids = set(collected_timestamps.keys())
+        old_uuids = self.project_cache["modules"]['modules_set']
 
-                for scenario_file in self.scenario_files.values():
-                    scenario_file.update_modules()
-        else:
-            os.makedirs(self.modules_path, exist_ok=True)
-            self.modules_mod_time = os.path.getmtime(self.modules_path)
+        new_uuids = collected_uuids - old_uuids
+        del_uuids = old_uuids - collected_uuids
+
+        self.project_cache["modules"]['modules_set'] = collected_uuids
+        self.project_cache["modules"]['module_timestamps'] = collected_timestamps
+
+        for scenario_file_key,scenario_file_assignment in self.project_cache["modules"]['module_assignments'].items():
+            scenario_file_assignment.difference_update(del_uuids)
+            scenario_file_assignment.update(new_uuids)
+
+        for scenario_file in self.scenario_files.values():
+            if scenario_file.loaded:
+                scenario_file.update_modules()
 
-        return module_change
\ No newline at end of file
+        return bool(new_uuids or del_uuids)
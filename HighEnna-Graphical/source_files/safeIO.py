@@ -1,32 +1,137 @@
 import tempfile
 import errno
+import stat
 import time
 import os
 
-tempfiledir = tempfile.gettempdir()
+# Durability of a write: FSYNC_NONE only makes it atomic, FSYNC_FILE also flushes the
+# content to disk before it replaces the target, and FSYNC_DIR then flushes the directory
+# so that the replacement itself survives a crash. Writes are only atomic unless the
+# caller asks for more.
+FSYNC_NONE = 'none'
+FSYNC_FILE = 'file'
+FSYNC_DIR = 'dir'
 
-def safewrite(mode,file_path,content,tries=10,encoding='utf-8'):
-    for _ in range(tries):
+fsync_policy = FSYNC_NONE
+
+COMPARE_CHUNK = 1 << 20
 
-        if "b" in mode:
-            tmp = tempfile.NamedTemporaryFile(mode, delete=False, dir=tempfiledir)
-        else:
-            tmp = tempfile.NamedTemporaryFile(mode, delete=False, dir=tempfiledir)
+# Set by main through read_umask before any thread starts, the usual 0o022 is assumed until then
+umask = None
 
-        tmp_path = tmp.name
+# Linux reports the umask in /proc. Anywhere else it can only be read by setting it, which
+# briefly leaves every file created by another thread world-writable, so this must run
+# while the process has a single thread.
+def read_umask():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+# Temp files are staged next to their target, so replacing it never crosses filesystems.
+# They take the mode of the file they replace, or the one a new file would get.
+def stage(mode,file_path,content,encoding,fsync):
+    directory,name = os.path.split(os.path.abspath(file_path))
+    tmp = tempfile.NamedTemporaryFile(mode, delete=False, dir=directory, prefix=f'.{name}.', suffix='.tmp', encoding=None if 'b' in mode else encoding)
+    try:
         with tmp:
             tmp.write(content)
+            if fsync != FSYNC_NONE:
+                tmp.flush()
+                os.fsync(tmp.fileno())
+        try:
+            os.chmod(tmp.name, stat.S_IMODE(os.stat(file_path).st_mode))
+        except FileNotFoundError:
+            os.chmod(tmp.name, 0o666 & ~(0o022 if umask is None else umask))
+    except BaseException:
+        discard(tmp.name)
+        raise
+    return tmp.name
+
+# Whether file_path already holds content, checked by size and then read back in chunks
+def unchanged(mode,file_path,content,encoding):
+    data = content if 'b' in mode else content.replace('\n', os.linesep).encode(encoding)
+    try:
+        if os.path.getsize(file_path) != len(data):
+            return False
+        view = memoryview(data)
+        offset = 0
+        with open(file_path, 'rb') as f:
+            while chunk := f.read(COMPARE_CHUNK):
+                if view[offset:offset+len(chunk)] != chunk:
+                    return False
+                offset += len(chunk)
+        return offset == len(view)
+    except OSError:
+        return False
+
+def discard(tmp_path):
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
 
+# Another process holding the target open (an editor, a virus scanner) makes the replace
+# fail on Windows for a moment, which is the only failure worth retrying
+def replace(tmp_path,file_path,tries):
+    for attempt in range(tries):
         try:
             os.replace(tmp_path, file_path)
-        except FileNotFoundError as e:
+            return
+        except PermissionError:
+            if attempt == tries-1:
+                raise
             time.sleep(0.1)
-            continue
 
-        break
+def sync_directory(directory):
+    # Directories cannot be opened on Windows, where NTFS journals renames on its own
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
-    else:
-        raise
+# Returns whether the file was written, as it is left alone when skip_unchanged is set and
+# it already holds content
+def safewrite(mode,file_path,content,tries=10,encoding='utf-8',fsync=None,skip_unchanged=False):
+    written,_ = safewrite_many(mode,[(file_path,content)],tries,encoding,fsync,skip_unchanged)
+    return bool(written)
+
+# Writes every (file_path, content) pair of items: all contents are staged first, then each
+# target is replaced, and every directory involved is synced once at the end. Returns how
+# many files were written and how many were skipped as unchanged.
+def safewrite_many(mode,items,tries=10,encoding='utf-8',fsync=None,skip_unchanged=False):
+    fsync = fsync or fsync_policy
+    staged = []
+    replaced = 0
+    skipped = 0
+    try:
+        for file_path,content in items:
+            if skip_unchanged and unchanged(mode,file_path,content,encoding):
+                skipped += 1
+                continue
+            staged.append((stage(mode,file_path,content,encoding,fsync),file_path))
+        for tmp_path,file_path in staged:
+            replace(tmp_path,file_path,tries)
+            replaced += 1
+    finally:
+        for tmp_path,_ in staged[replaced:]:
+            discard(tmp_path)
+
+    if fsync == FSYNC_DIR:
+        for directory in {os.path.dirname(os.path.abspath(file_path)) for _,file_path in staged}:
+            sync_directory(directory)
+
+    return replaced,skipped
 
 def saferead(mode,file_path,tries=10):
     for _ in range(tries):
@@ -39,4 +144,4 @@ def saferead(mode,file_path,tries=10):
                 continue
             raise
     else:
-        raise
\ No newline at end of file
+        raise
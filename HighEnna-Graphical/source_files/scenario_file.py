@@ -1,9 +1,12 @@
-from PyQt6.QtCore import QMutex, QMutexLocker
+from PyQt6.QtCore import QRecursiveMutex, QMutexLocker
 
 from error_messages import get_error_message
-from safeIO import saferead,safewrite
+from safeIO import saferead,safewrite,FSYNC_FILE
+from output_writer import OutputWriter
+from parse_view import ParseView
 from cacher import Cacher
 from table import Table
+import cache_codec
 
 from charset_normalizer import from_bytes
 from html import escape as html_escape
@@ -16,7 +19,7 @@ import os
 import highennabackend
 
 class ScenarioFile:
-    def __init__(self,dictionary,scenario_path):
+    def __init__(self,dictionary,scenario_path,preloaded=None,lazy=False,size=None):
         self.dictionary = {'scenario_file':self}
         self.dictionary.update(dictionary)
         self.__dict__.update(self.dictionary)
@@ -31,7 +34,7 @@ class ScenarioFile:
         else:
             self.default_script_stem = self.scenario_stem + R".{script_index:0>3}"
 
-        self.mutex = QMutex()
+        self.mutex = QRecursiveMutex()
 
         self.scripts_table = Table(name='scripts_table')
         self.vars_table = Table(name='vars_table')
@@ -40,80 +43,96 @@ class ScenarioFile:
         self.errors_table.insert_column([(0,'Error Code'),(1,'Error Type'),(2,'Lin'),(3,'Col'),(4,'Content'),(5,'What')])
 
         self.mod_time = 0
+        self.size = size
 
-        self.start_up()
+        self.written_content = None
+        self.written_cache = None
+        self.cache_chunks = {}
 
         self.scripts_table.set_default_text(self.default_script_stem)
 
-    def start_up(self):
-        self.load_file(is_update=False)
+        # A lazy scenario file is only a name and a size until start_up is called
+        self.loaded = False
+        self.cache_error = False
+        if not lazy:
+            self.start_up(preloaded)
+
+    # Scenarios are read whole rather than fed to a highennabackend.Parser: the parse cache
+    # is keyed by the hash of the whole content, and the content is kept for incremental
+    # re-parses, so streaming the read would save neither the read nor the memory.
+    @staticmethod
+    def read_content(scenario_path):
+        with open(scenario_path,'rb') as f:
+            return f.read()
+
+    def start_up(self, preloaded=None):
+        self.load_file(is_update=False, preloaded=preloaded)
+        self.loaded = True
 
     def update(self):
         self.load_file(is_update=True)
 
-    def load_file(self, is_update):
+    def load_file(self, is_update, preloaded=None):
         with QMutexLocker(self.mutex):
 
-            with open(self.scenario_path,'rb') as f:
-                self.file_content = f.read().replace(b'\r',b'')
+            cached = None
+            if preloaded:
+                self.file_content, result_parse, cached = preloaded
+            elif is_update:
+                file_content = self.read_content(self.scenario_path)
+                result_parse = highennabackend.parse_incremental(self.result_parse.result, self.parsed_content, file_content, compact=True)
+                self.file_content = file_content
+                self.written_content = None
+            else:
+                self.file_content = self.read_content(self.scenario_path)
+                cached = self.project.parse_cache.get(self.file_content)
+                if cached:
+                    result_parse = cached.result
+                else:
+                    result_parse = highennabackend.parse(self.file_content, compact=True, max_workers=0)
+
+            self.parsed_content = self.file_content
+            self.size = len(self.file_content)
+            self.newline = b'\r\n' if b'\r\n' in self.file_content else b'\n'
 
-            self.encoding = from_bytes(self.file_content).best().encoding
+            if cached:
+                self.encoding = cached.encoding
+            else:
+                self.encoding = from_bytes(self.file_content).best().encoding
 
             self.script_ext = self.project.application_cache['extensions'][self.scenario_ext]
 
             self.mod_time = os.path.getmtime(self.scenario_path)
 
-            self.result_parse = highennabackend.parse(self.file_content)
-
-            self.tree = self.result_parse['tree']
+            self.result_parse = ParseView(result_parse)
 
             self.errors_table.clear()
 
             rows_to_insert = []
             cells_to_set = []
             self.cache_error = False
-            for index,error in enumerate(self.result_parse['errors']):
-
-                line,s,e = error['location'];
-                ls = self.result_parse['line_indexes'][line-1]
-                le = self.result_parse['line_indexes'][line]-1
-                col = s - ls + 1
-
-                snipet = self.file_content[ls:le].replace(b'\t',b' ')
-                n = ls
-
-                try:
-                    line_prefix = ' '*len(snipet[ls-n:s-n].decode(encoding=self.encoding))
-                    line_middle = '^'*len(snipet[s-n:e-n].decode(encoding=self.encoding))
-                    line_postfix = ' '*len(snipet[e-n:le-n].decode(encoding=self.encoding))
-                    line_message = (
-                            snipet[ls-n:le-n].decode(encoding=self.encoding).replace(' ','°')
-                            + '\n'
-                            + line_prefix
-                            + line_middle
-                            + line_postfix
-                        )
-                except UnicodeDecodeError:
-                    for e in range(e+1,le):
-                        try:
-                            line_prefix = ' '*len(snipet[ls-n:s-n].decode(encoding=self.encoding))
-                            line_middle = '^'*len(snipet[s-n:e-n].decode(encoding=self.encoding))
-                            line_postfix = ' '*len(snipet[e-n:le-n].decode(encoding=self.encoding))
-                            line_message = (
-                                    snipet[ls-n:le-n].decode(encoding=self.encoding).replace(' ','°')
-                                    + '\n'
-                                    + line_prefix
-                                    + line_middle
-                                    + line_postfix
-                                )
-                            break
-                        except UnicodeDecodeError:
-                            pass
-                    else:
-                        try:
-                            line_message = snipet[ls-n:le-n].decode(encoding=self.encoding).replace(' ','°')
-                        except UnicodeDecodeError:
-                            line_message = ''
+            errors = self.result_parse['errors']
+            line_indexes = self.result_parse['line_indexes']
+            positions = self.result_parse.locate(self.parsed_content, [offset for error in errors for offset in error['location'][1:]], self.encoding)
+            for index,error in enumerate(errors):
+
+                (line,col),(end_line,end_col) = positions[2*index:2*index+2]
+                ls = line_indexes[line-1]
+                le = line_indexes[line]-1 if line < len(line_indexes) else len(self.parsed_content)
+                if self.parsed_content[le-1:le] == b'\r':
+                    le -= 1
+
+                snipet = self.parsed_content[ls:le].replace(b'\t',b' ').decode(encoding=self.encoding or 'utf-8',errors='replace')
+                if end_line != line:
+                    end_col = len(snipet)+1
+                end_col = max(col,min(end_col,len(snipet)+1))
+                line_message = (
+                        snipet.replace(' ','°')
+                        + '\n'
+                        + ' '*(col-1)
+                        + '^'*(end_col-col)
+                        + ' '*(len(snipet)+1-end_col)
+                    )
 
                 error_code = str(error['code'])
                 self.cache_error |= 'EOF_OPN_CACHE' in error_code or 'MULT_CACHE' in error_code
@@ -136,33 +155,39 @@ class ScenarioFile:
 
             if not is_update:
                 def reader():
-                    if self.cache_error:
-                        return '{}'
-                    stream = b''.join([self.file_content[start:end] for _,start,end in self.result_parse['cache']['lines']])
-                    if stream:
-                        return highennabackend.decode(stream).decode(encoding='utf-8')
-                        # return stream.decode(encoding=self.encoding)
-                    return '{}'
+                    if cached:
+                        return cached.cache
+                    return self.load_cache()
 
                 def writer(file_path,serialization):
-                    if self.cache_error:
-                        return
-                    start,end = self.result_parse['cache']['location']
-                    length = len(self.file_content)
-                    stream = highennabackend.encode(serialization.encode(encoding='utf-8'))
-                    # stream = serialization.encode(encoding=self.encoding)
-                    rewrite = self.file_content[:start]+\
-                        "R'''\n$$$\n".encode()+\
-                        b'\n'.join(stream[i:i+126] for i in range(0, len(stream), 126))+\
-                        "\n$$$\n'''\n".encode()+\
-                        self.file_content[end:]
-                    safewrite('wb',file_path,rewrite,encoding=self.encoding)
-                    self.mod_time = os.path.getmtime(self.scenario_path)
+                    # Runs on the flush thread, so the content must not change under it
+                    with QMutexLocker(self.mutex):
+                        if self.cache_error:
+                            return
+                        start,end = self.result_parse['cache']['location']
+                        length = len(self.file_content)
+                        chunks = {key:text.encode(encoding='utf-8') for key,text in serialization.items()}
+                        stream,self.cache_chunks = cache_codec.encode_chunks(chunks,self.cache_chunks)
+                        # stream = serialization.encode(encoding=self.encoding)
+                        newline = self.newline
+                        rewrite = self.file_content[:start]+\
+                            b"R'''"+newline+b'$$$'+newline+\
+                            newline.join(stream[i:i+126] for i in range(0, len(stream), 126))+\
+                            newline+b'$$$'+newline+b"'''"+newline+\
+                            self.file_content[end:]
+                        # Leaving an unchanged file alone keeps the file watcher quiet. The
+                        # scenario is the user's template, so its content reaches the disk
+                        # before it replaces the old one.
+                        safewrite('wb',file_path,rewrite,encoding=self.encoding,fsync=FSYNC_FILE,skip_unchanged=True)
+                        self.mod_time = os.path.getmtime(self.scenario_path)
+                        self.written_content = rewrite
+                        self.written_cache = cache_codec.join_chunks(chunks).decode(encoding='utf-8')
 
 
                 self.file_cache = Cacher(self.scenario_path,
                         reader=reader,
-                        writer=writer
+                        writer=writer,
+                        chunked=True
                     )
 
                 if self.result_parse['cache']['found']:
@@ -178,9 +203,9 @@ class ScenarioFile:
                     else:
                         pass
                 else:
-                    self.file_content += b'\n\n'
+                    self.file_content += self.newline*2
                     start,end = self.result_parse['cache']['location']
-                    self.result_parse['cache']['location'] = (start+2,end+2)
+                    self.result_parse['cache']['location'] = (start+2*len(self.newline),end+2*len(self.newline))
 
                 self.file_cache['highenna_version'] = '2.0.0'
 
@@ -206,6 +231,49 @@ class ScenarioFile:
 
 
 
+    def columns(self, start, end):
+        (_,start_col),(_,end_col) = self.result_parse.locate(self.parsed_content,[start,end],self.encoding)
+        return start_col,end_col
+
+    def cache_stream(self):
+        if self.cache_error:
+            return b''
+        return b''.join([self.file_content[start:end] for _,start,end in self.result_parse['cache']['lines']])
+
+    # Chunked caches are handed to the Cacher chunk by chunk, as they are decoded
+    def load_cache(self):
+        stream = self.cache_stream()
+        if not stream.startswith(cache_codec.HEADER+cache_codec.CHUNKED):
+            return self.read_cache()
+
+        def chunks():
+            self.cache_chunks = {}
+            for key,checksum,chunk,text in cache_codec.iter_chunks(stream):
+                self.cache_chunks[key] = (checksum,chunk)
+                yield key,text.decode(encoding='utf-8')
+        return chunks()
+
+    def read_cache(self):
+        stream = self.cache_stream()
+        if stream:
+            return cache_codec.decode(stream).decode(encoding='utf-8')
+            # return stream.decode(encoding=self.encoding)
+        return '{}'
+
+    def store_parse_cache(self):
+        with QMutexLocker(self.mutex):
+            content = self.parsed_content if self.written_content is None else self.written_content
+            if self.project.parse_cache.contains(content):
+                return
+
+            if self.written_content is None or content == self.parsed_content:
+                result = self.result_parse.result
+            else:
+                result = highennabackend.parse_incremental(self.result_parse.result, self.parsed_content, content, compact=True)
+
+            cache = self.read_cache() if self.written_content is None else self.written_cache
+            self.project.parse_cache.put(content, result, self.encoding, cache)
+
     def log_render_error(self,enqueueu_message, exc, file_name, code='', indent='    | '):
 
         chain = []
@@ -264,6 +332,9 @@ class ScenarioFile:
 
             self.errors_table.clear()
 
+            # Rendered scripts are written on the writer's threads while the next one is evaluated
+            writer = OutputWriter()
+
             builtins_scope = {'__builtins__':globals()['__builtins__']}
 
             if self.project.modules_path not in sys.path:
@@ -272,8 +343,9 @@ class ScenarioFile:
             enqueueu_message(f' *Importing <span style="color:#c695c6;">Modules</span>')
             modules_scope = builtins_scope.copy()
             modules_ok = True
-            if self.file_cache['modules']['module_assignment']:
-                for module_uuid,module_content in self.file_cache['modules']['module_assignment'].items():
+            module_assignment = self.file_cache.get_path('modules','module_assignment',default={})
+            if module_assignment:
+                for module_uuid,module_content in module_assignment.items():
                     module_name = self.project.uuid_to_name[module_uuid]
 
                     module_path = os.path.join(self.project.modules_path, module_name)
@@ -429,7 +501,7 @@ class ScenarioFile:
                     total_scope.update(partial_scope)
                     total_scope.update(vars_scope)
 
-                    self.render_tree(total_scope, enqueueu_message)
+                    self.render_tree(total_scope, enqueueu_message, writer, script_index+1)
 
                     tick_progress(1)
 
@@ -476,29 +548,47 @@ class ScenarioFile:
                     tick_progress(1)
                     return False
 
-                self.render_tree(partial_scope, enqueueu_message)
+                self.render_tree(partial_scope, enqueueu_message, writer, 1)
 
                 tick_progress(1)
 
-        return all([modules_ok,vals_ok,vars_ok_ok])
+            written,skipped,write_errors = writer.close()
+            for script_number,file_path,e in sorted(write_errors, key=lambda error: error[0]):
+                enqueueu_message(f'  <span style="color:#fd9d7d;">Writing <span style="color:#fff856;">#{script_number}</span> failed: {html_escape(str(e))}</span>\n')
+                index = len(self.errors_table)
+                self.errors_table.insert_row([(index,)])
+                self.errors_table.set_cell([
+                    (index, 0, type(e).__name__),
+                    (index, 1, 'Write'),
+                    (index, 2, str(script_number)),
+                    (index, 4, file_path),
+                    (index, 5, str(e)),
+                ])
+            if written or skipped or write_errors:
+                enqueueu_message(f'  Files: <span style="color:#67ff67;">{written} written</span>, <span style="color:#CCCCCC;">{skipped} unchanged</span>\n')
+
+        return all([modules_ok,vals_ok,vars_ok_ok]) and not write_errors
 
-    def render_tree(self, my_scope, enqueueu_message):
+    def render_tree(self, my_scope, enqueueu_message, writer, script_number):
 
         render_ok = True
 
-        def _render_tree(f_bytes,tree,scope):
+        tree = self.result_parse
+
+        def _render_tree(f_bytes,node,scope):
 
             nonlocal enqueueu_message
             nonlocal render_ok
 
-            for block in tree:
+            for block in tree.children(node):
+                block_type = tree.type(block)
 
-                if block['type'] == 'plain_text':
-                    start,end = block['argument']
+                if block_type == 'plain_text':
+                    start,end = tree.argument(block)
                     f_bytes.extend(self.file_content[start:end])
 
-                elif block['type'] == 'expression':
-                    line_no,start,end = block['argument']
+                elif block_type == 'expression':
+                    line_no,start,end = tree.argument(block)
                     expression = self.file_content[start:end].decode(encoding=self.encoding)
                     try:
                         escaped_expression = expression.replace("'","\\'")
@@ -510,7 +600,8 @@ class ScenarioFile:
                             enqueueu_message(': <span style="color:#ff382f;">Failed</span>\n')
                             render_ok = False
 
-                        enqueueu_message(f'     *Evaluating "<span style="color:#f9ae57;">$${expression}$$</span>" - row: {line_no+1}, col: {start}-{end}\n      |\n')
+                        start_col,end_col = self.columns(start,end)
+                        enqueueu_message(f'     *Evaluating "<span style="color:#f9ae57;">$${expression}$$</span>" - row: {line_no+1}, col: {start_col}-{end_col}\n      |\n')
                         self.log_render_error(enqueueu_message,e,expression,indent='      | ')
 
                         index = len(self.errors_table)
@@ -519,12 +610,13 @@ class ScenarioFile:
                             (index, 0, type(e).__name__),
                             (index, 1, 'Expression'),
                             (index, 2, line_no+1),
+                            (index, 3, start_col),
                             (index, 4, expression),
                             (index, 5, str(e)),
                         ])
 
-                elif block['type'] == 'EXEC':
-                    line_no,start,end = block['argument']
+                elif block_type == 'EXEC':
+                    line_no,start,end = tree.argument(block)
                     argument = self.file_content[start:end].decode(encoding=self.encoding)
                     try:
                         escaped_argument = argument.replace("'","\\'")
@@ -535,7 +627,8 @@ class ScenarioFile:
                             enqueueu_message(': <span style="color:#ff382f;">Failed</span>\n')
                             render_ok = False
 
-                        enqueueu_message(f'     *Executing "<span style="color:#f9ae57;">$EXEC{{{argument}}}$</span>" - row: {line_no+1}, col: {start}-{end}\n      |\n')
+                        start_col,end_col = self.columns(start,end)
+                        enqueueu_message(f'     *Executing "<span style="color:#f9ae57;">$EXEC{{{argument}}}$</span>" - row: {line_no+1}, col: {start_col}-{end_col}\n      |\n')
                         self.log_render_error(enqueueu_message,e,argument,indent='      | ')
 
                         index = len(self.errors_table)
@@ -544,13 +637,13 @@ class ScenarioFile:
                             (index, 0, type(e).__name__),
                             (index, 1, 'Command'),
                             (index, 2, line_no+1),
+                            (index, 3, start_col),
                             (index, 4, argument),
                             (index, 5, str(e)),
                         ])
 
-                elif block['type'] == 'FOR':
-                    line_no,start,end = block['argument']
-                    for_subtree = block['subtree']
+                elif block_type == 'FOR':
+                    line_no,start,end = tree.argument(block)
 
                     argument = self.file_content[start:end].decode(encoding=self.encoding)
 
@@ -573,14 +666,15 @@ for {argument}:
                         exec(code, for_scope)
                         snapshots = for_scope.pop('__snapshots__')
                         for snapshot_scope in snapshots:
-                            _render_tree(f_bytes,for_subtree,snapshot_scope)
+                            _render_tree(f_bytes,block,snapshot_scope)
 
                     except Exception as e:
                         if render_ok:
                             enqueueu_message(': <span style="color:#ff382f;">Failed</span>\n')
                             render_ok = False
 
-                        enqueueu_message(f'     *Evaluating "<span style="color:#f9ae57;">$FOR{{{argument}}}$</span>" - row: {line_no+1}, col: {start}-{end}\n      |\n')
+                        start_col,end_col = self.columns(start,end)
+                        enqueueu_message(f'     *Evaluating "<span style="color:#f9ae57;">$FOR{{{argument}}}$</span>" - row: {line_no+1}, col: {start_col}-{end_col}\n      |\n')
                         self.log_render_error(enqueueu_message,e,'FOR',code=code_str,indent='      | ')
 
                         index = len(self.errors_table)
@@ -589,18 +683,18 @@ for {argument}:
                             (index, 0, type(e).__name__),
                             (index, 1, 'FOR Block'),
                             (index, 2, line_no+1),
+                            (index, 3, start_col),
                             (index, 4, argument),
                             (index, 5, str(e)),
                         ])
 
-                elif block['type'] == 'IF':
-                    for if_block in block['blocks']:
-                        if_subtree = if_block['subtree']
+                elif block_type == 'IF':
+                    for if_block in tree.children(block):
                         truth = False
-                        if not 'argument' in if_block:
+                        if not tree.has_argument(if_block):
                             truth = True
                         else:
-                            line_no,start,end = if_block['argument']
+                            line_no,start,end = tree.argument(if_block)
 
                             argument = self.file_content[start:end].decode(encoding=self.encoding).strip()
 
@@ -621,7 +715,8 @@ if {argument}:
                                     enqueueu_message(': <span style="color:#ff382f;">Failed</span>\n')
                                     render_ok = False
 
-                                enqueueu_message(f'     *Evaluating "<span style="color:#f9ae57;">$IF{{{argument}}}$</span>" - row: {line_no+1}, col: {start}-{end}\n      |\n')
+                                start_col,end_col = self.columns(start,end)
+                                enqueueu_message(f'     *Evaluating "<span style="color:#f9ae57;">$IF{{{argument}}}$</span>" - row: {line_no+1}, col: {start_col}-{end_col}\n      |\n')
                                 self.log_render_error(enqueueu_message,e,'IF',code=code_str,indent='      | ')
 
                                 index = len(self.errors_table)
@@ -630,78 +725,76 @@ if {argument}:
                                     (index, 0, type(e).__name__),
                                     (index, 1, 'IF Block'),
                                     (index, 2, line_no+1),
+                                    (index, 3, start_col),
                                     (index, 4, argument),
                                     (index, 5, str(e)),
                                 ])
 
                         if truth:
-                            _render_tree(f_bytes,if_subtree,scope)
+                            _render_tree(f_bytes,if_block,scope)
                             break
 
         result_bytes = bytearray()
-        _render_tree(result_bytes,self.tree,my_scope)
+        _render_tree(result_bytes,-1,my_scope)
         if render_ok:
-            os.makedirs(self.project.project_cache["render_dir"], exist_ok=True)
-            result_bytes = re.sub(br"(?:(?<=\n)\n)?R'''\n+'''\n*",b'',result_bytes)
+            render_dir = self.project.project_cache.get_path("render_dir")
+            os.makedirs(render_dir, exist_ok=True)
+            result_bytes = re.sub(br"(?:(?<=\n)\r?\n)?R'''(?:\r?\n)+'''(?:\r?\n)*",b'',result_bytes)
             enqueueu_message(' <span style="color:#67ff67;">Success</span>\n')
-            safewrite('wb',os.path.join(self.project.project_cache["render_dir"],my_scope['script_name']),result_bytes)
+            writer.submit(os.path.join(render_dir,my_scope['script_name']),result_bytes,script_number)
         # import json
         # os.makedirs(self.project.project_cache["render_dir"], exist_ok=True)
         # safewrite('w',os.path.join(self.project.project_cache["render_dir"],"tree.txt"),json.dumps(self.tree,indent=2))
 
     def save(self):
-        self.file_cache.disable_sync()
+        with self.file_cache.transaction():
+            self.file_cache['table_data']['scripts_table']['column_names'] = self.scripts_table.column_names
+            self.file_cache['table_data']['scripts_table']['data'] = self.scripts_table.data
+            self.scripts_table.delta_to_saved_version = 0
 
-        self.file_cache['table_data']['scripts_table']['column_names'] = self.scripts_table.column_names
-        self.file_cache['table_data']['scripts_table']['data'] = self.scripts_table.data
-        self.scripts_table.delta_to_saved_version = 0
+            self.file_cache['table_data']['vars_table']['column_names'] = self.vars_table.column_names
+            self.file_cache['table_data']['vars_table']['data'] = self.vars_table.data
+            self.vars_table.delta_to_saved_version = 0
 
-        self.file_cache['table_data']['vars_table']['column_names'] = self.vars_table.column_names
-        self.file_cache['table_data']['vars_table']['data'] = self.vars_table.data
-        self.vars_table.delta_to_saved_version = 0
-
-        self.file_cache['table_data']['vals_table']['column_names'] = self.vals_table.column_names
-        self.file_cache['table_data']['vals_table']['data'] = self.vals_table.data
-        self.vals_table.delta_to_saved_version = 0
-        
-        self.file_cache.enable_sync()
+            self.file_cache['table_data']['vals_table']['column_names'] = self.vals_table.column_names
+            self.file_cache['table_data']['vals_table']['data'] = self.vals_table.data
+            self.vals_table.delta_to_saved_version = 0
 
     def update_modules(self):
-        with QMutexLocker(self.mutex):
-            self.file_cache.disable_sync()
-            
-            project_modules_path = self.project.modules_path
-            uuid_to_name = self.project.uuid_to_name
-
-            project_module_timestamps = self.project.project_cache['modules']['module_timestamps']
-            project_module_assignment = self.project.project_cache['modules']['module_assignments'][self.scenario_name]
+        # The transaction exits, and flushes, once the mutex the writer takes is released
+        with self.file_cache.transaction():
+            with QMutexLocker(self.mutex):
+                project_modules_path = self.project.modules_path
+                uuid_to_name = self.project.uuid_to_name
+
+                project_module_timestamps = self.project.project_cache['modules']['module_timestamps']
+                project_module_assignment = self.project.project_cache['modules']['module_assignments'][self.scenario_name]
             
-            self_module_timestamps   = self.file_cache['modules']['module_timestamps']
-            self_module_assignment   = self.file_cache['modules']['module_assignment']
-            self_module_uuid_to_name = self.file_cache['modules']['module_uuid_to_name']
+                self_module_timestamps   = self.file_cache['modules']['module_timestamps']
+                self_module_assignment   = self.file_cache['modules']['module_assignment']
+                self_module_uuid_to_name = self.file_cache['modules']['module_uuid_to_name']
             
-            for module_uuid in list(self_module_assignment.keys()):
-                if module_uuid not in project_module_assignment:
-                    self_module_assignment.pop(module_uuid,None)
-                    self_module_timestamps.pop(module_uuid,None)
-                    self_module_uuid_to_name.pop(module_uuid,None)
+                for module_uuid in list(self_module_assignment.keys()):
+                    if module_uuid not in project_module_assignment:
+                        self_module_assignment.pop(module_uuid,None)
+                        self_module_timestamps.pop(module_uuid,None)
+                        self_module_uuid_to_name.pop(module_uuid,None)
 
-            for module_uuid in project_module_assignment:
-                project_module_timestamp = project_module_timestamps[module_uuid]
-                module_name = uuid_to_name[module_uuid]
+                for module_uuid in project_module_assignment:
+                    project_module_timestamp = project_module_timestamps[module_uuid]
+                    module_name = uuid_to_name[module_uuid]
 
-                if not module_name == self_module_uuid_to_name.get(module_uuid,None):
-                    self_module_uuid_to_name[module_uuid] = module_name
+                    if not module_name == self_module_uuid_to_name.get(module_uuid,None):
+                        self_module_uuid_to_name[module_uuid] = module_name
 
-                read = (module_uuid not in self_module_assignment or
-                        project_module_timestamp[1] > self_module_timestamps[module_uuid][1])
+                    read = (module_uuid not in self_module_assignment or
+                            project_module_timestamp[1] > self_module_timestamps[module_uuid][1])
 
-                if read:
-                    self_module_timestamps[module_uuid] = project_module_timestamp
-                    with open(os.path.join(project_modules_path, module_name), 'r', encoding='utf-8') as m:
-                        self_module_assignment[module_uuid] = m.read()
+                    if read:
+                        self_module_timestamps[module_uuid] = project_module_timestamp
+                        with open(os.path.join(project_modules_path, module_name), 'r', encoding='utf-8') as m:
+                            self_module_assignment[module_uuid] = m.read()
 
-            self.file_cache.enable_sync()
 
     def has_unsaved_changes(self):
         return any([
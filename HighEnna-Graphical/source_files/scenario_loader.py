@@ -0,0 +1,72 @@
+import traceback
+import threading
+import itertools
+import heapq
+import os
+
+# Runs load on a few threads for every submitted entry, lowest rank first and in order of
+# submission within a rank. Submitting a waiting entry again with a lower rank moves it up,
+# while one already loading is left alone. An entry whose load failed can be submitted again.
+class ScenarioLoader:
+    def __init__(self, load, on_loaded, on_failed, workers=None):
+        self.load = load
+        self.on_loaded = on_loaded
+        self.on_failed = on_failed
+        self.condition = threading.Condition()
+        self.heap = []
+        self.ranks = {}
+        self.running = set()
+        self.counter = itertools.count()
+        self.stopped = False
+        self.threads = [
+                threading.Thread(target=self.run, name=f'ScenarioLoader-{index}', daemon=True)
+                for index in range(workers or min(8, os.cpu_count() or 1))
+            ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, entry, rank):
+        with self.condition:
+            if entry in self.running or (entry in self.ranks and self.ranks[entry] <= rank):
+                return
+            self.ranks[entry] = rank
+            heapq.heappush(self.heap, (rank, next(self.counter), entry))
+            self.condition.notify()
+
+    def take(self):
+        with self.condition:
+            while not self.stopped:
+                while self.heap:
+                    rank, _, entry = heapq.heappop(self.heap)
+                    # Entries moved up leave their old place behind
+                    if self.ranks.get(entry) == rank:
+                        del self.ranks[entry]
+                        self.running.add(entry)
+                        return entry
+                self.condition.wait()
+            return None
+
+    def run(self):
+        while (entry := self.take()) is not None:
+            try:
+                loaded = self.load(entry)
+            except Exception as e:
+                traceback.print_exc()
+                loaded = e
+            finally:
+                with self.condition:
+                    self.running.discard(entry)
+            if isinstance(loaded, Exception):
+                self.on_failed(entry, loaded)
+            elif loaded:
+                self.on_loaded(entry)
+
+    # Drops what has not started loading yet and waits for the rest
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.heap.clear()
+            self.ranks.clear()
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
@@ -16,7 +16,7 @@ import re
 import os
 
 class ScenarioView:
-    def __init__(self,scenario_file,dictionary):
+    def __init__(self,scenario_file,dictionary,index=None):
         self.dictionary = {'scenario_view':self}
         self.dictionary.update(dictionary)
         self.__dict__.update(self.dictionary)
@@ -26,12 +26,16 @@ class ScenarioView:
         self.project_cache.setdefault("active_tab",None)
 
         self.scenario_file = scenario_file
+        self.loaded = scenario_file.loaded
 
         self.frame = CFrame(self.main_window.scroll_area_widget)
         self.frame.setFrameShape(QFrame.Shape.StyledPanel)
         self.frame.clicked.connect(self.on_frame_clicked)
         self.vbox_layout = QVBoxLayout(self.frame)
-        self.main_window.scroll_area_layout.addWidget(self.frame)
+        if index is None:
+            self.main_window.scroll_area_layout.addWidget(self.frame)
+        else:
+            self.main_window.scroll_area_layout.insertWidget(index,self.frame)
         self.populate()
 
     # ---- Slots ----
@@ -40,7 +44,7 @@ class ScenarioView:
         if not self.project or not self.project.project_cache:
             return
 
-        active_key = self.project.project_cache['active_scenario_entry']
+        active_key = self.project.project_cache.get_path('active_scenario_entry')
         is_active = active_key == self.scenario_file.scenario_name
         is_closed = self.project_cache['is_closed']
 
@@ -68,11 +72,19 @@ class ScenarioView:
             self.main_window.menu_widgets['File']['Render'].setEnabled(True)
 
     def on_title_label_left_clicked(self,ignore_footer=False):
-        active_key = self.project.project_cache['active_scenario_entry']
+        active_key = self.project.project_cache.get_path('active_scenario_entry')
         is_active = active_key == self.scenario_file.scenario_name
         is_closed = self.project_cache['is_closed']
 
-        if is_active:
+        if not self.loaded: # Open once loaded, which goes first from now on, or retry a failed load
+            self.project_cache["is_closed"] = False
+            self.title_label.setText(self.loading_title())
+            self.title_label.setToolTip("")
+            self.project.prioritize(self.scenario_file.scenario_name)
+            if not ignore_footer:
+                CFooter.broadcast("Loading {script}...".format(script=self.scenario_file.scenario_name), 1500)
+
+        elif is_active:
 
             if is_closed: # CASE 1: not open & active → open
 
@@ -88,7 +100,7 @@ class ScenarioView:
                 self.project_cache["is_closed"] = True
 
     def on_title_label_right_clicked(self):
-        active_key = self.project.project_cache['active_scenario_entry']
+        active_key = self.project.project_cache.get_path('active_scenario_entry')
         is_active = active_key == self.scenario_file.scenario_name
 
         menu = QMenu(self.main_window)
@@ -111,7 +123,9 @@ class ScenarioView:
             self.on_render_button_clicked()
 
     def on_render_button_clicked(self,items=None):
-        if not self.main_window.render_window:
+        if not self.loaded:
+            CFooter.broadcast("{script} is still loading.".format(script=self.scenario_file.scenario_name), 2500)
+        elif not self.main_window.render_window:
             def render_window_on_finished():
                 self.main_window.render_window.deleteLater()
                 self.main_window.render_window = None
@@ -133,6 +147,13 @@ class ScenarioView:
 
     # ---- Methods ----
 
+    def loading_title(self):
+        return f"{self.scenario_file.scenario_name} ({self.scenario_file.size/1024:.0f} KB, loading...)"
+
+    def show_load_error(self,message):
+        self.title_label.setText(f"{self.scenario_file.scenario_name} (failed to load, click to retry)")
+        self.title_label.setToolTip(message)
+
     def update_size_hint(self):
         current_tab = self.tab_widget.currentWidget()
         if current_tab is not None:
@@ -146,8 +167,11 @@ class ScenarioView:
         hbox_layout = QHBoxLayout()
 
         self.title_label = CLabel(self.frame)
-        self.title_label.setText(self.scenario_file.scenario_name)
-        if self.project.project_cache['active_scenario_entry'] == self.scenario_file.scenario_name:
+        if self.loaded:
+            self.title_label.setText(self.scenario_file.scenario_name)
+        else:
+            self.title_label.setText(self.loading_title())
+        if self.project.project_cache.get_path('active_scenario_entry') == self.scenario_file.scenario_name:
             font = self.title_label.font()
             font.setBold(True)
             self.title_label.setFont(font)
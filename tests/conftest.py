@@ -0,0 +1,122 @@
+import random
+import sys
+import os
+
+import pytest
+
+# The backend is built into the application's source folder by HighEnna-Backend/make.bat
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'HighEnna-Graphical', 'source_files'))
+
+pytest.importorskip('highennabackend')
+
+TOKENS = [
+        b'$$', b'$$var_x$$', b'$$val_y+1$$', b'$FOR{', b'$FOR{i in range(3)}$', b'$IF{', b'$IF{var_a>1}$',
+        b'$ELIF{x}$', b'$ELSE$', b'$END$', b'$EXEC{a=1}$', b'}', b'{', b'}$', b'$', b'$$$', b"R'''", b"'''",
+        b'\n', b'\n', b'\r\n', b'  ', b' ', b'\t', b'abc', b'var_', b'val_', b'var_q', 'é'.encode('utf-8'),
+        b'\xff', b'0123', b"R'''\n$$$\n", b"\n$$$\n'''\n", b'()', b':', b'\\',
+    ]
+
+# Any byte soup of template tokens, mostly malformed
+def token_template(rng, n):
+    return b''.join(rng.choice(TOKENS) for _ in range(n))
+
+# Mostly well formed templates, with the occasional stray directive
+def structured_template(rng, n):
+    lines = []
+    depth = 0
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.1:
+            lines.append(b'$FOR{i in range(2)}$')
+            depth += 1
+        elif r < 0.18:
+            lines.append(b'  $IF{var_a>%d}$' % rng.randint(0, 3))
+            depth += 1
+        elif r < 0.2 and depth:
+            lines.append(b'$ELIF{var_b}$')
+        elif r < 0.22 and depth:
+            lines.append(b'$ELSE$')
+        elif r < 0.3 and depth:
+            lines.append(b'$END$')
+            depth -= 1
+        elif r < 0.35:
+            lines.append(b'$EXEC{b=var_c}$')
+        elif r < 0.6:
+            lines.append(b'text $$var_v$$ and $$val_w$$ more')
+        else:
+            lines.append(bytes(rng.choice(b'abcdefgh xyz') for _ in range(rng.randint(0, 80))))
+    if rng.random() < 0.3:
+        lines.append(b"R'''\n$$$\n0123abc\n$$$\n'''")
+    return b'\n'.join(lines) + b'\n'
+
+@pytest.fixture(scope='session')
+def corpus():
+    rng = random.Random(20260418)
+    templates = [b'', b'\n', b'$', b'$$', b'$$$', b'plain text without directives']
+    for index in range(400):
+        if index % 2:
+            templates.append(token_template(rng, rng.randint(0, 80)))
+        else:
+            templates.append(structured_template(rng, rng.randint(0, 60)))
+    # Past the checkpoint interval, so edits have checkpoints to resume from
+    for _ in range(8):
+        templates.append(structured_template(rng, 1500))
+    return templates
+
+# Random values a cache holds: scalars, and dicts, lists and sets of them
+def cache_value(rng, depth=0):
+    r = rng.random()
+    if depth < 3 and r < 0.3:
+        return {rng.choice('abcdef'): cache_value(rng, depth+1) for _ in range(rng.randint(0, 4))}
+    if depth < 3 and r < 0.45:
+        return [cache_value(rng, depth+1) for _ in range(rng.randint(0, 4))]
+    if r < 0.55:
+        return set(rng.sample(range(20), rng.randint(0, 5)))
+    return rng.choice([0, 1, -2.5, 'x', 'é', '', None, True, 'a"b'])
+
+# One random mutation somewhere in a Cacher, through the same methods the application uses
+def mutate_cache(rng, cacher):
+    node = cacher
+    while rng.random() < 0.6:
+        if isinstance(node, dict) and len(node):
+            child = node[rng.choice(list(node.keys()))]
+        elif isinstance(node, list) and len(node):
+            child = node[rng.randrange(len(node))]
+        else:
+            break
+        if not isinstance(child, (dict, list, set)):
+            break
+        node = child
+
+    r = rng.random()
+    if isinstance(node, dict):
+        key = rng.choice('abcdefg')
+        if r < 0.5:
+            node[key] = cache_value(rng)
+        elif r < 0.65:
+            node.pop(key, None)
+        elif r < 0.8:
+            # Written through a placeholder
+            node[key + '_new'][rng.choice('xy')] = cache_value(rng)
+        elif r < 0.9:
+            node.update({key: cache_value(rng)})
+        else:
+            node.setdefault(key, cache_value(rng))
+    elif isinstance(node, list):
+        if r < 0.4 or not node:
+            node.append(cache_value(rng))
+        elif r < 0.6:
+            node.pop()
+        elif r < 0.8:
+            node[rng.randrange(len(node))] = cache_value(rng)
+        else:
+            node.insert(0, cache_value(rng))
+    else:
+        if r < 0.6:
+            node.add(rng.randrange(20))
+        else:
+            node.discard(rng.randrange(20))
+
+@pytest.fixture
+def mutate():
+    return mutate_cache
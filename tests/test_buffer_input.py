@@ -0,0 +1,14 @@
+import highennabackend
+
+def test_buffer_input(corpus):
+    for code in corpus[:100]:
+        expected = highennabackend.parse(code)
+        assert highennabackend.parse(bytearray(code)) == expected
+        assert highennabackend.parse(memoryview(code)) == expected
+        # A slice of a larger buffer is parsed in place
+        assert highennabackend.parse(memoryview(b'xx' + code + b'yy')[2:2+len(code)]) == expected
+
+def test_codec_buffer_input():
+    data = b'{"a":[1,2,3]}' * 100
+    assert highennabackend.decode(highennabackend.encode(bytearray(data))) == data
+    assert highennabackend.decode(memoryview(highennabackend.encode(memoryview(data)))) == data
@@ -0,0 +1,55 @@
+import random
+import json
+
+import pytest
+
+import cache_codec
+from test_cache_codec import cache_text
+
+@pytest.fixture
+def chunks():
+    rng = random.Random(12)
+    return {
+            'highenna_version': b'"2.0.0"',
+            'table_data': cache_text(rng, 200),
+            'modules': b'{"module_assignment":{},"module_uuid_to_name":{}}',
+            'ключ, "quoted"': b'[]',
+        }
+
+def test_chunks_round_trip(chunks):
+    stream, encoded = cache_codec.encode_chunks(chunks)
+    assert cache_codec.decode(stream) == cache_codec.join_chunks(chunks)
+    assert json.loads(cache_codec.decode(stream)) == {key:json.loads(text) for key,text in chunks.items()}
+    assert [(key, text) for key,_,_,text in cache_codec.decode_chunks(stream)] == list(chunks.items())
+    assert set(encoded) == set(chunks)
+
+def test_chunks_empty():
+    stream, encoded = cache_codec.encode_chunks({})
+    assert cache_codec.decode(stream) == b'{}'
+    assert encoded == {}
+
+def test_chunks_reuse_previous(chunks):
+    _, previous = cache_codec.encode_chunks(chunks)
+    changed = dict(chunks, modules=b'{"module_assignment":{"X":"y"},"module_uuid_to_name":{}}')
+    stream, encoded = cache_codec.encode_chunks(changed, previous)
+    for key in chunks:
+        if key == 'modules':
+            assert encoded[key] != previous[key]
+        else:
+            assert encoded[key] is previous[key]
+    assert cache_codec.decode(stream) == cache_codec.join_chunks(changed)
+
+def test_chunks_checksum_mismatch(chunks):
+    stream, encoded = cache_codec.encode_chunks(chunks)
+    checksum = encoded['table_data'][0]
+    tampered = stream.replace(checksum, cache_codec.chunk_checksum(b'something else'))
+    assert tampered != stream
+    with pytest.raises(ValueError):
+        cache_codec.decode(tampered)
+
+def test_chunks_swapped(chunks):
+    stream, encoded = cache_codec.encode_chunks(chunks)
+    # A chunk moved under another key's checksum is caught as well
+    swapped = stream.replace(encoded['highenna_version'][1], encoded['modules'][1], 1)
+    with pytest.raises(ValueError):
+        cache_codec.decode(swapped)
@@ -0,0 +1,35 @@
+import random
+import json
+
+import pytest
+
+import cache_codec
+
+def cache_text(rng, size):
+    rows = [[f'script.{index:0>3}', rng.choice(['1', '2.5', 'abc', 'é', '']), str(rng.random())] for index in range(size)]
+    return json.dumps({'column_names': ['a', 'b', 'c'], 'data': rows}, separators=(',', ':')).encode('utf-8')
+
+@pytest.mark.parametrize('codec', [None, cache_codec.LEGACY, cache_codec.LZW85, cache_codec.ZLIB85])
+def test_round_trip(codec):
+    rng = random.Random(14)
+    for data in [b'{}', b'{"a":1}', cache_text(rng, 10), cache_text(rng, 2000)]:
+        assert cache_codec.decode(cache_codec.encode(data, codec)) == data
+
+def test_legacy_read():
+    # Blocks written before the codec tag existed are the bare LZW stream
+    data = b'{"table_data":{"column_names":[],"data":[]}}'
+    stream = cache_codec.encode(data, cache_codec.LEGACY)
+    assert not stream.startswith(cache_codec.HEADER)
+    assert cache_codec.decode(stream) == data
+
+def test_smallest_codec():
+    rng = random.Random(15)
+    for data in [b'{}', cache_text(rng, 3), cache_text(rng, 30)]:
+        assert len(cache_codec.encode(data)) == min(len(cache_codec.encode(data, codec)) for codec in [cache_codec.LZW85, cache_codec.ZLIB85])
+    assert cache_codec.encode(cache_text(rng, 2000))[1:2] == cache_codec.ZLIB85
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        cache_codec.encode(b'{}', b'Q')
+    with pytest.raises(ValueError):
+        cache_codec.decode(cache_codec.HEADER + b'Q' + b'0000')
@@ -0,0 +1,26 @@
+import random
+import json
+
+import pytest
+
+import cache_codec
+
+# Random hex hardly compresses, which takes both the chunks and the stream past
+# PARALLEL_ABOVE, so they are encoded and decoded on the thread pool
+def large_chunks(count):
+    rng = random.Random(16)
+    return {f'key_{index}': json.dumps(rng.getrandbits(1 << 20).to_bytes(1 << 17, 'little').hex()).encode('utf-8') for index in range(count)}
+
+def test_chunks_parallel():
+    chunks = large_chunks(6)
+    stream, _ = cache_codec.encode_chunks(chunks)
+    assert len(stream) >= cache_codec.PARALLEL_ABOVE
+    assert cache_codec.decode(stream) == cache_codec.join_chunks(chunks)
+    assert [key for key,*_ in cache_codec.iter_chunks(stream)] == list(chunks)
+
+def test_parallel_checksum_mismatch():
+    chunks = large_chunks(6)
+    stream, encoded = cache_codec.encode_chunks(chunks)
+    tampered = stream.replace(encoded['key_5'][0], cache_codec.chunk_checksum(b'something else'))
+    with pytest.raises(ValueError):
+        cache_codec.decode(tampered)
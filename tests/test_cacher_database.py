@@ -0,0 +1,74 @@
+import random
+import json
+
+from cacher import Cacher,dumps,unwrap,custom_decoder
+
+def plain(cacher):
+    return json.loads(dumps(unwrap(cacher)), object_hook=custom_decoder)
+
+def rows(cacher):
+    return dict(cacher.storage.connection.execute('SELECT key, value FROM cache'))
+
+def test_reload(tmp_path, mutate):
+    rng = random.Random(20)
+    file_path = str(tmp_path / 'application_cache.sqlite3')
+    cacher = Cacher(file_path, database=True, flush_delay=None)
+    for _ in range(300):
+        mutate(rng, cacher)
+        if rng.random() < 0.1:
+            assert plain(Cacher(file_path, database=True, flush_delay=None)) == plain(cacher)
+    assert plain(Cacher(file_path, database=True, flush_delay=None)) == plain(cacher)
+
+def test_sessions(tmp_path):
+    # Each session only writes the keys it changed, so neither undoes the other's changes
+    file_path = str(tmp_path / 'application_cache.sqlite3')
+    first = Cacher(file_path, database=True, flush_delay=None)
+    first['shared'] = {'a': 1}
+    second = Cacher(file_path, database=True, flush_delay=None)
+    first['first'] = 1
+    second['second'] = 2
+    second['shared']['b'] = 2
+    first['last_project_paths'] = ['x']
+    assert plain(Cacher(file_path, database=True, flush_delay=None)) == {
+            'shared': {'a': 1, 'b': 2},
+            'first': 1,
+            'second': 2,
+            'last_project_paths': ['x'],
+        }
+
+def test_rows(tmp_path):
+    file_path = str(tmp_path / 'application_cache.sqlite3')
+    cacher = Cacher(file_path, database=True, flush_delay=None)
+    cacher['a'] = {'x': 1}
+    cacher['b'] = {1, 2}
+    cacher['c'] = 3
+    del cacher['c']
+    assert rows(cacher) == {'a': '{"x":1}', 'b': '{"__set__":[1,2]}'}
+    cacher.clear()
+    assert rows(cacher) == {}
+
+def test_texts_seeded(tmp_path):
+    file_path = str(tmp_path / 'application_cache.sqlite3')
+    Cacher(file_path, database=True, flush_delay=None)['a'] = {'x': [1, 2]}
+    cacher = Cacher(file_path, database=True, flush_delay=None)
+    # The rows' JSON is reused until the key changes
+    assert cacher.texts['a'][1] == '{"x":[1,2]}'
+    assert cacher.serialize() == '{"a":{"x":[1,2]}}'
+
+def test_import(tmp_path):
+    legacy_path = str(tmp_path / 'application_cache.json')
+    legacy = Cacher(legacy_path, journal=True, flush_delay=None)
+    legacy['extensions'] = {'.c': '.c'}
+    legacy['last_project_paths'] = ['a', 'b']
+    legacy.flush()
+    file_path = str(tmp_path / 'application_cache.sqlite3')
+    cacher = Cacher(file_path, database=True, flush_delay=None)
+    cacher.update(Cacher(legacy_path, journal=True))
+    assert plain(Cacher(file_path, database=True, flush_delay=None)) == plain(legacy)
+
+def test_delete(tmp_path):
+    file_path = tmp_path / 'application_cache.sqlite3'
+    cacher = Cacher(str(file_path), database=True, flush_delay=None)
+    cacher['a'] = 1
+    cacher.delete()
+    assert not file_path.exists()
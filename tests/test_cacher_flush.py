@@ -0,0 +1,71 @@
+import threading
+import time
+
+from cacher import Cacher,flusher
+
+class Writes:
+    def __init__(self):
+        self.serializations = []
+        self.written = threading.Event()
+
+    def __call__(self, file_path, serialization):
+        self.serializations.append(serialization)
+        self.written.set()
+
+def test_coalesced(tmp_path):
+    writes = Writes()
+    cacher = Cacher(str(tmp_path / 'cache.json'), writer=writes, flush_delay=0.2, max_flush_delay=5)
+    for index in range(100):
+        cacher['a'] = index
+    assert writes.serializations == []
+    assert writes.written.wait(5)
+    time.sleep(0.3)
+    assert writes.serializations == ['{"a":99}']
+
+def test_max_flush_delay(tmp_path):
+    writes = Writes()
+    cacher = Cacher(str(tmp_path / 'cache.json'), writer=writes, flush_delay=0.2, max_flush_delay=0.5)
+    start = time.monotonic()
+    # Mutations keep coming faster than flush_delay, the write still happens by max_flush_delay
+    while not writes.written.is_set() and time.monotonic() - start < 5:
+        cacher['a'] = time.monotonic()
+        time.sleep(0.05)
+    assert writes.written.is_set()
+    assert time.monotonic() - start < 2
+
+def test_immediate(tmp_path):
+    writes = Writes()
+    cacher = Cacher(str(tmp_path / 'cache.json'), writer=writes, flush_delay=None)
+    cacher['a'] = 1
+    cacher['b'] = 2
+    assert writes.serializations == ['{"a":1}', '{"a":1,"b":2}']
+
+def test_flush(tmp_path):
+    writes = Writes()
+    cacher = Cacher(str(tmp_path / 'cache.json'), writer=writes, flush_delay=10)
+    cacher['a'] = 1
+    cacher.flush()
+    assert writes.serializations == ['{"a":1}']
+    # Nothing left pending, and nothing to write when clean
+    cacher.flush()
+    flusher.flush_all()
+    assert writes.serializations == ['{"a":1}']
+
+def test_sync_disabled(tmp_path):
+    writes = Writes()
+    cacher = Cacher(str(tmp_path / 'cache.json'), writer=writes, flush_delay=0.05)
+    cacher.disable_sync()
+    cacher['a'] = 1
+    time.sleep(0.3)
+    assert writes.serializations == []
+    cacher.enable_sync()
+    assert writes.written.wait(5)
+    assert writes.serializations == ['{"a":1}']
+
+def test_flush_all(tmp_path):
+    writes = Writes()
+    cacher = Cacher(str(tmp_path / 'cache.json'), writer=writes, flush_delay=60)
+    cacher['a'] = 1
+    # What runs at exit
+    flusher.flush_all()
+    assert writes.serializations == ['{"a":1}']
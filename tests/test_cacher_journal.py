@@ -0,0 +1,75 @@
+import random
+import json
+import os
+
+from cacher import Cacher,Journal,dumps,unwrap,custom_decoder
+
+def plain(cacher):
+    return json.loads(dumps(unwrap(cacher)), object_hook=custom_decoder)
+
+def test_reload(tmp_path, mutate):
+    rng = random.Random(15)
+    file_path = str(tmp_path / 'Project.heproj')
+    cacher = Cacher(file_path, journal=True, flush_delay=None)
+    for _ in range(300):
+        mutate(rng, cacher)
+        if rng.random() < 0.1:
+            assert plain(Cacher(file_path, journal=True, flush_delay=None)) == plain(cacher)
+    assert plain(Cacher(file_path, journal=True, flush_delay=None)) == plain(cacher)
+
+def test_compaction(tmp_path):
+    file_path = str(tmp_path / 'Project.heproj')
+    cacher = Cacher(file_path, journal=True, flush_delay=None)
+    cacher.storage.min_compaction_size = 1024
+    cacher['table'] = {'rows': []}
+    for index in range(200):
+        cacher['table']['rows'].append(index)
+        cacher['counter'] = index
+    # The journal never grew past the snapshot for long
+    assert os.path.getsize(file_path + '.journal') <= max(1024, os.path.getsize(file_path)) + 1024
+    with open(file_path, encoding='utf-8') as f:
+        assert json.load(f)['table']['rows'][:10] == list(range(10))
+    assert plain(Cacher(file_path, journal=True, flush_delay=None)) == plain(cacher)
+
+def test_truncated_record(tmp_path):
+    file_path = str(tmp_path / 'Project.heproj')
+    cacher = Cacher(file_path, journal=True, flush_delay=None)
+    cacher['a'] = {'x': 1}
+    cacher['a']['y'] = [1, 2]
+    expected = plain(cacher)
+    cacher['a']['x'] = 2
+    # A crash cut the last record short
+    with open(file_path + '.journal', 'rb+') as f:
+        f.truncate(os.path.getsize(file_path + '.journal') - 3)
+    assert plain(Cacher(file_path, journal=True, flush_delay=None)) == expected
+
+def test_operations(tmp_path):
+    file_path = str(tmp_path / 'Project.heproj')
+    cacher = Cacher(file_path, journal=True, flush_delay=None)
+    cacher['a'] = {'b': {'c': [1]}}
+    cacher['a']['b']['c'].append(2)
+    cacher['a']['s'] = set()
+    cacher['a']['s'].add(3)
+    del cacher['a']['b']
+    with open(file_path + '.journal', encoding='utf-8') as f:
+        operations = [json.loads(line, object_hook=custom_decoder) for line in f]
+    # Changes in lists replace the whole list, everything else is addressed by its path
+    assert operations == [
+            ['set', ['a'], {'b': {'c': [1]}}],
+            ['set', ['a', 'b', 'c'], [1, 2]],
+            ['set', ['a', 's'], set()],
+            ['add', ['a', 's'], [3]],
+            ['del', ['a', 'b']],
+        ]
+
+def test_replay_idempotent(tmp_path):
+    # A journal replayed over a snapshot that already holds part of it gives the same data
+    file_path = str(tmp_path / 'Project.heproj')
+    cacher = Cacher(file_path, journal=True, flush_delay=None)
+    cacher['a'] = {'s': {1}}
+    cacher['a']['s'].add(2)
+    cacher['a']['n'] = 1
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(cacher.snapshot())
+    data, _ = Journal(file_path).load()
+    assert data == plain(cacher)
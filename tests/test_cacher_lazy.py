@@ -0,0 +1,42 @@
+import json
+
+from cacher import Cacher
+
+def open_cache(tmp_path, data, **kwargs):
+    file_path = tmp_path / 'cache.json'
+    file_path.write_text(json.dumps(data), encoding='utf-8')
+    return Cacher(str(file_path), flush_delay=None, **kwargs)
+
+def test_wrapped_on_access(tmp_path):
+    cacher = open_cache(tmp_path, {'a': {'b': {'c': [1, {'d': 2}]}}, 'e': {'f': 1}})
+    # Loaded containers stay plain until reached
+    assert type(dict.__getitem__(cacher, 'a')) is dict
+    b = cacher['a']['b']
+    assert isinstance(b, Cacher.WrappedDict)
+    assert type(dict.__getitem__(b, 'c')) is list
+    assert type(dict.__getitem__(cacher, 'e')) is dict
+    # Reaching the same key again hands out the same wrapper
+    assert cacher['a']['b'] is b
+
+def test_write_through_lazy(tmp_path):
+    cacher = open_cache(tmp_path, {'a': {'b': {'c': [1, {'d': 2}]}}})
+    cacher['a']['b']['c'][1]['d'] = 3
+    with open(cacher.file_path, encoding='utf-8') as f:
+        assert json.load(f) == {'a': {'b': {'c': [1, {'d': 3}]}}}
+
+def test_iteration_wraps(tmp_path):
+    cacher = open_cache(tmp_path, {'a': {'x': [1]}, 'b': [{'y': 1}]})
+    assert all(isinstance(v, (Cacher.WrappedDict, Cacher.WrappedList)) for v in cacher.values())
+    for item in cacher['b']:
+        item['y'] = 2
+    assert cacher.copy() == {'a': {'x': [1]}, 'b': [{'y': 2}]}
+
+def test_assigned_values_detached(tmp_path):
+    cacher = open_cache(tmp_path, {})
+    value = {'x': [1, 2]}
+    cacher['a'] = value
+    value['x'].append(3)
+    assert cacher.copy() == {'a': {'x': [1, 2]}}
+    copy = cacher.copy()
+    copy['a']['x'].append(4)
+    assert cacher.copy() == {'a': {'x': [1, 2]}}
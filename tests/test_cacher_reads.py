@@ -0,0 +1,63 @@
+import pytest
+
+from cacher import Cacher
+
+class Writes:
+    def __init__(self):
+        self.serializations = []
+
+    def __call__(self, file_path, serialization):
+        self.serializations.append(serialization)
+
+@pytest.fixture
+def cacher(tmp_path):
+    writes = Writes()
+    cacher = Cacher(str(tmp_path / 'cache.json'), writer=writes, flush_delay=None)
+    cacher['a'] = {'b': [1, {'c': 2}]}
+    writes.serializations.clear()
+    cacher.writes = writes
+    return cacher
+
+def test_missing_keys(cacher):
+    # Reading missing keys neither adds them nor writes anything
+    assert cacher['x']['y'].get('z') is None
+    assert 'z' not in cacher['a']
+    assert len(cacher['a']['missing']) == 0
+    assert cacher.copy() == {'a': {'b': [1, {'c': 2}]}}
+    assert cacher.writes.serializations == []
+    assert not cacher.dirty
+
+def test_placeholder_write(cacher):
+    placeholder = cacher['x']['y']
+    placeholder['z'] = 1
+    assert cacher.copy() == {'a': {'b': [1, {'c': 2}]}, 'x': {'y': {'z': 1}}}
+    assert cacher.writes.serializations == ['{"a":{"b":[1,{"c":2}]},"x":{"y":{"z":1}}}']
+    # The placeholder is now the stored container
+    placeholder['w'] = 2
+    assert cacher['x']['y'] is placeholder
+    assert cacher.copy()['x'] == {'y': {'z': 1, 'w': 2}}
+
+def test_placeholder_replaced(cacher):
+    placeholder = cacher['x']
+    cacher['x'] = {'k': 1}
+    # Writing to a placeholder whose key was assigned meanwhile leaves the assigned value alone
+    placeholder['k'] = 2
+    assert cacher.copy()['x'] == {'k': 1}
+
+def test_get_path(cacher):
+    assert cacher.get_path('a', 'b', 1, 'c') == 2
+    assert cacher.get_path('a', 'b', 5, default=0) == 0
+    assert cacher.get_path('a', 'b', 0, 'c') is None
+    assert cacher.get_path('missing', 'x') is None
+    assert not cacher.dirty
+
+def test_view(cacher):
+    view = cacher.view()
+    assert view['a']['b'][1]['c'] == 2
+    with pytest.raises(TypeError):
+        view['a']['b'][1]['c'] = 3
+    with pytest.raises(KeyError):
+        view['missing']
+    # Nothing got wrapped through the view
+    assert type(dict.__getitem__(cacher, 'a')) is dict
+    assert cacher.writes.serializations == []
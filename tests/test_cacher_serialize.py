@@ -0,0 +1,33 @@
+import random
+import json
+
+from cacher import Cacher,dumps,unwrap,custom_decoder
+
+def plain(cacher):
+    return json.loads(dumps(unwrap(cacher)), object_hook=custom_decoder)
+
+def test_serialize(tmp_path, mutate):
+    rng = random.Random(18)
+    cacher = Cacher(str(tmp_path / 'cache.json'), flush_delay=None)
+    for _ in range(500):
+        mutate(rng, cacher)
+        # Reused texts of unchanged subtrees add up to the same serialization
+        assert cacher.serialize() == dumps(unwrap(cacher))
+
+def test_serialize_chunked(tmp_path, mutate):
+    rng = random.Random(19)
+    chunks = []
+    cacher = Cacher(str(tmp_path / 'cache.json'), writer=lambda file_path, serialization: chunks.append(serialization), chunked=True, flush_delay=None)
+    for _ in range(200):
+        mutate(rng, cacher)
+        assert {k: json.loads(text, object_hook=custom_decoder) for k, text in chunks[-1].items()} == plain(cacher)
+
+def test_serialize_reuses_texts(tmp_path):
+    cacher = Cacher(str(tmp_path / 'cache.json'), flush_delay=None)
+    cacher['a'] = {'x': [1, 2]}
+    cacher['b'] = {'y': 1}
+    cacher.serialize()
+    text = cacher.texts['a']
+    cacher['b']['y'] = 2
+    cacher.serialize()
+    assert cacher.texts['a'] is text
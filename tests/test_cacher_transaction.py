@@ -0,0 +1,159 @@
+import threading
+import random
+import json
+import time
+
+import pytest
+
+from cacher import Cacher,dumps,unwrap,custom_decoder
+
+class Writes:
+    def __init__(self):
+        self.serializations = []
+
+    def __call__(self, file_path, serialization):
+        self.serializations.append(serialization)
+
+def plain(cacher):
+    return json.loads(dumps(unwrap(cacher)), object_hook=custom_decoder)
+
+@pytest.fixture
+def cacher(tmp_path):
+    writes = Writes()
+    cacher = Cacher(str(tmp_path / 'cache.json'), writer=writes, flush_delay=None)
+    cacher['a'] = {'b': {'c': 1}, 'l': [{'x': 1}, 2], 's': {1, 2}}
+    writes.serializations.clear()
+    cacher.writes = writes
+    return cacher
+
+def test_single_write(cacher):
+    with cacher.transaction():
+        cacher['a']['b']['c'] = 2
+        cacher['d'] = 3
+        cacher['a']['s'].add(3)
+    assert cacher.writes.serializations == [cacher.serialize()]
+
+def test_nested(cacher):
+    with cacher.transaction():
+        cacher['d'] = 1
+        with cacher.transaction():
+            cacher['e'] = 2
+        assert cacher.writes.serializations == []
+        cacher['f'] = 3
+    assert len(cacher.writes.serializations) == 1
+    assert plain(cacher)['f'] == 3
+
+def test_rollback(cacher):
+    before = cacher.serialize()
+    with pytest.raises(ZeroDivisionError):
+        with cacher.transaction():
+            cacher['a']['b']['c'] = 2
+            cacher['a']['l'][0]['x'] = 5
+            cacher['a']['l'].append(3)
+            cacher['a']['s'].discard(1)
+            del cacher['a']['b']
+            cacher['d'] = {'e': 1}
+            1/0
+    assert cacher.serialize() == before
+    assert cacher.writes.serializations == []
+
+def test_nested_rollback(cacher):
+    with cacher.transaction():
+        cacher['d'] = 1
+        with pytest.raises(ZeroDivisionError):
+            with cacher.transaction():
+                cacher['e'] = 2
+                1/0
+    assert 'e' not in cacher
+    assert plain(cacher)['d'] == 1
+    assert cacher.writes.serializations == [cacher.serialize()]
+
+def test_rollback_in_place(cacher):
+    a = cacher['a']
+    b = a['b']
+    l = a['l']
+    item = l[0]
+    s = a['s']
+    with pytest.raises(ZeroDivisionError):
+        with cacher.transaction():
+            b['c'] = 2
+            item['x'] = 3
+            s.add(5)
+            cacher['a'] = {'replaced': True}
+            1/0
+    # Containers handed out before the transaction are still the cache's
+    assert cacher['a'] is a and a['b'] is b and a['l'] is l and l[0] is item and a['s'] is s
+    b['c'] = 4
+    item['x'] = 6
+    s.add(7)
+    assert plain(cacher) == {'a': {'b': {'c': 4}, 'l': [{'x': 6}, 2], 's': {1, 2, 7}}}
+    assert json.loads(cacher.writes.serializations[-1], object_hook=custom_decoder) == plain(cacher)
+
+def test_rollback_placeholders(cacher):
+    pending = cacher['n']
+    adopted = cacher['m']
+    with pytest.raises(ZeroDivisionError):
+        with cacher.transaction():
+            adopted['x'] = 1
+            1/0
+    assert 'm' not in cacher
+    # Both placeholders still join the cache once written to
+    pending['y'] = 1
+    adopted['z'] = 2
+    assert plain(cacher)['n'] == {'y': 1}
+    assert plain(cacher)['m'] == {'z': 2}
+
+def test_rollback_journal(tmp_path, mutate):
+    rng = random.Random(19)
+    file_path = str(tmp_path / 'Project.heproj')
+    cacher = Cacher(file_path, journal=True, flush_delay=None)
+    for _ in range(50):
+        savepoint = plain(cacher)
+        try:
+            with cacher.transaction():
+                for _ in range(rng.randint(1, 5)):
+                    mutate(rng, cacher)
+                if rng.random() < 0.5:
+                    raise ZeroDivisionError
+        except ZeroDivisionError:
+            assert plain(cacher) == savepoint
+        assert plain(Cacher(file_path, journal=True, flush_delay=None)) == plain(cacher)
+
+def test_threads(cacher):
+    # Transactions entered and left from several threads at once leave the cache unlocked
+    def run(index):
+        for count in range(200):
+            with cacher.transaction():
+                cacher[f'thread_{index}'] = count
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cacher.depth == 0 and cacher.write_enable
+    assert json.loads(cacher.writes.serializations[-1])['thread_3'] == 199
+
+def test_writer_lock(tmp_path):
+    # The writer takes a lock the transaction's caller also takes, as ScenarioFile's does
+    mutex = threading.RLock()
+    flushing = threading.Event()
+    def writer(file_path, serialization):
+        flushing.set()
+        # Lets the caller take the mutex while the flush is underway
+        time.sleep(0.02)
+        with mutex:
+            pass
+    cacher = Cacher(str(tmp_path / 'cache.json'), writer=writer, flush_delay=0.01, max_flush_delay=0.01)
+    done = threading.Event()
+    def run():
+        for count in range(10):
+            flushing.clear()
+            cacher['a'] = count
+            flushing.wait(1)
+            with cacher.transaction():
+                with mutex:
+                    cacher['b'] = count
+        done.set()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert done.wait(20)
@@ -0,0 +1,13 @@
+import highennabackend
+
+def test_compact(corpus):
+    for code in corpus:
+        assert highennabackend.parse(code, compact=True).to_dict() == highennabackend.parse(code)
+
+def test_arrays(corpus):
+    for code in corpus[:100]:
+        result = highennabackend.parse(code, compact=True)
+        assert len(result.kind) == len(result.start) == len(result.end) == len(result.parent) == len(result)
+        assert list(result.line_indexes) == highennabackend.parse(code)['line_indexes']
+        assert result.code_length == len(code)
+        assert all(highennabackend.node_kinds[kind] for kind in result.kind)
@@ -0,0 +1,68 @@
+import os
+
+from dir_snapshot import DirectorySnapshot
+
+def write(path, content, mtime_ns=None):
+    path.write_bytes(content)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def test_scan(tmp_path):
+    write(tmp_path / 'a.c', b'a')
+    write(tmp_path / 'b.c', b'b')
+    write(tmp_path / 'ignored.txt', b'')
+    (tmp_path / 'dir.c').mkdir()
+    snapshot = DirectorySnapshot(str(tmp_path), lambda name: name.endswith('.c'))
+    assert snapshot.scan() == ({'a.c', 'b.c'}, set(), set())
+    assert snapshot.scan() == (set(), set(), set())
+    assert sorted(snapshot.paths()) == [str(tmp_path / 'a.c'), str(tmp_path / 'b.c')]
+
+    # Same size, a different mtime
+    write(tmp_path / 'a.c', b'x', 10**9)
+    os.remove(tmp_path / 'b.c')
+    write(tmp_path / 'c.c', b'c')
+    assert snapshot.scan() == ({'c.c'}, {'b.c'}, {'a.c'})
+
+def test_scan_missing_directory(tmp_path):
+    snapshot = DirectorySnapshot(str(tmp_path / 'missing'))
+    assert snapshot.scan() == (set(), set(), set())
+
+def test_refresh(tmp_path):
+    write(tmp_path / 'a.c', b'a')
+    write(tmp_path / 'b.c', b'b')
+    snapshot = DirectorySnapshot(str(tmp_path), lambda name: name.endswith('.c'))
+    snapshot.scan()
+
+    write(tmp_path / 'a.c', b'aa')
+    os.remove(tmp_path / 'b.c')
+    write(tmp_path / 'c.c', b'c')
+    write(tmp_path / 'd.c', b'd')
+    write(tmp_path / 'e.txt', b'e')
+    # Only the names given are looked at
+    assert snapshot.refresh(['a.c', 'b.c', 'c.c', 'e.txt', 'missing.c']) == ({'c.c'}, {'b.c'}, {'a.c'})
+    assert snapshot.refresh(['a.c', 'c.c']) == (set(), set(), set())
+    assert snapshot.scan() == ({'d.c'}, set(), set())
+
+def test_refresh_matches_scan(tmp_path):
+    # A refresh of every changed name leaves the snapshot as a new scan would
+    for index in range(20):
+        write(tmp_path / f'{index}.c', b'%d' % index)
+    refreshed = DirectorySnapshot(str(tmp_path))
+    refreshed.scan()
+    for index in range(0, 20, 3):
+        write(tmp_path / f'{index}.c', b'changed %d' % index)
+    for index in range(1, 20, 4):
+        os.remove(tmp_path / f'{index}.c')
+    write(tmp_path / 'new.c', b'')
+    refreshed.refresh(os.listdir(tmp_path) + [f'{index}.c' for index in range(20)])
+    scanned = DirectorySnapshot(str(tmp_path))
+    scanned.scan()
+    assert refreshed.stats == scanned.stats
+
+def test_replaced_by_directory(tmp_path):
+    write(tmp_path / 'a.c', b'a')
+    snapshot = DirectorySnapshot(str(tmp_path))
+    snapshot.scan()
+    os.remove(tmp_path / 'a.c')
+    (tmp_path / 'a.c').mkdir()
+    assert snapshot.refresh(['a.c']) == (set(), {'a.c'}, set())
@@ -0,0 +1,49 @@
+import bisect
+
+import pytest
+
+import highennabackend
+from parse_view import ParseView
+
+# Lines are the ones in line_indexes, columns count characters from the line start
+def expected_positions(code, offsets, encoding):
+    line_indexes = highennabackend.parse(code)['line_indexes']
+    positions = []
+    for offset in offsets:
+        line = bisect.bisect_right(line_indexes, offset)
+        positions.append((line, len(code[line_indexes[line-1]:offset].decode(encoding)) + 1))
+    return positions
+
+def char_offsets(text, encoding):
+    offsets = [0]
+    for char in text:
+        offsets.append(offsets[-1] + len(char.encode(encoding)))
+    return offsets
+
+@pytest.mark.parametrize('encoding', ['utf-8', 'latin-1'])
+def test_locate(corpus, encoding):
+    for code in corpus:
+        text = code.decode(encoding, errors='ignore')
+        code = text.encode(encoding)
+        offsets = char_offsets(text, encoding)
+        assert list(highennabackend.parse(code, compact=True).locate(code, offsets, encoding)) == expected_positions(code, offsets, encoding)
+
+def test_locate_unordered(corpus):
+    code = corpus[-1]
+    offsets = list(range(0, len(code), 97))[::-1]
+    assert list(highennabackend.parse(code, compact=True).locate(code, offsets, 'utf-8')) == expected_positions(code, offsets, 'utf-8')
+
+def test_locate_fallback():
+    # The backend only counts UTF-8 and single-byte encodings, the view decodes the rest
+    text = 'a\n$$var_é$$ ü\n$IF{x}$\nß\n$END$\n'
+    code = text.encode('utf-16-le')
+    offsets = char_offsets(text, 'utf-16-le')
+    result = highennabackend.parse(code, compact=True)
+    with pytest.raises(LookupError):
+        result.locate(code, offsets, 'utf-16-le')
+    line_indexes = highennabackend.parse(code)['line_indexes']
+    expected = []
+    for offset in offsets:
+        line = bisect.bisect_right(line_indexes, offset)
+        expected.append((line, len(code[line_indexes[line-1]:offset].decode('utf-16-le', errors='replace')) + 1))
+    assert ParseView(result).locate(code, offsets, 'utf-16-le') == expected
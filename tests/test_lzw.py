@@ -0,0 +1,33 @@
+import random
+
+import pytest
+
+import highennabackend
+
+@pytest.fixture(scope='module')
+def samples():
+    rng = random.Random(10)
+    # Enough distinct sequences to fill the LZW dictionary several times over
+    return [
+            b'',
+            b'a',
+            bytes(rng.randrange(256) for _ in range(1 << 18)),
+            b''.join(rng.choice([b'abc', b'$$var$$', b'\n', b'0123456789']) for _ in range(1 << 17)),
+            b'x' * (1 << 20),
+        ]
+
+def test_compress_round_trip(samples):
+    for data in samples:
+        assert highennabackend.decompress(highennabackend.compress(data)) == data
+
+def test_encode85_round_trip(samples):
+    for data in samples:
+        text = highennabackend.encode85(data)
+        # Safe inside a cache block
+        assert not set(text) & set(b'$\r\n')
+        assert highennabackend.decode85(text) == data
+
+def test_legacy_round_trip(samples):
+    # The legacy codec has no encoding for an empty cache
+    for data in [samples[1], samples[3][:1 << 16]]:
+        assert highennabackend.decode(highennabackend.encode(data)) == data
@@ -0,0 +1,62 @@
+import os
+
+from output_writer import OutputWriter
+import output_writer
+import safeIO
+
+def test_write(tmp_path):
+    writer = OutputWriter()
+    for index in range(200):
+        writer.submit(str(tmp_path / f'script_{index}.c'), b'int x = %d;' % index, index)
+    assert writer.close() == (200, 0, [])
+    for index in range(200):
+        assert (tmp_path / f'script_{index}.c').read_bytes() == b'int x = %d;' % index
+
+def test_skip_unchanged(tmp_path):
+    (tmp_path / 'a.c').write_bytes(b'a')
+    writer = OutputWriter()
+    writer.submit(str(tmp_path / 'a.c'), b'a', 0)
+    writer.submit(str(tmp_path / 'b.c'), b'b', 1)
+    assert writer.close() == (1, 1, [])
+
+def test_errors(tmp_path):
+    # A failing output is reported with its tag, the others of its batch are still written
+    writer = OutputWriter(workers=1)
+    for index in range(10):
+        directory = tmp_path / ('missing' if index == 4 else '')
+        writer.submit(str(directory / f'script_{index}.c'), b'%d' % index, index)
+    written, skipped, errors = writer.close()
+    assert (written, skipped) == (9, 0)
+    assert [(tag, file_path) for tag, file_path, _ in errors] == [(4, str(tmp_path / 'missing' / 'script_4.c'))]
+    assert isinstance(errors[0][2], OSError)
+
+def test_batches(tmp_path, monkeypatch):
+    batches = []
+    def safewrite_many(mode, items, *args, **kwargs):
+        batches.append(len(items))
+        return safeIO.safewrite_many(mode, items, *args, **kwargs)
+    monkeypatch.setattr(output_writer, 'safewrite_many', safewrite_many)
+    synced = []
+    monkeypatch.setattr(output_writer, 'sync_directory', synced.append)
+    fsynced = []
+    monkeypatch.setattr(os, 'fsync', fsynced.append)
+
+    writer = OutputWriter(workers=1)
+    # Queued before the thread starts, so it finds full batches
+    for index in range(output_writer.BATCH * 2):
+        writer.queue.put((str(tmp_path / f'{index}.c'), b'x', index))
+    writer.submit(str(tmp_path / 'last.c'), b'x', -1)
+    assert writer.close() == (output_writer.BATCH * 2 + 1, 0, [])
+    assert sum(batches) == output_writer.BATCH * 2 + 1
+    assert len(batches) < output_writer.BATCH * 2 + 1
+    # Files are not synced one by one, their directory is synced once
+    assert fsynced == []
+    assert synced == [os.path.abspath(tmp_path)]
+
+def test_reuse(tmp_path):
+    writer = OutputWriter()
+    writer.submit(str(tmp_path / 'a.c'), b'a', 0)
+    assert writer.close() == (1, 0, [])
+    writer.submit(str(tmp_path / 'b.c'), b'b', 1)
+    assert writer.close()[0] == 2
+    assert (tmp_path / 'b.c').read_bytes() == b'b'
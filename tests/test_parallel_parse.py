@@ -0,0 +1,20 @@
+import random
+
+import highennabackend
+
+# Past the 4 MiB threshold, so the parse is actually split
+def test_parallel(corpus):
+    rng = random.Random(6)
+    for template in corpus[-8:] + [b''.join(corpus[:400])]:
+        code = template * ((1 << 22) // len(template) + 1)
+        # Shifting the content moves the chunk boundaries around
+        code = code[rng.randint(0, 1000):]
+        # Unclosed blocks nest too deep to compare as dicts, the serialized arrays are compared instead
+        expected = highennabackend.parse(code, compact=True).to_bytes()
+        for max_workers in [2, 3, 4]:
+            assert highennabackend.parse(code, compact=True, max_workers=max_workers).to_bytes() == expected
+
+def test_parallel_small(corpus):
+    # Under the threshold the buffer is parsed serially whatever max_workers says
+    for code in corpus[:50]:
+        assert highennabackend.parse(code, max_workers=4) == highennabackend.parse(code)
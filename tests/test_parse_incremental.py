@@ -0,0 +1,27 @@
+import random
+
+import highennabackend
+
+# Replaces a random span, from nothing to past the checkpoint interval, with a few template tokens
+def edit(rng, code):
+    start = rng.randint(0, len(code))
+    end = min(len(code), start + rng.choice([0, 0, 1, 5, 100, 20000]))
+    insert = b''.join(rng.choice([b'$$var_e$$', b'\n', b'$END$\n', b'$IF{x}$\n', b'zz', b'$', b'']) for _ in range(rng.randint(0, 4)))
+    return code[:start] + insert + code[end:]
+
+def test_parse_incremental(corpus):
+    rng = random.Random(4)
+    for code in corpus:
+        previous = highennabackend.parse(code, compact=True)
+        for _ in range(3):
+            new_code = edit(rng, code)
+            expected = highennabackend.parse(new_code)
+            assert highennabackend.parse_incremental(previous, code, new_code) == expected
+            previous = highennabackend.parse_incremental(previous, code, new_code, compact=True)
+            assert previous.to_dict() == expected
+            code = new_code
+
+def test_parse_incremental_unchanged(corpus):
+    for code in corpus[-8:]:
+        previous = highennabackend.parse(code, compact=True)
+        assert highennabackend.parse_incremental(previous, code, code, compact=True).to_bytes() == previous.to_bytes()
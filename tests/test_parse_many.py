@@ -0,0 +1,17 @@
+import highennabackend
+
+def test_parse_many(corpus):
+    expected = [highennabackend.parse(code) for code in corpus]
+    assert highennabackend.parse_many(corpus) == expected
+    assert highennabackend.parse_many(corpus, max_workers=1) == expected
+    assert [result.to_dict() for result in highennabackend.parse_many(corpus, max_workers=3, compact=True)] == expected
+
+def test_parse_many_empty():
+    assert highennabackend.parse_many([]) == []
+
+def test_parse_many_failure(corpus):
+    # A failing input leaves its exception in its slot
+    results = highennabackend.parse_many([corpus[10], 'not a buffer', corpus[11]])
+    assert results[0] == highennabackend.parse(corpus[10])
+    assert isinstance(results[1], Exception)
+    assert results[2] == highennabackend.parse(corpus[11])
@@ -0,0 +1,65 @@
+import random
+import os
+
+import pytest
+
+import highennabackend
+from parse_cache import ParseCache,HEADER,MAGIC,FORMAT_VERSION
+from test_parse_incremental import edit
+
+def test_to_bytes(corpus):
+    for code in corpus:
+        result = highennabackend.parse(code, compact=True)
+        restored = highennabackend.ParseResult.from_bytes(result.to_bytes())
+        assert restored.to_dict() == result.to_dict()
+        assert restored.code_length == len(code)
+
+def test_from_bytes_truncated(corpus):
+    data = highennabackend.parse(corpus[-1], compact=True).to_bytes()
+    for length in [0, 3, len(data)//2, len(data)-1]:
+        with pytest.raises(ValueError):
+            highennabackend.ParseResult.from_bytes(data[:length])
+
+def test_from_bytes_incremental(corpus):
+    # A reloaded result still has the checkpoints to resume from
+    rng = random.Random(7)
+    for code in corpus[-8:]:
+        previous = highennabackend.ParseResult.from_bytes(highennabackend.parse(code, compact=True).to_bytes())
+        new_code = edit(rng, code)
+        assert highennabackend.parse_incremental(previous, code, new_code) == highennabackend.parse(new_code)
+
+def test_parse_cache(tmp_path, corpus):
+    cache = ParseCache(str(tmp_path / 'Project.hecache'))
+    code = corpus[-1]
+    assert cache.get(code) is None
+    cache.put(code, highennabackend.parse(code, compact=True), 'utf-8', '{"a":1}')
+    entry = cache.get(code)
+    assert entry.result.to_dict() == highennabackend.parse(code)
+    assert (entry.encoding, entry.cache) == ('utf-8', '{"a":1}')
+    assert cache.contains(code)
+    assert cache.get(code + b'x') is None
+
+def test_parse_cache_invalid(tmp_path, corpus):
+    cache = ParseCache(str(tmp_path))
+    code = corpus[-2]
+    cache.put(code, highennabackend.parse(code, compact=True), None, '')
+    entry_path = cache.entry_path(code)
+    with open(entry_path, 'rb') as f:
+        data = f.read()
+    # Truncated entries and entries of another format version are dropped
+    for bad in [data[:len(data)//2], HEADER.pack(MAGIC, FORMAT_VERSION + 1) + data[HEADER.size:]]:
+        with open(entry_path, 'wb') as f:
+            f.write(bad)
+        assert cache.get(code) is None
+        assert not os.path.exists(entry_path)
+
+def test_parse_cache_trim(tmp_path, corpus):
+    cache = ParseCache(str(tmp_path), max_size=0)
+    codes = corpus[-4:]
+    for index, code in enumerate(codes):
+        cache.put(code, highennabackend.parse(code, compact=True), None, '')
+        os.utime(cache.entry_path(code), ns=(index * 10**9, index * 10**9))
+    cache.max_size = sum(os.path.getsize(cache.entry_path(code)) for code in codes[2:])
+    cache.trim()
+    # The least recently used entries go first
+    assert [cache.contains(code) for code in codes] == [False, False, True, True]
@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+import highennabackend
+
+# Parses with the plain text skip turned off, stepping the DFA over every byte
+def stepped(parse, *args, **kwargs):
+    highennabackend.set_plain_text_skip(False)
+    try:
+        return parse(*args, **kwargs)
+    finally:
+        highennabackend.set_plain_text_skip(True)
+
+# Plain text runs of every length around the 16 byte blocks, ended by each byte that stops
+# the skip, at every alignment
+@pytest.fixture(scope='module')
+def runs():
+    templates = []
+    for length in range(40):
+        for stop in [b'$', b'$$var_a$$', b'\n', b'\r\n', b'\r', b'\0', b'$IF{x}$\n', b'$$$']:
+            for shift in range(0, 17, 4):
+                templates.append(b'y' * shift + b'\n' + b'x' * length + stop + b'z' * (length % 7))
+    return templates
+
+def test_parse(corpus, runs):
+    for code in corpus + runs:
+        assert highennabackend.parse(code) == stepped(highennabackend.parse, code)
+        assert highennabackend.parse(code, compact=True).to_bytes() == stepped(highennabackend.parse, code, compact=True).to_bytes()
+
+def test_long_lines():
+    rng = random.Random(18)
+    for _ in range(50):
+        code = b''.join(
+                bytes(rng.choice(b'abc ') for _ in range(rng.randint(0, 300))) + rng.choice([b'$', b'\n', b'\r\n', b'$$v$$', b''])
+                for _ in range(rng.randint(1, 40))
+            )
+        assert highennabackend.parse(code) == stepped(highennabackend.parse, code)
+
+def test_streaming(corpus, runs):
+    rng = random.Random(20)
+    for code in corpus[::4] + runs[::3]:
+        def streamed():
+            parser = highennabackend.Parser(compact=True)
+            offset = 0
+            while offset < len(code):
+                size = rng.choice([1, 3, 15, 16, 17, 100])
+                parser.feed(code[offset:offset+size])
+                offset += size
+            return parser.finish().to_bytes()
+        assert streamed() == stepped(highennabackend.parse, code, compact=True).to_bytes()
@@ -0,0 +1,66 @@
+import stat
+import os
+
+import pytest
+
+import safeIO
+from safeIO import safewrite,safewrite_many,FSYNC_NONE,FSYNC_FILE,FSYNC_DIR
+
+@pytest.mark.parametrize('fsync', [None, FSYNC_NONE, FSYNC_FILE, FSYNC_DIR])
+def test_safewrite(tmp_path, fsync):
+    file_path = tmp_path / 'out.txt'
+    assert safewrite('w', str(file_path), 'é\n', fsync=fsync)
+    assert file_path.read_bytes() == 'é\n'.replace('\n', os.linesep).encode('utf-8')
+    assert safewrite('wb', str(file_path), b'\x00\x01', fsync=fsync)
+    assert file_path.read_bytes() == b'\x00\x01'
+    # Nothing staged is left behind
+    assert os.listdir(tmp_path) == ['out.txt']
+
+def test_default_policy():
+    assert safeIO.fsync_policy == FSYNC_NONE
+
+def test_encoding(tmp_path):
+    file_path = tmp_path / 'out.txt'
+    safewrite('w', str(file_path), 'é', encoding='latin-1')
+    assert file_path.read_bytes() == b'\xe9'
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX modes')
+def test_mode(tmp_path):
+    file_path = tmp_path / 'out.sh'
+    file_path.write_bytes(b'old')
+    os.chmod(file_path, 0o750)
+    safewrite('wb', str(file_path), b'new')
+    assert stat.S_IMODE(os.stat(file_path).st_mode) == 0o750
+
+    new_path = tmp_path / 'new.txt'
+    safewrite('wb', str(new_path), b'new')
+    assert stat.S_IMODE(os.stat(new_path).st_mode) == 0o666 & ~safeIO.read_umask()
+
+def test_safewrite_many(tmp_path):
+    (tmp_path / 'a').mkdir()
+    items = [(str(tmp_path / 'a' / f'{index}.txt'), b'%d' % index) for index in range(5)] + [(str(tmp_path / 'b.txt'), b'b')]
+    assert safewrite_many('wb', items, fsync=FSYNC_DIR) == (6, 0)
+    for file_path, content in items:
+        with open(file_path, 'rb') as f:
+            assert f.read() == content
+
+def test_safewrite_many_failure(tmp_path):
+    # A target that cannot be staged leaves every other target as it was
+    file_path = tmp_path / 'a.txt'
+    file_path.write_bytes(b'old')
+    with pytest.raises(OSError):
+        safewrite_many('wb', [(str(file_path), b'new'), (str(tmp_path / 'missing' / 'b.txt'), b'b')])
+    assert file_path.read_bytes() == b'old'
+    assert os.listdir(tmp_path) == ['a.txt']
+
+def test_skip_unchanged(tmp_path):
+    file_path = tmp_path / 'out.txt'
+    assert safewrite('w', str(file_path), 'a\nb', skip_unchanged=True)
+    mtime = os.stat(file_path).st_mtime_ns
+    os.utime(file_path, ns=(mtime - 10**9, mtime - 10**9))
+    # Same content, line breaks as text mode writes them, is left alone
+    assert not safewrite('w', str(file_path), 'a\nb', skip_unchanged=True)
+    assert os.stat(file_path).st_mtime_ns == mtime - 10**9
+    assert safewrite('w', str(file_path), 'a\nc', skip_unchanged=True)
+    assert safewrite('w', str(file_path), 'a\nc\n', skip_unchanged=True)
+    assert safewrite_many('wb', [(str(file_path), b'a\nc\n'.replace(b'\n', os.linesep.encode())), (str(tmp_path / 'new.txt'), b'')], skip_unchanged=True) == (1, 1)
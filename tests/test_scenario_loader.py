@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+from scenario_loader import ScenarioLoader
+
+class Loads:
+    def __init__(self, fail=()):
+        self.lock = threading.Lock()
+        self.started = []
+        self.loaded = []
+        self.failed = []
+        self.fail = set(fail)
+        self.gate = threading.Event()
+        self.gate.set()
+        self.done = threading.Semaphore(0)
+
+    def load(self, entry):
+        with self.lock:
+            self.started.append(entry)
+        self.gate.wait()
+        if entry in self.fail:
+            raise OSError(entry)
+        return True
+
+    def on_loaded(self, entry):
+        with self.lock:
+            self.loaded.append(entry)
+        self.done.release()
+
+    def on_failed(self, entry, e):
+        with self.lock:
+            self.failed.append((entry, e))
+        self.done.release()
+
+    def wait(self, count):
+        for _ in range(count):
+            assert self.done.acquire(timeout=5)
+
+@pytest.fixture
+def loads():
+    return Loads()
+
+def loader(loads, workers=1):
+    return ScenarioLoader(loads.load, loads.on_loaded, loads.on_failed, workers)
+
+def wait_started(loads, entry):
+    while entry not in loads.started:
+        time.sleep(0.001)
+
+def test_order(loads):
+    # Held on the first entry until everything is submitted
+    loads.gate.clear()
+    scenario_loader = loader(loads)
+    scenario_loader.submit('a', 2)
+    wait_started(loads, 'a')
+    for entry in ['b', 'c', 'd', 'e']:
+        scenario_loader.submit(entry, 1 if entry in 'be' else 2)
+    loads.gate.set()
+    loads.wait(5)
+    scenario_loader.stop()
+    # Lowest rank first, in order of submission within a rank
+    assert loads.started == ['a', 'b', 'e', 'c', 'd']
+    assert loads.loaded == loads.started
+
+def test_prioritize(loads):
+    loads.gate.clear()
+    scenario_loader = loader(loads)
+    scenario_loader.submit('a', 1)
+    wait_started(loads, 'a')
+    for entry in ['b', 'c', 'd']:
+        scenario_loader.submit(entry, 1)
+    # Moved up while waiting, and not moved back down
+    scenario_loader.submit('d', 0)
+    scenario_loader.submit('d', 1)
+    scenario_loader.submit('c', 5)
+    loads.gate.set()
+    loads.wait(4)
+    scenario_loader.stop()
+    assert loads.started == ['a', 'd', 'b', 'c']
+
+def test_no_double_load(loads):
+    loads.gate.clear()
+    scenario_loader = loader(loads, workers=4)
+    scenario_loader.submit('a', 1)
+    wait_started(loads, 'a')
+    # Submitted again while loading, it is left alone
+    scenario_loader.submit('a', 0)
+    loads.gate.set()
+    loads.wait(1)
+    scenario_loader.stop()
+    assert loads.started == ['a']
+    assert loads.loaded == ['a']
+
+def test_failure(capsys):
+    loads = Loads(fail={'b'})
+    scenario_loader = loader(loads, workers=2)
+    for entry in ['a', 'b', 'c']:
+        scenario_loader.submit(entry, 1)
+    loads.wait(3)
+    assert sorted(loads.loaded) == ['a', 'c']
+    assert [(entry, str(e)) for entry, e in loads.failed] == [('b', 'b')]
+    # A failed entry can be submitted again
+    loads.fail.clear()
+    scenario_loader.submit('b', 0)
+    loads.wait(1)
+    scenario_loader.stop()
+    assert sorted(loads.loaded) == ['a', 'b', 'c']
+    assert 'OSError' in capsys.readouterr().err
+
+def test_not_loaded():
+    # A load returning False reports neither outcome
+    done = threading.Event()
+    outcomes = []
+    def load(entry):
+        done.set()
+        return False
+    scenario_loader = ScenarioLoader(load, outcomes.append, lambda entry, e: outcomes.append(e), 1)
+    scenario_loader.submit('a', 1)
+    assert done.wait(5)
+    scenario_loader.stop()
+    assert outcomes == []
+
+def test_stop(loads):
+    loads.gate.clear()
+    scenario_loader = loader(loads)
+    for entry in ['a', 'b', 'c']:
+        scenario_loader.submit(entry, 1)
+    wait_started(loads, 'a')
+    threading.Timer(0.1, loads.gate.set).start()
+    # What has not started is dropped, what has is waited for
+    scenario_loader.stop()
+    assert loads.started == ['a']
+    assert loads.loaded == ['a']
@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+import highennabackend
+
+def test_streaming(corpus):
+    rng = random.Random(8)
+    for code in corpus:
+        parser = highennabackend.Parser(compact=True)
+        offset = 0
+        while offset < len(code):
+            size = rng.choice([1, 2, 7, 64, 4096])
+            parser.feed(code[offset:offset+size])
+            offset += size
+        assert parser.finish().to_dict() == highennabackend.parse(code)
+
+def test_streaming_dict(corpus):
+    for code in corpus[:50]:
+        parser = highennabackend.Parser()
+        for index in range(len(code)):
+            parser.feed(code[index:index+1])
+        assert parser.finish() == highennabackend.parse(code)
+
+def test_streaming_crlf():
+    # A \r\n split across two chunks is still a single line break
+    code = b'a\r\n$$var_a$$\r\n$IF{x}$\r\nb\r\n$END$\r\n'
+    for split in range(len(code) + 1):
+        parser = highennabackend.Parser()
+        parser.feed(code[:split])
+        parser.feed(code[split:])
+        assert parser.finish() == highennabackend.parse(code)
+
+def test_streaming_finished():
+    parser = highennabackend.Parser()
+    parser.feed(b'$$var_a$$')
+    parser.finish()
+    with pytest.raises(ValueError):
+        parser.feed(b'more')